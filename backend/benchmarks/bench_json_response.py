@@ -0,0 +1,103 @@
+"""
+Benchmark JSON encoding and compression for a realistic 100-track response.
+
+Compares FastAPI's default path (jsonable_encoder + stdlib json) with
+FastJSONResponse, for both raw Spotify tracks and the compact projection,
+and reports compressed sizes. Run from the backend directory:
+
+    python benchmarks/bench_json_response.py
+"""
+import gzip
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from responses import FastJSONResponse, orjson
+from services.projection import TRACK_FIELDS, parse_fields, project
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MARKETS = [f"{a}{b}" for a in "ABCDEFGHIJKLMNOPQR" for b in "ABCDEFGHIJ"][:180]
+
+
+def make_track(i: int) -> dict:
+    artist = {
+        "external_urls": {"spotify": f"https://open.spotify.com/artist/artist{i}"},
+        "href": f"https://api.spotify.com/v1/artists/artist{i}",
+        "id": f"artist{i:018d}",
+        "name": f"Artist {i}",
+        "type": "artist",
+        "uri": f"spotify:artist:artist{i:018d}"
+    }
+    return {
+        "album": {
+            "album_type": "album",
+            "artists": [artist],
+            "available_markets": MARKETS,
+            "external_urls": {"spotify": f"https://open.spotify.com/album/album{i}"},
+            "href": f"https://api.spotify.com/v1/albums/album{i}",
+            "id": f"album{i:017d}",
+            "images": [
+                {"height": size, "url": f"https://i.scdn.co/image/{i:040d}{size}", "width": size}
+                for size in (640, 300, 64)
+            ],
+            "name": f"Album {i}",
+            "release_date": "2021-03-05",
+            "release_date_precision": "day",
+            "total_tracks": 12,
+            "type": "album",
+            "uri": f"spotify:album:album{i:017d}"
+        },
+        "artists": [artist],
+        "available_markets": MARKETS,
+        "disc_number": 1,
+        "duration_ms": 180000 + i,
+        "explicit": False,
+        "external_ids": {"isrc": f"USRC1{i:07d}"},
+        "external_urls": {"spotify": f"https://open.spotify.com/track/track{i}"},
+        "href": f"https://api.spotify.com/v1/tracks/track{i}",
+        "id": f"track{i:017d}",
+        "is_local": False,
+        "name": f"Track number {i}",
+        "popularity": 50,
+        "preview_url": f"https://p.scdn.co/mp3-preview/{i:040d}",
+        "track_number": i % 12 + 1,
+        "type": "track",
+        "uri": f"spotify:track:track{i:017d}"
+    }
+
+
+def default_render(content: dict) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def fast_render(content: dict) -> bytes:
+    return FastJSONResponse(content).body
+
+
+def main():
+    raw = {"tracks": [make_track(i) for i in range(100)]}
+    compact = {"tracks": project(raw["tracks"], parse_fields(TRACK_FIELDS))}
+    runs = 200
+
+    print(f"fast encoder: {'orjson' if orjson else 'stdlib json'}")
+    print(f"{'payload':<10}{'encoder':<10}{'ms/request':>12}{'bytes':>10}{'gzip':>9}{'br':>9}")
+    for name, content in (("raw", raw), ("compact", compact)):
+        for label, render in (("default", default_render), ("fast", fast_render)):
+            seconds = timeit.timeit(lambda: render(content), number=runs)
+            body = render(content)
+            gzipped = len(gzip.compress(body, 6))
+            brotlied = len(brotli.compress(body, quality=4)) if brotli else 0
+            print(f"{name:<10}{label:<10}{seconds / runs * 1000:>12.3f}{len(body):>10}{gzipped:>9}{brotlied:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Report where the time goes when the API is imported.
+
+Runs ``python -X importtime -c "import server"`` in a fresh interpreter and
+prints the slowest modules by cumulative import time, plus the total. Use it
+to check that heavy clients (Supabase, etc.) stay out of the import path.
+Run from the backend directory:
+
+    python benchmarks/import_profile.py [--top 25] [--module server]
+"""
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+
+def profile_imports(module: str):
+    """Return (self_us, cumulative_us, name) rows from -X importtime"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"Importing {module} failed")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='server')
+    parser.add_argument('--top', type=int, default=25)
+    args = parser.parse_args()
+
+    rows = profile_imports(args.module)
+    total = next((cumulative for _, cumulative, name in rows if name.strip() == args.module), 0)
+    print(f"import {args.module}: {total / 1000:.1f} ms total, {len(rows)} modules\n")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for self_us, cumulative_us, name in sorted(rows, key=lambda row: -row[1])[:args.top]:
+        print(f"{cumulative_us / 1000:>10.1f}ms {self_us / 1000:>8.1f}ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
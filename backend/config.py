@@ -0,0 +1,136 @@
+import os
+import tempfile
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+
+
+def _optional_int(value: Optional[str]) -> Optional[int]:
+    return int(value) if value else None
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Application configuration, read once from the environment and backend/.env"""
+
+    mongo_url: Optional[str]
+    db_name: Optional[str]
+    cors_origins: List[str]
+    supabase_url: Optional[str]
+    supabase_key: Optional[str]
+    spotify_client_id: Optional[str]
+    spotify_client_secret: Optional[str]
+    spotify_redirect_uri: Optional[str]
+    worker_pool_size: Optional[int]
+    worker_pool_queue: int
+    job_workers: int
+    job_visibility_timeout: float
+    cache_backends: List[str]
+    cache_memory_entries: int
+    redis_url: Optional[str]
+    cache_bus: str
+    spotify_rate_limit: float
+    spotify_rate_burst: float
+    job_retention_days: float
+    featured_refresh_interval: float
+    featured_countries: List[Optional[str]]
+    audio_cache_dir: Path
+    audio_cache_max_bytes: int
+    transcode_bitrates: List[int]
+    transcode_workers: int
+    transcode_queue: int
+    ffmpeg_path: str
+    upload_concurrency: int
+    mood_snapshot_interval: float
+    mood_history_retention_days: float
+    library_sync_concurrency: int
+    spotify_timeout: float
+    supabase_timeout: float
+    storage_timeout: float
+    circuit_open_seconds: float
+    request_timeout: float
+    request_timeout_max: float
+    deadline_exempt_paths: List[str]
+    admin_token: str
+    slow_request_trace_ms: float
+    otlp_traces_endpoint: str
+
+    @classmethod
+    def from_env(cls) -> 'Settings':
+        load_dotenv(ROOT_DIR / '.env')
+        env = os.environ
+        return cls(
+            mongo_url=env.get('MONGO_URL'),
+            db_name=env.get('DB_NAME'),
+            cors_origins=env.get('CORS_ORIGINS', '*').split(','),
+            supabase_url=env.get('SUPABASE_URL'),
+            supabase_key=env.get('SUPABASE_KEY'),
+            spotify_client_id=env.get('SPOTIFY_CLIENT_ID'),
+            spotify_client_secret=env.get('SPOTIFY_CLIENT_SECRET'),
+            spotify_redirect_uri=env.get('SPOTIFY_REDIRECT_URI'),
+            worker_pool_size=_optional_int(env.get('WORKER_POOL_SIZE')),
+            worker_pool_queue=int(env.get('WORKER_POOL_QUEUE', '64')),
+            job_workers=int(env.get('JOB_WORKERS', '2')),
+            job_visibility_timeout=float(env.get('JOB_VISIBILITY_TIMEOUT', '60')),
+            # Tiers in lookup order; 'redis' also needs REDIS_URL
+            cache_backends=[name.strip() for name in env.get('CACHE_BACKENDS', 'memory,mongo').split(',') if name.strip()],
+            cache_memory_entries=int(env.get('CACHE_MEMORY_ENTRIES', '50000')),
+            redis_url=env.get('REDIS_URL'),
+            # How workers tell each other about cache invalidations: redis, mongo or none
+            cache_bus=env.get('CACHE_BUS', 'redis' if env.get('REDIS_URL') else 'mongo'),
+            # Spotify's quota is per app, so this is shared by every worker
+            spotify_rate_limit=float(env.get('SPOTIFY_RATE_LIMIT', '10')),
+            spotify_rate_burst=float(env.get('SPOTIFY_RATE_BURST', '20')),
+            job_retention_days=float(env.get('JOB_RETENTION_DAYS', '7')),
+            featured_refresh_interval=float(env.get('FEATURED_REFRESH_INTERVAL', '600')),
+            # Markets to precompute besides Spotify's default one, e.g. "GB,DE"
+            featured_countries=[None] + [
+                code.strip().upper() for code in env.get('FEATURED_COUNTRIES', '').split(',') if code.strip()
+            ],
+            audio_cache_dir=Path(env.get('AUDIO_CACHE_DIR', Path(tempfile.gettempdir()) / 'cooldify-audio')),
+            audio_cache_max_bytes=int(env.get('AUDIO_CACHE_MAX_MB', '2048')) * 1024 * 1024,
+            # HLS renditions in kbps; empty disables transcoding
+            transcode_bitrates=[
+                int(bitrate) for bitrate in env.get('TRANSCODE_BITRATES', '96,160,320').split(',') if bitrate.strip()
+            ],
+            transcode_workers=int(env.get('TRANSCODE_WORKERS', '1')),
+            transcode_queue=int(env.get('TRANSCODE_QUEUE', '8')),
+            ffmpeg_path=env.get('FFMPEG_PATH', 'ffmpeg'),
+            # Files of a batch upload sent to storage at the same time
+            upload_concurrency=int(env.get('UPLOAD_CONCURRENCY', '4')),
+            mood_snapshot_interval=float(env.get('MOOD_SNAPSHOT_INTERVAL', '21600')),
+            mood_history_retention_days=float(env.get('MOOD_HISTORY_RETENTION_DAYS', '365')),
+            # Saved-track pages a library sync requests at the same time
+            library_sync_concurrency=int(env.get('LIBRARY_SYNC_CONCURRENCY', '4')),
+            # Upstream calls are cut off after these many seconds and count against the circuit breaker
+            spotify_timeout=float(env.get('SPOTIFY_TIMEOUT', '5')),
+            supabase_timeout=float(env.get('SUPABASE_TIMEOUT', '5')),
+            # Audio files are large; storage transfers have their own breaker and a longer limit
+            storage_timeout=float(env.get('STORAGE_TIMEOUT', '120')),
+            # How long an open circuit rejects calls before probing the upstream again
+            circuit_open_seconds=float(env.get('CIRCUIT_OPEN_SECONDS', '15')),
+            # Time budget of a request unless the client sends X-Request-Timeout (capped at the max)
+            request_timeout=float(env.get('REQUEST_TIMEOUT', '10')),
+            request_timeout_max=float(env.get('REQUEST_TIMEOUT_MAX', '30')),
+            # Path prefixes without a time budget: large uploads, profiles that run for a set time
+            deadline_exempt_paths=[
+                p.strip() for p in env.get('DEADLINE_EXEMPT_PATHS', '/api/songs/upload,/api/admin/profile').split(',') if p.strip()
+            ],
+            # Sent as X-Admin-Token to the /api/admin endpoints; they are disabled without one
+            admin_token=env.get('ADMIN_TOKEN', ''),
+            # Requests slower than this keep their span traces; 0 turns tracing off
+            slow_request_trace_ms=float(env.get('SLOW_REQUEST_TRACE_MS', '1000')),
+            # OTLP/HTTP collector for slow traces, e.g. http://localhost:4318/v1/traces
+            otlp_traces_endpoint=env.get('OTEL_EXPORTER_OTLP_TRACES_ENDPOINT', '')
+        )
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide settings, loading them on first use"""
+    return Settings.from_env()
@@ -0,0 +1,199 @@
+"""
+FastAPI dependency providers.
+
+Services are built on first use rather than at import, so importing the app
+stays cheap and a missing optional integration (e.g. Supabase credentials)
+only fails the requests that need it instead of the whole worker.
+"""
+import logging
+import secrets
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException, Request
+
+from config import get_settings
+from services.audio_files import AudioFileStore
+from services.cache import TieredCache
+from services.circuit_breaker import CircuitBreaker
+from services.dashboard_tasks import DashboardTasks
+from services.disk_cache import DiskLRUCache
+from services.featured_precompute import FeaturedPrecompute
+from services.job_queue import JobQueue
+from services.library_sync import LibraryStore, LibrarySync
+from services.mood_history import MoodHistoryStore, MoodSnapshotter
+from services.mood_index import MoodIndex
+from services.playlist_mood_store import PlaylistMoodStore
+from services.profiler import SamplingProfiler
+from services.rate_limiter import DistributedTokenBucket
+from services.search_cache import SearchCache
+from services.spotify_service import SpotifyService
+from services.song_uploads import SongUploader
+from services.spotify_oauth import SpotifyOAuth
+from services.supabase_service import SupabaseService
+from services.tracing import SlowTraces
+from services.waveform_store import WaveformStore
+from services.worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Guard for admin endpoints; they do not exist unless ADMIN_TOKEN is set"""
+    expected = get_settings().admin_token
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def get_cache(request: Request) -> TieredCache:
+    return request.app.state.cache
+
+
+def get_spotify_limiter(request: Request) -> DistributedTokenBucket:
+    return request.app.state.spotify_limiter
+
+
+def get_spotify_breaker(request: Request) -> CircuitBreaker:
+    return request.app.state.spotify_breaker
+
+
+def get_supabase_breaker(request: Request) -> CircuitBreaker:
+    return request.app.state.supabase_breaker
+
+
+def get_storage_breaker(request: Request) -> CircuitBreaker:
+    return request.app.state.storage_breaker
+
+
+def get_track_index(request: Request) -> MoodIndex:
+    return request.app.state.track_index
+
+
+def get_playlist_index(request: Request) -> MoodIndex:
+    return request.app.state.playlist_index
+
+
+def get_search_cache(request: Request) -> SearchCache:
+    return request.app.state.search_cache
+
+
+def get_dashboard_tasks(request: Request) -> DashboardTasks:
+    return request.app.state.dashboard_tasks
+
+
+def get_spotify_service(
+    authorization: str = Header(...),
+    cache: TieredCache = Depends(get_cache),
+    limiter: DistributedTokenBucket = Depends(get_spotify_limiter),
+    breaker: CircuitBreaker = Depends(get_spotify_breaker),
+    track_index: MoodIndex = Depends(get_track_index)
+) -> SpotifyService:
+    """SpotifyService for the caller's access token"""
+    return SpotifyService(authorization.replace("Bearer ", ""), cache, limiter, breaker, track_index)
+
+
+@lru_cache(maxsize=1)
+def _build_supabase_service(
+    cache: TieredCache,
+    breaker: CircuitBreaker,
+    storage_breaker: CircuitBreaker
+) -> SupabaseService:
+    settings = get_settings()
+    return SupabaseService(settings.supabase_url, settings.supabase_key, cache, breaker, storage_breaker)
+
+
+def get_supabase_service(
+    cache: TieredCache = Depends(get_cache),
+    breaker: CircuitBreaker = Depends(get_supabase_breaker),
+    storage_breaker: CircuitBreaker = Depends(get_storage_breaker)
+) -> SupabaseService:
+    try:
+        return _build_supabase_service(cache, breaker, storage_breaker)
+    except Exception as e:
+        logger.error(f"Supabase is not available: {e}")
+        raise HTTPException(status_code=503, detail="Song storage is not configured")
+
+
+@lru_cache(maxsize=1)
+def get_spotify_oauth() -> SpotifyOAuth:
+    settings = get_settings()
+    return SpotifyOAuth(
+        settings.spotify_client_id,
+        settings.spotify_client_secret,
+        settings.spotify_redirect_uri
+    )
+
+
+def get_db(request: Request):
+    return request.app.state.db
+
+
+def get_mood_store(request: Request) -> PlaylistMoodStore:
+    return request.app.state.playlist_mood_store
+
+
+def get_mood_history(request: Request) -> MoodHistoryStore:
+    return request.app.state.mood_history
+
+
+def get_mood_snapshotter(request: Request) -> MoodSnapshotter:
+    return request.app.state.mood_snapshotter
+
+
+def get_library_store(request: Request) -> LibraryStore:
+    return request.app.state.library_store
+
+
+def get_library_sync(request: Request) -> LibrarySync:
+    return request.app.state.library_sync
+
+
+def get_worker_pool(request: Request) -> WorkerPool:
+    return request.app.state.worker_pool
+
+
+def get_job_queue(request: Request) -> JobQueue:
+    return request.app.state.job_queue
+
+
+def get_featured_precompute(request: Request) -> FeaturedPrecompute:
+    return request.app.state.featured_precompute
+
+
+def get_audio_cache(request: Request) -> DiskLRUCache:
+    return request.app.state.audio_cache
+
+
+def get_waveform_store(request: Request) -> WaveformStore:
+    return request.app.state.waveform_store
+
+
+def get_audio_file_store(request: Request) -> AudioFileStore:
+    return request.app.state.audio_file_store
+
+
+def get_profiler(request: Request) -> SamplingProfiler:
+    return request.app.state.profiler
+
+
+def get_slow_traces(request: Request) -> SlowTraces:
+    return request.app.state.slow_traces
+
+
+def get_song_uploader(
+    request: Request,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    audio_files: AudioFileStore = Depends(get_audio_file_store),
+    waveform_store: WaveformStore = Depends(get_waveform_store)
+) -> SongUploader:
+    settings = get_settings()
+    return SongUploader(
+        supabase_service,
+        audio_files,
+        waveform_store,
+        get_job_queue(request),
+        transcode=bool(settings.transcode_bitrates),
+        concurrency=settings.upload_concurrency
+    )
@@ -0,0 +1,125 @@
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'image/svg+xml')
+
+
+class CompressionMiddleware:
+    """Brotli/gzip compression for JSON and text responses above a size threshold.
+
+    Unlike Starlette's GZipMiddleware this leaves binary media, partial
+    content and already-encoded responses untouched, so audio streams keep
+    their byte ranges and Content-Length.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._choose_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingResponder(send, encoding, self)
+        await self.app(scope, receive, responder.send)
+
+    def _choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        accepted = {
+            part.split(';')[0].strip().lower()
+            for part in accept_encoding.split(',')
+            if not part.strip().endswith(';q=0')
+        }
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
+
+
+class _CompressingResponder:
+    def __init__(self, send: Send, encoding: str, config: CompressionMiddleware):
+        self._send = send
+        self.encoding = encoding
+        self.config = config
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+        self.compressor = None
+
+    async def send(self, message: Message) -> None:
+        if message['type'] == 'http.response.start':
+            self.start_message = message
+            return
+        if message['type'] != 'http.response.body' or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get('body', b'')
+        more_body = message.get('more_body', False)
+
+        if self.compressor is None:
+            if not self._should_compress(body, more_body):
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+
+            headers = MutableHeaders(raw=self.start_message['headers'])
+            headers['Content-Encoding'] = self.encoding
+            headers.add_vary_header('Accept-Encoding')
+            self.compressor = self._new_compressor()
+            if not more_body:
+                data = self._compress(body, final=True)
+                headers['Content-Length'] = str(len(data))
+                await self._send(self.start_message)
+                await self._send({'type': 'http.response.body', 'body': data})
+                return
+            del headers['Content-Length']
+            await self._send(self.start_message)
+
+        data = self._compress(body, final=not more_body)
+        await self._send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+    def _should_compress(self, body: bytes, more_body: bool) -> bool:
+        headers = Headers(raw=self.start_message['headers'])
+        if 'content-encoding' in headers or 'content-range' in headers:
+            return False
+        if self.start_message['status'] < 200 or self.start_message['status'] in (204, 206, 304):
+            return False
+        content_type = headers.get('content-type', '')
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        return more_body or len(body) >= self.config.minimum_size
+
+    def _new_compressor(self):
+        if self.encoding == 'br':
+            return brotli.Compressor(quality=self.config.brotli_quality)
+        return zlib.compressobj(self.config.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def _compress(self, body: bytes, final: bool) -> bytes:
+        if self.encoding == 'br':
+            data = self.compressor.process(body)
+            return data + (self.compressor.finish() if final else self.compressor.flush())
+        data = self.compressor.compress(body)
+        return data + self.compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Sequence
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from services.deadlines import Deadline, begin_deadline
+from services.latency import RouteLatency
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_HEADER = 'X-Request-Timeout'
+# Time a handler gets past its deadline to answer with what it has before it is cut off
+DEADLINE_GRACE = 0.5
+# Shortest budget a client may ask for; anything less only turns requests into 504s
+MIN_CLIENT_TIMEOUT = 1.0
+
+
+class DeadlineMiddleware:
+    """Gives each request a time budget and stops work nobody is waiting for.
+
+    The budget comes from the ``X-Request-Timeout`` header (seconds, kept
+    between ``MIN_CLIENT_TIMEOUT`` and ``max_timeout``) or
+    ``default_timeout``. Upstream calls made for the
+    request are cut off when it runs out (see ``services.deadlines``); a
+    handler still running shortly after that is cancelled and answered
+    with 504. Requests under ``exempt_paths`` (uploads) have no budget.
+
+    A client that disconnects before its response is complete cancels the
+    handler and everything it awaits, so an abandoned request stops
+    spending Spotify quota and event-loop time. Work after the response,
+    such as background tasks, is neither timed nor cancelled.
+
+    Every request's duration and outcome is recorded per route in
+    ``latency``.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        latency: RouteLatency,
+        default_timeout: float = 10.0,
+        max_timeout: float = 30.0,
+        exempt_paths: Sequence[str] = ()
+    ):
+        self.app = app
+        self.latency = latency
+        self.default_timeout = default_timeout
+        self.max_timeout = max_timeout
+        self.exempt_paths = tuple(exempt_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        timeout = self._timeout(scope)
+        deadline = begin_deadline(timeout) if timeout is not None else None
+        request = _RequestState(receive, send, deadline)
+        # Created after begin_deadline, so the handler task sees the deadline
+        handler = asyncio.create_task(self.app(scope, request.receive, request.send))
+        pump = asyncio.create_task(request.pump())
+        outcome = None
+        try:
+            outcome = await self._supervise(handler, request, timeout)
+        finally:
+            pump.cancel()
+            if not handler.done():
+                handler.cancel()
+            self.latency.record(route_template(scope), time.monotonic() - started, outcome or request.outcome())
+
+    async def _supervise(self, handler: asyncio.Task, request: '_RequestState', timeout: Optional[float]) -> Optional[str]:
+        hard_limit = timeout + DEADLINE_GRACE if timeout is not None else None
+        disconnected = asyncio.ensure_future(request.disconnected.wait())
+        try:
+            done, _ = await asyncio.wait({handler, disconnected}, timeout=hard_limit, return_when=asyncio.FIRST_COMPLETED)
+            while handler not in done:
+                if disconnected in done:
+                    if not request.complete:
+                        await _cancel(handler)
+                        return 'cancelled'
+                    # The response went out; what runs now (background tasks) is not the client's to cancel
+                    break
+                if not request.started:
+                    await _cancel(handler)
+                    await JSONResponse({"detail": "Request deadline exceeded"}, status_code=504)(
+                        {'type': 'http'}, request.receive, request.send
+                    )
+                    return 'deadline'
+                # Streaming has begun; the body may take longer than the budget
+                done, _ = await asyncio.wait({handler, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            await handler
+            return None
+        finally:
+            disconnected.cancel()
+
+    def _timeout(self, scope: Scope) -> Optional[float]:
+        if scope['path'].startswith(self.exempt_paths):
+            return None
+        header = Headers(scope=scope).get(TIMEOUT_HEADER)
+        try:
+            requested = float(header) if header else None
+        except ValueError:
+            requested = None
+        if requested is None or requested <= 0:
+            return self.default_timeout
+        return min(max(requested, min(MIN_CLIENT_TIMEOUT, self.default_timeout)), self.max_timeout)
+
+
+@lru_cache(maxsize=None)
+def _route_paths(app) -> Dict:
+    return {route.endpoint: route.path for route in app.routes if hasattr(route, 'endpoint')}
+
+
+def route_template(scope: Scope) -> str:
+    """``METHOD /path/{template}`` of the matched route, so paths with IDs share one entry"""
+    endpoint = scope.get('endpoint')
+    if endpoint is None:
+        return 'unmatched'
+    return f"{scope['method']} {_route_paths(scope['app']).get(endpoint, scope['path'])}"
+
+
+async def _cancel(task: asyncio.Task) -> None:
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logger.warning(f"Cancelled request handler failed: {e}")
+
+
+class _RequestState:
+    """Relays ASGI messages between server and handler, watching for disconnects and response progress.
+
+    The server's ``receive`` is read by ``pump`` alone: request body chunks
+    one at a time as the handler asks for them, then, once the body is
+    complete, the disconnect that is the only message left to come.
+    """
+
+    def __init__(self, receive: Receive, send: Send, deadline: Optional[Deadline]):
+        self._receive = receive
+        self._send = send
+        self.deadline = deadline
+        self._messages: asyncio.Queue = asyncio.Queue()
+        # Read the first message straight away: a GET handler never asks, and its disconnect must still be seen
+        self._wanted = asyncio.Event()
+        self._wanted.set()
+        self.disconnected = asyncio.Event()
+        self.started = False
+        self.complete = False
+        self.status: Optional[int] = None
+
+    async def pump(self) -> None:
+        while True:
+            await self._wanted.wait()
+            self._wanted.clear()
+            message = await self._receive()
+            await self._messages.put(message)
+            if message['type'] == 'http.disconnect':
+                self.disconnected.set()
+                return
+            if not message.get('more_body', False):
+                self._wanted.set()
+
+    async def receive(self) -> Message:
+        if self._messages.empty():
+            self._wanted.set()
+        message = await self._messages.get()
+        if message['type'] == 'http.disconnect':
+            # Every later receive sees the disconnect too
+            self._messages.put_nowait(message)
+        return message
+
+    async def send(self, message: Message) -> None:
+        if message['type'] == 'http.response.start':
+            self.started = True
+            self.status = message['status']
+        elif message['type'] == 'http.response.body' and not message.get('more_body', False):
+            self.complete = True
+            if self.deadline is not None:
+                self.deadline.lift()
+        await self._send(message)
+
+    def outcome(self) -> str:
+        if self.status is None:
+            return 'cancelled' if self.disconnected.is_set() else '5xx'
+        return f'{self.status // 100}xx'
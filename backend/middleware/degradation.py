@@ -0,0 +1,33 @@
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from services.circuit_breaker import begin_degradation_tracking
+
+DEGRADED_HEADER = 'X-Degraded'
+
+
+class DegradationMiddleware:
+    """Adds ``X-Degraded: <upstreams>`` to responses served from fallbacks.
+
+    Services call ``mark_degraded`` when an upstream failed or its circuit is
+    open and they answered from cached or stale data instead. The header
+    lists those upstreams so clients can show that data may be out of date.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        upstreams = begin_degradation_tracking()
+
+        async def send_with_flag(message: Message) -> None:
+            if message['type'] == 'http.response.start' and upstreams:
+                headers = MutableHeaders(raw=message['headers'])
+                headers[DEGRADED_HEADER] = ','.join(sorted(upstreams))
+            await send(message)
+
+        await self.app(scope, receive, send_with_flag)
@@ -0,0 +1,51 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from middleware.deadline import route_template
+from services.tracing import SlowTraces, begin_trace
+
+
+class TracingMiddleware:
+    """Traces every request and hands the slow ones to ``slow_traces``.
+
+    The request is the root span; Spotify and Supabase calls, cache
+    lookups and mood scoring add child spans (``services.tracing.span``).
+    Time in the root span not covered by a child is spent on the event
+    loop: validation, the handler's own code, JSON encoding. The trace
+    ends with the response; background tasks run after it are not part of
+    it. Requests cancelled for a disconnect or deadline are recorded with
+    the cancellation as their error.
+    """
+
+    def __init__(self, app: ASGIApp, slow_traces: SlowTraces):
+        self.app = app
+        self.slow_traces = slow_traces
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or not self.slow_traces.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        trace = begin_trace(
+            f"{scope['method']} {scope['path']}",
+            {'http.request.method': scope['method'], 'url.path': scope['path']}
+        )
+
+        async def send_traced(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                trace.root.set('http.response.status_code', message['status'])
+            elif message['type'] == 'http.response.body' and not message.get('more_body', False):
+                trace.finish()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_traced)
+        except BaseException as e:
+            trace.finish(e)
+            raise
+        finally:
+            trace.finish()
+            route = route_template(scope)
+            if route != 'unmatched':
+                trace.root.name = route
+                trace.root.set('http.route', route.split(' ', 1)[1])
+            self.slow_traces.offer(trace)
@@ -0,0 +1,23 @@
+import json
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response that serializes upstream dicts directly.
+
+    Returning this from a route bypasses FastAPI's ``jsonable_encoder`` pass,
+    which walks every value of large Spotify payloads only to hand back the
+    same plain dicts. Uses orjson when installed, compact stdlib json otherwise.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi.responses import PlainTextResponse
+from datetime import datetime, timezone
+import asyncio
+import logging
+import os
+import threading
+from services.profiler import MAX_PROFILE_SECONDS, ProfileInProgress, SamplingProfiler
+from services.tracing import SlowTraces
+from dependencies import get_profiler, get_slow_traces, require_admin
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    profiler: SamplingProfiler = Depends(get_profiler)
+):
+    """Sample the stacks of the worker serving this request; collapsed stacks for flamegraph tools"""
+    stop = threading.Event()
+    try:
+        stacks = await asyncio.to_thread(profiler.profile, seconds, interval_ms / 1000, stop)
+    except ProfileInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error profiling worker: {e}")
+        raise HTTPException(status_code=500, detail="Failed to profile worker")
+    finally:
+        # Stops the sampler if the client went away before it finished
+        stop.set()
+
+    taken = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    return PlainTextResponse(
+        stacks,
+        headers={"Content-Disposition": f'attachment; filename="profile-{os.getpid()}-{taken}.folded"'}
+    )
+
+@router.get("/traces")
+async def list_slow_traces(
+    limit: int = Query(20, ge=1, le=100),
+    slow_traces: SlowTraces = Depends(get_slow_traces)
+):
+    """Span traces of this worker's latest slow requests, newest first"""
+    return {**slow_traces.metrics(), "traces": slow_traces.recent(limit)}
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, HTTPException, Query, Depends
+from typing import Optional
+import logging
+from services.job_queue import JobQueue
+from dependencies import get_job_queue, require_admin
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+@router.get("/", dependencies=[Depends(require_admin)])
+async def list_jobs(
+    status: Optional[str] = Query(None, pattern="^(queued|running|succeeded|failed)$"),
+    type: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    queue: JobQueue = Depends(get_job_queue)
+):
+    """List recent background jobs, payloads and errors included"""
+    try:
+        jobs = await queue.list_jobs(status, type, limit)
+        return {"jobs": jobs}
+    except Exception as e:
+        logger.error(f"Error listing jobs: {e}")
+        raise HTTPException(status_code=500, detail="Failed to list jobs")
+
+@router.get("/stats", dependencies=[Depends(require_admin)])
+async def get_job_stats(queue: JobQueue = Depends(get_job_queue)):
+    """Count jobs per status"""
+    try:
+        return await queue.stats()
+    except Exception as e:
+        logger.error(f"Error fetching job stats: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch job stats")
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, queue: JobQueue = Depends(get_job_queue)):
+    """Get a background job's status and result, for the client that submitted it"""
+    try:
+        job = await queue.get_status(job_id)
+    except Exception as e:
+        logger.error(f"Error fetching job: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch job")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,14 +1,23 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Request, Response, Depends
+from typing import List, Optional
+from datetime import datetime
+from pathlib import PurePath
 import logging
-from services.supabase_service import SupabaseService
+import mimetypes
+from services.circuit_breaker import CircuitOpen, is_degraded
+from services.supabase_service import UPSTREAM as SUPABASE, SupabaseService
+from services.song_uploads import MAX_BATCH_FILES, SongUploader, UploadRejected
+from services.disk_cache import DiskLRUCache
+from services.audio_stream import file_response, not_modified_response, proxy_response, validator_headers
+from services.waveform import WAVEFORM_RESOLUTIONS, to_int8
+from services.waveform_store import WaveformStore
+from dependencies import get_audio_cache, get_song_uploader, get_supabase_service, get_waveform_store
+from responses import FastJSONResponse
 from pydantic import BaseModel
-import uuid
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/songs", tags=["songs"])
-supabase_service = SupabaseService()
 
 class SongCreate(BaseModel):
     title: str
@@ -23,71 +32,190 @@ async def upload_song(
     artist: str = Form(...),
     album: Optional[str] = Form(None),
     genre: Optional[str] = Form(None),
-    uploaded_by: Optional[str] = Form(None)
+    uploaded_by: Optional[str] = Form(None),
+    uploader: SongUploader = Depends(get_song_uploader)
 ):
     """Upload a new song"""
     try:
-        # Validate file type
-        if not file.content_type.startswith('audio/'):
-            raise HTTPException(status_code=400, detail="File must be an audio file")
-        
-        # Check file size (max 10MB)
-        contents = await file.read()
-        file_size = len(contents)
-        max_size = 10 * 1024 * 1024  # 10MB
-        
-        if file_size > max_size:
-            raise HTTPException(status_code=400, detail="File size must be less than 10MB")
-        
-        # Generate unique filename
-        file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'mp3'
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        
-        # Upload to Supabase storage
-        audio_url = await supabase_service.upload_song_file(contents, unique_filename)
-        
-        # Create song entry in database
-        song_data = {
+        result = await uploader.upload(file, {
             "title": title,
             "artist": artist,
             "album": album,
             "genre": genre,
-            "duration_ms": 0,  # We'll calculate this later or from metadata
-            "audio_url": audio_url,
-            "uploaded_by": uploaded_by,
-            "is_public": True
-        }
-        
-        song = await supabase_service.create_song(song_data)
-        
-        return {
-            "success": True,
-            "song": song,
-            "message": "Song uploaded successfully"
-        }
-        
-    except HTTPException:
-        raise
+            "uploaded_by": uploaded_by
+        })
+        return {**result, "message": "Song uploaded successfully"}
+    except UploadRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CircuitOpen as e:
+        raise HTTPException(
+            status_code=503, detail="Song storage is unavailable, try again shortly",
+            headers={"Retry-After": str(max(int(e.retry_after), 1))}
+        )
     except Exception as e:
         logger.error(f"Error uploading song: {e}")
         raise HTTPException(status_code=500, detail="Failed to upload song")
 
+@router.post("/upload/batch")
+async def upload_songs(
+    files: List[UploadFile] = File(...),
+    artist: str = Form(...),
+    titles: List[str] = Form([]),
+    album: Optional[str] = Form(None),
+    genre: Optional[str] = Form(None),
+    uploaded_by: Optional[str] = Form(None),
+    uploader: SongUploader = Depends(get_song_uploader)
+):
+    """Upload several songs at once, e.g. an album; returns a result per file"""
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_FILES} files per batch")
+    if titles and len(titles) != len(files):
+        raise HTTPException(status_code=400, detail="Give one title per file, or none")
+    try:
+        metadata = [
+            {
+                # Without titles, name each song after its file
+                "title": titles[index] if titles else PurePath(file.filename or "Untitled").stem,
+                "artist": artist,
+                "album": album,
+                "genre": genre,
+                "uploaded_by": uploaded_by
+            }
+            for index, file in enumerate(files)
+        ]
+        results = await uploader.upload_many(files, metadata)
+        return {
+            "results": results,
+            "uploaded": sum(1 for result in results if result["success"]),
+            "failed": sum(1 for result in results if not result["success"])
+        }
+    except CircuitOpen as e:
+        raise HTTPException(
+            status_code=503, detail="Song storage is unavailable, try again shortly",
+            headers={"Retry-After": str(max(int(e.retry_after), 1))}
+        )
+    except Exception as e:
+        logger.error(f"Error uploading songs: {e}")
+        raise HTTPException(status_code=500, detail="Failed to upload songs")
+
 @router.get("/")
-async def get_songs(limit: int = 100):
+async def get_songs(limit: int = 100, supabase_service: SupabaseService = Depends(get_supabase_service)):
     """Get all songs"""
     try:
         songs = await supabase_service.get_all_songs(limit)
-        return {"songs": songs}
+        return FastJSONResponse({"songs": songs})
     except Exception as e:
         logger.error(f"Error fetching songs: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch songs")
 
+@router.get("/search")
+async def search_songs(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    supabase_service: SupabaseService = Depends(get_supabase_service)
+):
+    """Search uploaded songs, ranked by relevance"""
+    try:
+        # Fetch one extra row to tell the client whether another page exists
+        songs = await supabase_service.search_songs(q, limit + 1, offset)
+        return FastJSONResponse({
+            "songs": songs[:limit],
+            "offset": offset,
+            "limit": limit,
+            "has_more": len(songs) > limit
+        })
+    except Exception as e:
+        logger.error(f"Error searching songs: {e}")
+        raise HTTPException(status_code=500, detail="Failed to search songs")
+
 @router.get("/featured-playlists")
-async def get_featured_playlists():
+async def get_featured_playlists(supabase_service: SupabaseService = Depends(get_supabase_service)):
     """Get featured playlists with songs"""
     try:
         playlists = await supabase_service.get_featured_playlists()
-        return {"playlists": playlists}
+        return FastJSONResponse({"playlists": playlists})
     except Exception as e:
         logger.error(f"Error fetching playlists: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch playlists")
+
+@router.api_route("/{song_id}/stream", methods=["GET", "HEAD"])
+async def stream_song(
+    song_id: str,
+    request: Request,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    audio_cache: DiskLRUCache = Depends(get_audio_cache)
+):
+    """Stream a song's audio with Range and conditional request support"""
+    try:
+        song = await supabase_service.get_song(song_id)
+        if song is None and is_degraded(SUPABASE):
+            raise HTTPException(status_code=503, detail="Song storage is unavailable, try again shortly")
+        if not song or not song.get("audio_url"):
+            raise HTTPException(status_code=404, detail="Song not found")
+        
+        filename = SupabaseService.storage_filename(song["audio_url"])
+        # Upload filenames are unique and never reused, so the name is a strong validator
+        etag = f'"{filename}"'
+        last_modified = datetime.fromisoformat(song["created_at"]) if song.get("created_at") else None
+        media_type = mimetypes.guess_type(filename)[0] or "audio/mpeg"
+        
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        
+        path = audio_cache.get(filename)
+        if path is not None:
+            try:
+                return file_response(request, path, etag, last_modified, media_type)
+            except FileNotFoundError:
+                pass  # Evicted by another worker since the lookup
+        
+        # Serve this request straight from storage and keep a local copy for the next one
+        audio_cache.fill_in_background(filename, song["audio_url"])
+        return await proxy_response(request, song["audio_url"], etag, last_modified, media_type)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming song: {e}")
+        raise HTTPException(status_code=500, detail="Failed to stream song")
+
+
+@router.get("/{song_id}/waveform")
+async def get_waveform(
+    song_id: str,
+    request: Request,
+    bins: int = Query(512, description="One of 128, 512 or 2048"),
+    bits: int = Query(8, description="Sample width: 8 or 16"),
+    waveform_store: WaveformStore = Depends(get_waveform_store)
+):
+    """Precomputed waveform peaks: ``bins`` interleaved min/max pairs of little-endian signed integers.
+
+    16-bit peaks are raw sample values; 8-bit peaks are normalised to the song's loudest peak.
+    """
+    if bins not in WAVEFORM_RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"bins must be one of {', '.join(map(str, sorted(WAVEFORM_RESOLUTIONS)))}")
+    if bits not in (8, 16):
+        raise HTTPException(status_code=400, detail="bits must be 8 or 16")
+    try:
+        waveform = await waveform_store.get(song_id, bins)
+        if waveform is None:
+            raise HTTPException(status_code=404, detail="Waveform not available")
+        
+        # Peaks depend only on the uploaded file, which never changes
+        etag = f'"{song_id}-{bins}-{bits}"'
+        not_modified = not_modified_response(request, etag, waveform["created_at"])
+        if not_modified is not None:
+            return not_modified
+        
+        peaks = waveform["peaks"] if bits == 16 else to_int8(waveform["peaks"])
+        return Response(
+            content=peaks,
+            media_type="application/octet-stream",
+            headers=validator_headers(etag, waveform["created_at"])
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching waveform: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch waveform")
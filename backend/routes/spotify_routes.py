@@ -1,21 +1,64 @@
-from fastapi import APIRouter, HTTPException, Header, Query
-from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Depends
+from typing import Optional, Dict, List
+from datetime import datetime, timedelta, timezone
+import asyncio
+import httpx
 import logging
+import numpy as np
 from services.spotify_oauth import SpotifyOAuth
-from services.spotify_service import SpotifyService
+from services.spotify_service import SpotifyService, is_upstream_failure
 from services.mood_calculator import MoodCalculator
-from pydantic import BaseModel
+from services.mood_index import FEATURES, MoodIndex, feature_vector
+from services.search_cache import SearchCache, SearchSuperseded, client_key
+from services.playlist_mood_store import PlaylistMoodStore, snapshot_fingerprint
+from services.playlist_moods import calculate_playlist_moods
+from services.mood_history import HISTORY_INTERVALS, MoodHistoryStore, MoodSnapshotter
+from services.mood_diff import diff_snapshots
+from services.playlist_generator import ARCS, GENERATOR_POOL_MIN_TRACKS, generate_playlist
+from services.featured_precompute import FeaturedPrecompute
+from services.dashboard_tasks import DashboardTasks
+from services.library_sync import LIBRARY_MOOD_POOL_MIN_TRACKS, LIBRARY_SCOPES, LibraryStore, LibrarySync
+from services.worker_pool import WorkerPool, WorkerPoolOverloaded
+from services.tracing import span
+from services.projection import TRACK_FIELDS, PLAYLIST_FIELDS, parse_fields, project, spotify_fields
+from responses import FastJSONResponse
+from dependencies import (
+    get_dashboard_tasks, get_featured_precompute, get_library_store, get_library_sync, get_mood_history,
+    get_mood_snapshotter, get_mood_store, get_playlist_index, get_search_cache, get_spotify_oauth,
+    get_spotify_service, get_track_index, get_worker_pool
+)
+from pydantic import BaseModel, Field
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/spotify", tags=["spotify"])
-oauth = SpotifyOAuth()
 
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
+class GeneratePlaylistRequest(BaseModel):
+    length: int = Field(20, ge=1, le=100)
+    energy: Optional[float] = Field(None, ge=0, le=1)
+    valence: Optional[float] = Field(None, ge=0, le=1)
+    tempo: Optional[float] = Field(None, ge=0, le=250)
+    danceability: Optional[float] = Field(None, ge=0, le=1)
+    arc: str = Field('flat', pattern=f"^({'|'.join(ARCS)})$")
+    arc_span: float = Field(0.4, ge=0, le=1)
+    # 'library' reads the synced library from the database instead of Spotify
+    source: str = Field('saved', pattern='^(saved|playlists|library)$')
+    pool_size: int = Field(2000, ge=1, le=10000)
+
+# Per-part time budget (seconds) for the dashboard; slower parts come back pending
+DASHBOARD_TIMEOUTS = {
+    'profile': 2.0,
+    'playlists': 2.0,
+    'featured': 2.0,
+    'moods': 4.0
+}
+
+
 @router.get("/auth/login")
-async def spotify_login():
+async def spotify_login(oauth: SpotifyOAuth = Depends(get_spotify_oauth)):
     """Initiate Spotify OAuth flow"""
     try:
         auth_url = oauth.get_auth_url()
@@ -25,7 +68,7 @@ async def spotify_login():
         raise HTTPException(status_code=500, detail="Failed to generate authorization URL")
 
 @router.get("/auth/callback")
-async def spotify_callback(code: str = Query(...)):
+async def spotify_callback(code: str = Query(...), oauth: SpotifyOAuth = Depends(get_spotify_oauth)):
     """Handle Spotify OAuth callback"""
     try:
         tokens = await oauth.exchange_code(code)
@@ -35,7 +78,7 @@ async def spotify_callback(code: str = Query(...)):
         raise HTTPException(status_code=400, detail="Failed to exchange authorization code")
 
 @router.post("/auth/refresh")
-async def refresh_access_token(request: RefreshTokenRequest):
+async def refresh_access_token(request: RefreshTokenRequest, oauth: SpotifyOAuth = Depends(get_spotify_oauth)):
     """Refresh Spotify access token"""
     try:
         tokens = await oauth.refresh_token(request.refresh_token)
@@ -46,30 +89,74 @@ async def refresh_access_token(request: RefreshTokenRequest):
 
 @router.get("/playlists/featured")
 async def get_featured_playlists(
-    authorization: str = Header(...),
-    limit: int = Query(20, ge=1, le=50)
+    limit: int = Query(20, ge=1, le=50),
+    fields: Optional[str] = Query(None),
+    moods: bool = Query(False),
+    country: Optional[str] = Query(None, pattern="^[A-Z]{2}$"),
+    service: SpotifyService = Depends(get_spotify_service),
+    precompute: FeaturedPrecompute = Depends(get_featured_precompute)
 ):
-    """Get featured playlists"""
+    """Get featured playlists, optionally with each playlist's mood embedded"""
     try:
-        access_token = authorization.replace("Bearer ", "")
-        service = SpotifyService(access_token)
-        playlists = await service.get_featured_playlists(limit)
-        return {"playlists": playlists}
+        field_tree = parse_fields(fields or PLAYLIST_FIELDS)
+        if not moods:
+            playlists = await service.get_featured_playlists(limit, country)
+            return FastJSONResponse({"playlists": project(playlists, field_tree)})
+        
+        # Precomputed on a schedule, so this is normally a cache hit
+        playlists = await precompute.get(service, country)
+        return FastJSONResponse({
+            "playlists": [
+                {**project(playlist, field_tree), "mood": playlist['mood']}
+                for playlist in playlists[:limit]
+            ]
+        })
+    except WorkerPoolOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, try again shortly", headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Error fetching featured playlists: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch featured playlists")
 
 @router.get("/playlists/user")
 async def get_user_playlists(
-    authorization: str = Header(...),
-    limit: int = Query(50, ge=1, le=50)
+    limit: int = Query(50, ge=1, le=50),
+    mood: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None),
+    store: PlaylistMoodStore = Depends(get_mood_store),
+    pool: WorkerPool = Depends(get_worker_pool),
+    service: SpotifyService = Depends(get_spotify_service)
 ):
-    """Get user's playlists"""
+    """Get user's playlists, optionally only those in a mood category"""
     try:
-        access_token = authorization.replace("Bearer ", "")
-        service = SpotifyService(access_token)
         playlists = await service.get_user_playlists(limit)
-        return {"playlists": playlists}
+        field_tree = parse_fields(fields or PLAYLIST_FIELDS)
+        if mood is None:
+            return FastJSONResponse({"playlists": project(playlists, field_tree)})
+        
+        if mood not in MoodCalculator.MOOD_CATEGORIES:
+            raise HTTPException(status_code=400, detail=f"Unknown mood category: {mood}")
+        
+        # Only playlists whose snapshot changed (or that lack one) need a recompute
+        by_id = {playlist['id']: playlist for playlist in playlists if playlist and playlist.get('id')}
+        fingerprints = {
+            playlist_id: snapshot_fingerprint(playlist['snapshot_id'])
+            for playlist_id, playlist in by_id.items() if playlist.get('snapshot_id')
+        }
+        stale = await store.stale(fingerprints)
+        stale += [playlist_id for playlist_id in by_id if playlist_id not in fingerprints]
+        await calculate_playlist_moods(service, [by_id[playlist_id] for playlist_id in stale], store, pool)
+        
+        matches = await store.find_by_mood(mood, list(by_id))
+        return FastJSONResponse({
+            "playlists": [
+                {**project(by_id[match['playlist_id']], field_tree), "mood": match['mood']}
+                for match in matches
+            ]
+        })
+    except HTTPException:
+        raise
+    except WorkerPoolOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, try again shortly", headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Error fetching user playlists: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch user playlists")
@@ -77,57 +164,424 @@ async def get_user_playlists(
 @router.get("/playlists/{playlist_id}/tracks")
 async def get_playlist_tracks(
     playlist_id: str,
-    authorization: str = Header(...),
-    limit: int = Query(50, ge=1, le=100)
+    limit: int = Query(50, ge=1, le=100),
+    snapshot_id: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None),
+    service: SpotifyService = Depends(get_spotify_service)
 ):
-    """Get tracks from a playlist"""
+    """Get tracks from a playlist, projected to the compact track shape or ``fields``"""
     try:
-        access_token = authorization.replace("Bearer ", "")
-        service = SpotifyService(access_token)
-        tracks = await service.get_playlist_tracks(playlist_id, limit)
-        return {"tracks": tracks}
+        field_tree = parse_fields(fields or TRACK_FIELDS)
+        tracks = await service.get_playlist_tracks(
+            playlist_id, limit, snapshot_id=snapshot_id, fields=spotify_fields(field_tree)
+        )
+        return FastJSONResponse({"tracks": project(tracks, field_tree)})
     except Exception as e:
         logger.error(f"Error fetching playlist tracks: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch playlist tracks")
 
+async def _playlist_snapshot(service: SpotifyService, playlist_id: str) -> str:
+    """The playlist's snapshot_id, once Spotify has confirmed the caller's token can read it"""
+    try:
+        snapshot_id = await service.get_playlist_snapshot(playlist_id)
+    except Exception as e:
+        if isinstance(e, httpx.HTTPStatusError) and e.response.status_code in (401, 403):
+            raise HTTPException(status_code=e.response.status_code, detail="No access to this playlist")
+        if is_upstream_failure(e):
+            raise HTTPException(status_code=503, detail="Spotify is unavailable, try again shortly")
+        raise
+    if snapshot_id is None:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    return snapshot_id
+
 @router.get("/playlists/{playlist_id}/mood")
 async def get_playlist_mood(
     playlist_id: str,
-    authorization: str = Header(...)
+    background_tasks: BackgroundTasks,
+    store: PlaylistMoodStore = Depends(get_mood_store),
+    pool: WorkerPool = Depends(get_worker_pool),
+    history: MoodHistoryStore = Depends(get_mood_history),
+    snapshotter: MoodSnapshotter = Depends(get_mood_snapshotter),
+    service: SpotifyService = Depends(get_spotify_service)
 ):
     """Calculate mood for a playlist based on audio features"""
     try:
-        access_token = authorization.replace("Bearer ", "")
-        service = SpotifyService(access_token)
-        
-        # Get playlist tracks
-        tracks = await service.get_playlist_tracks(playlist_id, limit=50)
-        
-        if not tracks:
+        # A stored mood is served on the snapshot alone, so it must be one Spotify
+        # gave this token, never one from the query string
+        snapshot_id = await _playlist_snapshot(service, playlist_id)
+        moods = await calculate_playlist_moods(service, [{'id': playlist_id, 'snapshot_id': snapshot_id}], store, pool)
+        mood_data = moods.get(playlist_id)
+        if mood_data is None:
             raise HTTPException(status_code=404, detail="No tracks found in playlist")
         
-        # Get track IDs
-        track_ids = [track['id'] for track in tracks if track and track.get('id')]
-        
-        # Get audio features
-        audio_features = await service.get_audio_features(track_ids)
-        
-        # Calculate mood
-        mood_data = MoodCalculator.calculate_mood(audio_features)
+        # Requested playlists get periodic mood snapshots; the first is taken now
+        if await history.watch(playlist_id):
+            background_tasks.add_task(snapshotter.snapshot, service, playlist_id)
         
         return mood_data
     except HTTPException:
         raise
+    except WorkerPoolOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, try again shortly", headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Error calculating playlist mood: {e}")
         raise HTTPException(status_code=500, detail="Failed to calculate playlist mood")
 
+@router.get("/playlists/{playlist_id}/mood/history")
+async def get_playlist_mood_history(
+    playlist_id: str,
+    days: int = Query(90, ge=1, le=3650),
+    interval: Optional[str] = Query(None, pattern=f"^({'|'.join(HISTORY_INTERVALS)})$"),
+    history: MoodHistoryStore = Depends(get_mood_history),
+    service: SpotifyService = Depends(get_spotify_service)
+):
+    """A playlist's mood over time, optionally averaged per hour/day/week/month"""
+    try:
+        # History is shared by everyone who can read the playlist, and only them
+        await _playlist_snapshot(service, playlist_id)
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        points = await history.history(playlist_id, since, interval=interval)
+        return FastJSONResponse({"playlist_id": playlist_id, "interval": interval, "points": points})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching playlist mood history: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch playlist mood history")
+
+@router.get("/playlists/{playlist_id}/mood/diff")
+async def get_playlist_mood_diff(
+    playlist_id: str,
+    since: Optional[datetime] = Query(None, description="Compare from the snapshot at this time; default the previous one"),
+    until: Optional[datetime] = Query(None, description="Compare to the snapshot at this time; default the latest"),
+    limit: int = Query(20, ge=1, le=100),
+    history: MoodHistoryStore = Depends(get_mood_history),
+    service: SpotifyService = Depends(get_spotify_service)
+):
+    """How a playlist's mood changed between two snapshots and which tracks caused it"""
+    try:
+        await _playlist_snapshot(service, playlist_id)
+        after = await history.snapshot_at(playlist_id, until)
+        if after is None:
+            raise HTTPException(status_code=404, detail="No mood history for this playlist")
+        if since is not None:
+            before = await history.snapshot_at(playlist_id, since)
+        else:
+            before = await history.snapshot_at(playlist_id, after["ts"], skip=1)
+        if before is None or before["ts"] >= after["ts"]:
+            raise HTTPException(status_code=404, detail="Not enough mood history to compare")
+        
+        return FastJSONResponse({"playlist_id": playlist_id, **diff_snapshots(before, after, limit)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error diffing playlist mood: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compare playlist mood")
+
+async def _user_id(service: SpotifyService) -> str:
+    profile = await service.get_user_profile()
+    if not profile or not profile.get('id'):
+        raise HTTPException(status_code=401, detail="Could not identify the Spotify user")
+    return profile['id']
+
+async def _track_pool(service: SpotifyService, source: str, size: int) -> List[Dict]:
+    """Candidate tracks for generation: saved tracks, or the tracks of the user's playlists"""
+    if source == 'saved':
+        return await service.get_saved_tracks(size)
+    
+    playlists = await service.get_user_playlists(50)
+    track_lists = await asyncio.gather(*(
+        service.get_playlist_tracks(playlist['id'], 100, snapshot_id=playlist.get('snapshot_id'))
+        for playlist in playlists if playlist and playlist.get('id')
+    ))
+    tracks = {}
+    for track in (track for track_list in track_lists for track in track_list):
+        if track and track.get('id'):
+            tracks.setdefault(track['id'], track)
+    return list(tracks.values())[:size]
+
+@router.post("/playlists/generate")
+async def generate_mood_playlist(
+    body: GeneratePlaylistRequest,
+    pool: WorkerPool = Depends(get_worker_pool),
+    library: LibraryStore = Depends(get_library_store),
+    service: SpotifyService = Depends(get_spotify_service)
+):
+    """Build a playlist from the user's tracks that hits a target mood, optionally following an arc"""
+    target = {name: getattr(body, name) for name in FEATURES}
+    if all(value is None for value in target.values()):
+        raise HTTPException(status_code=400, detail=f"Provide at least one of: {', '.join(FEATURES)}")
+    try:
+        if body.source == 'library':
+            entries = await library.library(await _user_id(service), 'saved', body.pool_size)
+            tracks = [entry['track'] for entry in entries]
+            track_ids = [track['id'] for track in tracks]
+            audio_features = [entry.get('features') for entry in entries]
+        else:
+            tracks = await _track_pool(service, body.source, body.pool_size)
+            track_ids = [track['id'] for track in tracks if track and track.get('id')]
+            audio_features = await service.get_audio_features(track_ids)
+        candidates = [
+            (track_id, features) for track_id, features in zip(track_ids, audio_features)
+            if features and all(features.get(name) is not None for name in FEATURES)
+        ]
+        if not candidates:
+            raise HTTPException(status_code=404, detail="No tracks with audio features to choose from")
+        
+        args = ([track_id for track_id, _ in candidates], [features for _, features in candidates],
+                target, body.length, body.arc, body.arc_span)
+        if len(candidates) >= GENERATOR_POOL_MIN_TRACKS:
+            result = await pool.submit(generate_playlist, *args)
+        else:
+            result = generate_playlist(*args)
+        
+        by_id = {track['id']: track for track in tracks if track and track.get('id')}
+        features_by_id = dict(candidates)
+        field_tree = parse_fields(TRACK_FIELDS)
+        return FastJSONResponse({
+            "tracks": [
+                {
+                    **project(by_id[track_id], field_tree),
+                    "features": {name: features_by_id[track_id][name] for name in FEATURES},
+                    "target": slot_target
+                }
+                for track_id, slot_target in zip(result['track_ids'], result['targets'])
+            ],
+            "mood": result['mood'],
+            "cost": result['cost'],
+            "pool_size": len(candidates)
+        })
+    except HTTPException:
+        raise
+    except WorkerPoolOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, try again shortly", headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error(f"Error generating playlist: {e}")
+        raise HTTPException(status_code=500, detail="Failed to generate playlist")
+
+@router.post("/library/sync", status_code=202)
+async def sync_library(
+    background_tasks: BackgroundTasks,
+    full: bool = Query(False, description="Re-read the whole library, dropping tracks no longer saved"),
+    library: LibraryStore = Depends(get_library_store),
+    library_sync: LibrarySync = Depends(get_library_sync),
+    service: SpotifyService = Depends(get_spotify_service)
+):
+    """Start syncing the user's saved and top tracks, with audio features, into the database"""
+    try:
+        user_id = await _user_id(service)
+        if not await library.begin_sync(user_id):
+            return {"user_id": user_id, "status": "running", "started": False}
+        background_tasks.add_task(library_sync.sync, service, user_id, full)
+        return {"user_id": user_id, "status": "running", "started": True, "full": full}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting library sync: {e}")
+        raise HTTPException(status_code=500, detail="Failed to start library sync")
+
+@router.get("/library/status")
+async def get_library_status(
+    library: LibraryStore = Depends(get_library_store),
+    service: SpotifyService = Depends(get_spotify_service)
+):
+    """State of the user's last or running library sync"""
+    try:
+        status = await library.status(await _user_id(service))
+        if status is None:
+            raise HTTPException(status_code=404, detail="Library has not been synced")
+        return FastJSONResponse(status)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching library status: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch library status")
+
+@router.get("/library/mood")
+async def get_library_mood(
+    scope: str = Query("saved", pattern=f"^({'|'.join(LIBRARY_SCOPES)})$"),
+    by: Optional[str] = Query(None, pattern="^month$", description="Also break saved tracks down by month added"),
+    library: LibraryStore = Depends(get_library_store),
+    pool: WorkerPool = Depends(get_worker_pool),
+    service: SpotifyService = Depends(get_spotify_service)
+):
+    """Mood of the synced library or of a top-tracks range, computed from stored features"""
+    try:
+        entries = await library.library(await _user_id(service), scope)
+        if not entries:
+            raise HTTPException(status_code=404, detail="Library has not been synced")
+        
+        analysed = [entry for entry in entries if entry.get('features')]
+        feature_sets = [[entry['features'] for entry in analysed]]
+        months: List[str] = []
+        if by == "month" and scope == "saved":
+            by_month: Dict[str, List[Dict]] = {}
+            for entry in analysed:
+                by_month.setdefault(entry['saved_at'][:7], []).append(entry['features'])
+            months = sorted(by_month)
+            feature_sets += [by_month[month] for month in months]
+        
+        if len(analysed) >= LIBRARY_MOOD_POOL_MIN_TRACKS:
+            moods = await pool.submit(MoodCalculator.calculate_moods, feature_sets)
+        else:
+            with span('MoodCalculator.calculate_moods', attributes={'mood.sets': len(feature_sets)}):
+                moods = MoodCalculator.calculate_moods(feature_sets)
+        
+        result = {"scope": scope, "tracks": len(entries), "analysed": len(analysed), "mood": moods[0]}
+        if by == "month" and scope == "saved":
+            result["by_month"] = [
+                {"month": month, "tracks": len(feature_set), **mood}
+                for month, feature_set, mood in zip(months, feature_sets[1:], moods[1:])
+            ]
+        return FastJSONResponse(result)
+    except HTTPException:
+        raise
+    except WorkerPoolOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, try again shortly", headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error(f"Error calculating library mood: {e}")
+        raise HTTPException(status_code=500, detail="Failed to calculate library mood")
+
+@router.get("/recommendations/mood")
+async def get_mood_recommendations(
+    kind: str = Query("tracks", pattern="^(tracks|playlists)$"),
+    playlist_id: Optional[str] = Query(None),
+    energy: Optional[float] = Query(None, ge=0, le=1),
+    valence: Optional[float] = Query(None, ge=0, le=1),
+    tempo: Optional[float] = Query(None, ge=0),
+    danceability: Optional[float] = Query(None, ge=0, le=1),
+    limit: int = Query(20, ge=1, le=100),
+    store: PlaylistMoodStore = Depends(get_mood_store),
+    pool: WorkerPool = Depends(get_worker_pool),
+    track_index: MoodIndex = Depends(get_track_index),
+    playlist_index: MoodIndex = Depends(get_playlist_index),
+    service: SpotifyService = Depends(get_spotify_service)
+):
+    """Find tracks or playlists closest to a target mood or to a playlist's mood.
+
+    Playlists come from the public featured playlists and the caller's own.
+    """
+    try:
+        target = {'energy': energy, 'valence': valence, 'tempo': tempo, 'danceability': danceability}
+        exclude: List[str] = []
+        if playlist_id:
+            vector = playlist_index.get(playlist_id)
+            if vector is None:
+                moods = await calculate_playlist_moods(service, [{'id': playlist_id}], store, pool)
+                mood_data = moods.get(playlist_id)
+                if mood_data is None:
+                    raise HTTPException(status_code=404, detail="No tracks found in playlist")
+                vector = feature_vector(mood_data)
+            exclude = [playlist_id]
+        else:
+            vector = feature_vector(target)
+            if vector is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Provide playlist_id or all of: {', '.join(FEATURES)}"
+                )
+        
+        if kind == "tracks":
+            matches = track_index.nearest(vector, limit, exclude=exclude)
+            indexed = len(track_index)
+        else:
+            # Other users' playlists may be private, so only featured ones are shared
+            candidates = dict(playlist_index.nearest(vector, limit, exclude=exclude))
+            own_ids = [playlist['id'] for playlist in await service.get_user_playlists() if playlist and playlist.get('id')]
+            own = await store.moods(own_ids)
+            for own_id, mood_data in own.items():
+                own_vector = feature_vector(mood_data)
+                if own_vector is not None and mood_data['overall_mood'] != 'Unknown' and own_id not in exclude:
+                    candidates[own_id] = float(np.linalg.norm(own_vector - vector))
+            matches = sorted(candidates.items(), key=lambda match: match[1])[:limit]
+            indexed = len(playlist_index) + len(own)
+        return {
+            "kind": kind,
+            "results": [{"id": item_id, "distance": round(distance, 4)} for item_id, distance in matches],
+            "indexed": indexed
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error finding mood recommendations: {e}")
+        raise HTTPException(status_code=500, detail="Failed to find mood recommendations")
+
+@router.get("/dashboard")
+async def get_dashboard(
+    parts: str = Query(",".join(DASHBOARD_TIMEOUTS)),
+    store: PlaylistMoodStore = Depends(get_mood_store),
+    pool: WorkerPool = Depends(get_worker_pool),
+    dashboard_tasks: DashboardTasks = Depends(get_dashboard_tasks),
+    service: SpotifyService = Depends(get_spotify_service)
+):
+    """Fetch profile, playlists, featured playlists and moods concurrently.
+
+    Each part has its own timeout; parts that miss it are listed under
+    ``pending`` and keep running, so polling again with ``parts=<pending>``
+    returns them without redoing the work.
+    """
+    try:
+        requested = [part for part in parts.split(",") if part in DASHBOARD_TIMEOUTS]
+        if not requested:
+            raise HTTPException(status_code=400, detail=f"parts must include any of: {', '.join(DASHBOARD_TIMEOUTS)}")
+        
+        client_id = client_key(service.access_token)
+        
+        # A parked moods task already has its playlists; fetching them again would orphan the task
+        playlists_task = None
+        if 'playlists' in requested or ('moods' in requested and not dashboard_tasks.parked(client_id, 'moods')):
+            playlists_task = dashboard_tasks.resume(client_id, 'playlists', service.get_user_playlists)
+        
+        async def moods() -> Dict[str, Dict]:
+            playlists = await asyncio.shield(playlists_task)
+            playlists = [playlist for playlist in playlists if playlist and playlist.get('id')]
+            return await calculate_playlist_moods(service, playlists, store, pool)
+        
+        factories = {
+            'profile': service.get_user_profile,
+            'featured': service.get_featured_playlists,
+            'moods': moods
+        }
+        tasks = {
+            part: playlists_task if part == 'playlists' else dashboard_tasks.resume(client_id, part, factories[part])
+            for part in requested
+        }
+        
+        async def settle(part: str, task: asyncio.Task):
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), DASHBOARD_TIMEOUTS[part])
+            except asyncio.TimeoutError:
+                dashboard_tasks.park(client_id, part, task)
+                raise
+        
+        results = await asyncio.gather(
+            *(settle(part, task) for part, task in tasks.items()),
+            return_exceptions=True
+        )
+        
+        response = {"pending": [], "failed": []}
+        compact_playlist = parse_fields(PLAYLIST_FIELDS)
+        for part, result in zip(tasks, results):
+            if isinstance(result, asyncio.TimeoutError):
+                response["pending"].append(part)
+                result = None
+            elif isinstance(result, Exception):
+                logger.error(f"Error fetching dashboard {part}: {result}")
+                response["failed"].append(part)
+                result = None
+            elif part in ('playlists', 'featured'):
+                result = project(result, compact_playlist)
+            response[part] = result
+        return FastJSONResponse(response)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching dashboard: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch dashboard")
+
 @router.get("/user/profile")
-async def get_user_profile(authorization: str = Header(...)):
+async def get_user_profile(service: SpotifyService = Depends(get_spotify_service)):
     """Get current user's profile"""
     try:
-        access_token = authorization.replace("Bearer ", "")
-        service = SpotifyService(access_token)
         profile = await service.get_user_profile()
         
         if not profile:
@@ -142,16 +596,21 @@ async def get_user_profile(authorization: str = Header(...)):
 
 @router.get("/search")
 async def search_tracks(
-    authorization: str = Header(...),
     q: str = Query(..., min_length=1),
-    limit: int = Query(20, ge=1, le=50)
+    limit: int = Query(20, ge=1, le=50),
+    fields: Optional[str] = Query(None),
+    search_cache: SearchCache = Depends(get_search_cache),
+    service: SpotifyService = Depends(get_spotify_service)
 ):
     """Search for tracks"""
     try:
-        access_token = authorization.replace("Bearer ", "")
-        service = SpotifyService(access_token)
-        tracks = await service.search_tracks(q, limit)
-        return {"tracks": tracks}
+        tracks = await search_cache.search(
+            q, limit, service.search_tracks, client_id=client_key(service.access_token)
+        )
+        return FastJSONResponse({"tracks": project(tracks, parse_fields(fields or TRACK_FIELDS))})
+    except SearchSuperseded:
+        # A newer keystroke from this client replaced the query; its response wins
+        return {"tracks": [], "superseded": True}
     except Exception as e:
         logger.error(f"Error searching tracks: {e}")
         raise HTTPException(status_code=500, detail="Failed to search tracks")
@@ -1,28 +1,219 @@
-from fastapi import FastAPI, APIRouter
-from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import FastAPI, APIRouter, Depends, Request
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
-import os
 import logging
-from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from config import get_settings
+from dependencies import get_cache, get_db, get_spotify_limiter, get_spotify_oauth, get_supabase_service, get_worker_pool
 from routes.spotify_routes import router as spotify_router
 from routes.songs_routes import router as songs_router
+from routes.jobs_routes import router as jobs_router
+from routes.admin_routes import router as admin_router
+from services.audio_files import AudioFileStore
+from services.cache import MemoryBackend, MongoBackend, RedisBackend, TieredCache
+from services.cache_bus import MongoInvalidationBus, RedisInvalidationBus
+from services.circuit_breaker import CircuitBreaker
+from services.dashboard_tasks import DashboardTasks
+from services.disk_cache import DiskLRUCache
+from services.featured_precompute import FeaturedPrecompute
+from services.leader import Scheduler
+from services.library_sync import LibraryStore, LibrarySync
+from services.mood_history import MoodHistoryStore, MoodSnapshotter
+from services.mood_index import MoodIndex
+from services.search_cache import SearchCache
+from services.rate_limiter import DistributedTokenBucket
+from services.playlist_mood_store import PlaylistMoodStore
+from services.profiler import SamplingProfiler
+from services.worker_pool import WorkerPool
+from services.job_queue import JobQueue
+from services.latency import RouteLatency
+from services.song_processing import SongProcessor
+from services.supabase_service import is_upstream_failure as is_supabase_failure
+from services.tracing import OTLPExporter, SlowTraces
+from services.transcoding import find_ffmpeg
+from services.waveform_store import WaveformStore
+from middleware.compression import CompressionMiddleware
+from middleware.deadline import DeadlineMiddleware
+from middleware.tracing import TracingMiddleware
+from middleware.degradation import DEGRADED_HEADER, DegradationMiddleware
 
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+def build_cache(settings, db) -> TieredCache:
+    """Assemble the cache tiers named in CACHE_BACKENDS, fastest first"""
+    backends = []
+    for name in settings.cache_backends:
+        if name == 'memory':
+            backends.append(MemoryBackend(settings.cache_memory_entries))
+        elif name == 'mongo':
+            backends.append(MongoBackend(db))
+        elif name == 'redis':
+            if not settings.redis_url:
+                raise RuntimeError("CACHE_BACKENDS includes redis but REDIS_URL is not set")
+            backends.append(RedisBackend(settings.redis_url))
+        else:
+            raise RuntimeError(f"Unknown cache backend: {name}")
+
+    bus = None
+    if settings.cache_bus == 'redis':
+        if not settings.redis_url:
+            raise RuntimeError("CACHE_BUS is redis but REDIS_URL is not set")
+        bus = RedisInvalidationBus(settings.redis_url)
+    elif settings.cache_bus == 'mongo':
+        bus = MongoInvalidationBus(db)
+    return TieredCache(backends, bus)
+
+
+async def rebuild_mood_indexes(app: FastAPI) -> None:
+    """Refill this worker's mood indexes from stored features and featured moods after a restart"""
+    try:
+        tracks = await app.state.library_store.index_features(app.state.track_index)
+        playlists = await app.state.featured_precompute.index_cached()
+        logger.info(f"Mood indexes rebuilt with {tracks} tracks and {playlists} featured playlists")
+    except Exception as e:
+        logger.error(f"Error rebuilding mood indexes: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the shared services on startup and release them on shutdown"""
+    settings = get_settings()
+    if not settings.mongo_url or not settings.db_name:
+        raise RuntimeError("MONGO_URL and DB_NAME must be set")
+
+    # MongoDB connection
+    client = AsyncIOMotorClient(settings.mongo_url)
+    db = client[settings.db_name]
+
+    app.state.db = db
+    app.state.cache = build_cache(settings, db)
+    app.state.spotify_limiter = DistributedTokenBucket(
+        db, 'spotify', rate=settings.spotify_rate_limit, capacity=settings.spotify_rate_burst
+    )
+    # Per-worker breakers: a failing upstream is cut off instead of holding requests until it times out
+    app.state.spotify_breaker = CircuitBreaker(
+        'spotify', timeout=settings.spotify_timeout, open_seconds=settings.circuit_open_seconds
+    )
+    app.state.supabase_breaker = CircuitBreaker(
+        'supabase',
+        timeout=settings.supabase_timeout,
+        open_seconds=settings.circuit_open_seconds,
+        is_failure=is_supabase_failure
+    )
+    # Only transfers that time out count against storage: a large file is slow, not failing
+    app.state.storage_breaker = CircuitBreaker(
+        'supabase-storage',
+        timeout=settings.storage_timeout,
+        slow_call_seconds=settings.storage_timeout,
+        open_seconds=settings.circuit_open_seconds,
+        is_failure=is_supabase_failure
+    )
+    app.state.playlist_mood_store = PlaylistMoodStore(db)
+    app.state.mood_history = MoodHistoryStore(db, settings.mood_history_retention_days)
+    app.state.waveform_store = WaveformStore(db)
+    app.state.audio_file_store = AudioFileStore(db)
+    app.state.library_store = LibraryStore(db)
+    # Per worker; tracks are added wherever audio features are fetched, playlists are the featured ones
+    app.state.track_index = MoodIndex()
+    app.state.playlist_index = MoodIndex()
+    app.state.search_cache = SearchCache()
+    app.state.dashboard_tasks = DashboardTasks()
+    app.state.library_sync = LibrarySync(app.state.library_store, settings.library_sync_concurrency)
+    app.state.profiler = SamplingProfiler()
+    app.state.audio_cache = DiskLRUCache(settings.audio_cache_dir, settings.audio_cache_max_bytes)
+    app.state.worker_pool = WorkerPool(
+        max_workers=settings.worker_pool_size,
+        max_queue=settings.worker_pool_queue
+    )
+    app.state.job_queue = JobQueue(
+        db,
+        concurrency=settings.job_workers,
+        visibility_timeout=settings.job_visibility_timeout
+    )
+    app.state.transcode_pool = WorkerPool(
+        max_workers=settings.transcode_workers,
+        max_queue=settings.transcode_queue
+    )
+    song_processor = SongProcessor(
+        lambda: get_supabase_service(app.state.cache, app.state.supabase_breaker, app.state.storage_breaker),
+        app.state.worker_pool,
+        transcode_pool=app.state.transcode_pool,
+        bitrates=settings.transcode_bitrates,
+        ffmpeg=find_ffmpeg(settings.ffmpeg_path) or settings.ffmpeg_path,
+        waveform_store=app.state.waveform_store
+    )
+    app.state.job_queue.register(SongProcessor.POST_PROCESS_JOB, song_processor.post_process)
+    # Workers without ffmpeg leave transcode and waveform jobs queued for one that has it
+    if find_ffmpeg(settings.ffmpeg_path):
+        app.state.job_queue.register(SongProcessor.WAVEFORM_JOB, song_processor.waveform)
+        if settings.transcode_bitrates:
+            app.state.job_queue.register(SongProcessor.TRANSCODE_JOB, song_processor.transcode)
+    else:
+        logger.warning(f"{settings.ffmpeg_path} not found; this worker will not transcode songs or compute waveforms")
+
+    # Periodic jobs run on one elected worker, however many are deployed
+    app.state.scheduler = Scheduler(db)
+    app.state.scheduler.every(
+        'jobs.purge', 3600,
+        lambda: app.state.job_queue.purge(timedelta(days=settings.job_retention_days))
+    )
+    app.state.featured_precompute = FeaturedPrecompute(
+        get_spotify_oauth,
+        app.state.cache,
+        app.state.spotify_limiter,
+        app.state.playlist_mood_store,
+        app.state.worker_pool,
+        countries=settings.featured_countries,
+        breaker=app.state.spotify_breaker,
+        track_index=app.state.track_index,
+        playlist_index=app.state.playlist_index
+    )
+    app.state.scheduler.every(
+        'spotify.featured_moods', settings.featured_refresh_interval, app.state.featured_precompute.run
+    )
+    app.state.mood_snapshotter = MoodSnapshotter(
+        get_spotify_oauth, app.state.cache, app.state.spotify_limiter, app.state.mood_history,
+        breaker=app.state.spotify_breaker
+    )
+    app.state.scheduler.every(
+        'spotify.mood_snapshots', settings.mood_snapshot_interval, app.state.mood_snapshotter.run
+    )
+
+    for backend in app.state.cache.backends:
+        if isinstance(backend, MongoBackend):
+            await backend.ensure_indexes()
+    await app.state.playlist_mood_store.ensure_indexes()
+    await app.state.mood_history.ensure_indexes()
+    await app.state.library_store.ensure_indexes()
+    await app.state.job_queue.ensure_indexes()
+    app.state.audio_cache.start()
+    app.state.worker_pool.start()
+    app.state.transcode_pool.start()
+    app.state.job_queue.start()
+    await app.state.cache.start()
+    app.state.scheduler.start()
+    await app.state.slow_traces.start()
+    rebuild = asyncio.create_task(rebuild_mood_indexes(app))
+    try:
+        yield
+    finally:
+        rebuild.cancel()
+        await app.state.dashboard_tasks.cancel_all()
+        await app.state.scheduler.stop()
+        await app.state.slow_traces.stop()
+        await app.state.job_queue.stop()
+        await app.state.worker_pool.shutdown()
+        await app.state.transcode_pool.shutdown()
+        await app.state.cache.close()
+        client.close()
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -45,7 +236,7 @@ async def root():
     return {"message": "Hello World"}
 
 @api_router.post("/status", response_model=StatusCheck)
-async def create_status_check(input: StatusCheckCreate):
+async def create_status_check(input: StatusCheckCreate, db=Depends(get_db)):
     status_dict = input.model_dump()
     status_obj = StatusCheck(**status_dict)
     
@@ -57,7 +248,7 @@ async def create_status_check(input: StatusCheckCreate):
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
+async def get_status_checks(db=Depends(get_db)):
     # Exclude MongoDB's _id field from the query results
     status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
     
@@ -68,28 +259,82 @@ async def get_status_checks():
     
     return status_checks
 
+@api_router.get("/metrics/worker-pool")
+async def get_worker_pool_metrics(request: Request, pool: WorkerPool = Depends(get_worker_pool)):
+    return {**pool.metrics(), "transcode": request.app.state.transcode_pool.metrics()}
+
+@api_router.get("/metrics/cluster")
+async def get_cluster_metrics(request: Request, limiter: DistributedTokenBucket = Depends(get_spotify_limiter)):
+    return {
+        "scheduler": request.app.state.scheduler.status(),
+        "spotify_rate_limit": limiter.metrics()
+    }
+
+@api_router.get("/metrics/upstreams")
+async def get_upstream_metrics(request: Request):
+    return {
+        "spotify": request.app.state.spotify_breaker.metrics(),
+        "supabase": request.app.state.supabase_breaker.metrics(),
+        "supabase_storage": request.app.state.storage_breaker.metrics()
+    }
+
+@api_router.get("/metrics/latency")
+async def get_latency_metrics(request: Request):
+    return request.app.state.route_latency.metrics()
+
+@api_router.get("/metrics/cache")
+async def get_cache_metrics(request: Request, cache: TieredCache = Depends(get_cache)):
+    return {**cache.metrics(), "audio_disk": request.app.state.audio_cache.metrics()}
+
 # Include the spotify router in the api router
 api_router.include_router(spotify_router)
 api_router.include_router(songs_router)
+api_router.include_router(jobs_router)
+api_router.include_router(admin_router)
 
 # Include the main api router in the app
 app.include_router(api_router)
 
+# Middleware added later wraps what was added before, so requests pass through
+# Degradation -> Compression -> CORS -> Deadline -> Tracing -> routes.
+
+# Span traces of every request; slow ones are kept for /api/admin/traces and exported over OTLP.
+# Innermost, inside Deadline, so a request it cancels still has its trace recorded.
+app.state.slow_traces = SlowTraces(
+    get_settings().slow_request_trace_ms,
+    exporter=OTLPExporter(get_settings().otlp_traces_endpoint) if get_settings().otlp_traces_endpoint else None
+)
+app.add_middleware(TracingMiddleware, slow_traces=app.state.slow_traces)
+
+# Time budget per request, cancellation on client disconnect and per-route latency.
+# Inside CORS, so a 504 it sends still gets CORS headers.
+app.state.route_latency = RouteLatency()
+app.add_middleware(
+    DeadlineMiddleware,
+    latency=app.state.route_latency,
+    default_timeout=get_settings().request_timeout,
+    max_timeout=get_settings().request_timeout_max,
+    exempt_paths=get_settings().deadline_exempt_paths,
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+    allow_origins=get_settings().cors_origins,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[DEGRADED_HEADER],
 )
 
+# Compress JSON/text responses over 1 KB (Brotli when available, else gzip)
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+# Flag responses served from cached data while an upstream is failing
+app.add_middleware(DegradationMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
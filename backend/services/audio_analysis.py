@@ -0,0 +1,27 @@
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import mutagen
+except ImportError:  # pragma: no cover - mutagen is optional
+    mutagen = None
+
+
+def probe_duration_ms(file_data: bytes) -> int:
+    """Read an audio file's duration from its headers; 0 when unknown.
+
+    Parsing walks the container/frame headers in pure Python, so run it on
+    the worker pool rather than the event loop.
+    """
+    if mutagen is None:
+        return 0
+    try:
+        audio = mutagen.File(io.BytesIO(file_data))
+        if audio is None or not getattr(audio, 'info', None):
+            return 0
+        return int(round(audio.info.length * 1000))
+    except Exception as e:
+        logger.warning(f"Could not read audio duration: {e}")
+        return 0
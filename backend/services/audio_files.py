@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi import UploadFile
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """The upload exceeded the size limit; raised before the rest is read"""
+
+
+@dataclass(frozen=True)
+class SpooledUpload:
+    path: str
+    size: int
+    content_hash: str
+
+
+@asynccontextmanager
+async def spool_and_hash(file: UploadFile, max_size: int) -> AsyncIterator[SpooledUpload]:
+    """Copy an upload to a temporary file in chunks, hashing as it arrives.
+
+    At most one chunk is held in memory. The file is removed on exit.
+    """
+    if file.size is not None and file.size > max_size:
+        raise UploadTooLarge(file.size)
+    fd, path = tempfile.mkstemp(prefix='upload-')
+    try:
+        digest = hashlib.sha256()
+        size = 0
+        with os.fdopen(fd, 'wb') as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(size)
+                digest.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+        yield SpooledUpload(path, size, digest.hexdigest())
+    finally:
+        os.unlink(path)
+
+
+def content_filename(content_hash: str, extension: str) -> str:
+    """Storage name for a file: identical contents always map to the same object"""
+    return f"{content_hash}.{extension.lower()}"
+
+
+class AudioFileStore:
+    """Stored audio objects keyed by SHA-256 of their contents.
+
+    The hash is the document ``_id``, so MongoDB's unique ``_id`` index
+    guarantees one record per distinct file even with concurrent uploads.
+
+    This collection, not the songs table, is the authority on which files
+    exist: songs share files by design, so ``songs.audio_url`` is not
+    unique. Losing a record is harmless. Objects are named by their hash,
+    so the next upload of those contents overwrites the same object with
+    the same bytes and records it again.
+    """
+
+    def __init__(self, db):
+        self.collection = db.audio_files
+
+    async def get(self, content_hash: str) -> Optional[Dict]:
+        """Return the stored object for these contents, if it was uploaded before"""
+        try:
+            return await self.collection.find_one({'_id': content_hash})
+        except Exception as e:
+            logger.error(f"Error looking up audio file: {e}")
+            return None
+
+    async def add(self, content_hash: str, filename: str, audio_url: str, size: int, content_type: str) -> None:
+        """Record a newly uploaded object; a concurrent upload of the same file is not an error"""
+        try:
+            await self.collection.insert_one({
+                '_id': content_hash,
+                'filename': filename,
+                'audio_url': audio_url,
+                'size': size,
+                'content_type': content_type,
+                'created_at': datetime.now(timezone.utc)
+            })
+        except DuplicateKeyError:
+            pass
+        except Exception as e:
+            logger.error(f"Error recording audio file: {e}")
+
+    async def remove_unused(self, content_hash: str) -> bool:
+        """Forget an object no upload has reused; True if it was removed and may be deleted from storage"""
+        try:
+            result = await self.collection.delete_one({'_id': content_hash, 'reuses': {'$exists': False}})
+            return result.deleted_count == 1
+        except Exception as e:
+            logger.error(f"Error removing audio file: {e}")
+            return False
+
+    async def record_use(self, content_hash: str) -> None:
+        """Count an upload that reused the stored object"""
+        try:
+            await self.collection.update_one({'_id': content_hash}, {'$inc': {'reuses': 1}})
+        except Exception as e:
+            logger.error(f"Error counting audio file reuse: {e}")
@@ -0,0 +1,171 @@
+import asyncio
+import os
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import httpx
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response, StreamingResponse
+
+# Stored audio files are never overwritten (each upload gets a new name), so
+# browsers and CDNs may keep them for a year without revalidating
+AUDIO_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CHUNK_SIZE = 256 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested byte range lies outside the file"""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into inclusive (start, end).
+
+    Returns None when the whole file should be sent: no header, a malformed
+    one, or several ranges (allowed by RFC 9110 and rare for audio players).
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    spec = header[len('bytes='):].strip()
+    if ',' in spec:
+        return None
+    first, _, last = spec.partition('-')
+    try:
+        if first == '':
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable(header)
+            start, end = max(0, size - suffix), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    headers = {
+        'ETag': etag,
+        'Cache-Control': AUDIO_CACHE_CONTROL
+    }
+    if last_modified is not None:
+        headers['Last-Modified'] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+def not_modified_response(request: Request, etag: str, last_modified: Optional[datetime]) -> Optional[Response]:
+    """Return a 304 when the client's cached copy is current"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        fresh = '*' in tags or etag in tags or f'W/{etag}' in tags
+    else:
+        fresh = _not_modified_since(request.headers.get('if-modified-since'), last_modified)
+    if fresh:
+        return Response(status_code=304, headers=validator_headers(etag, last_modified))
+    return None
+
+
+def _not_modified_since(header: Optional[str], last_modified: Optional[datetime]) -> bool:
+    if not header or last_modified is None:
+        return False
+    try:
+        return parsedate_to_datetime(header) >= last_modified.replace(microsecond=0)
+    except (TypeError, ValueError):
+        return False
+
+
+def _range_header(request: Request, etag: str) -> Optional[str]:
+    # If-Range: only honour the range if the client's copy is still this file
+    if_range = request.headers.get('if-range')
+    if if_range is not None and if_range.strip() != etag:
+        return None
+    return request.headers.get('range')
+
+
+def file_response(request: Request, path: Path, etag: str,
+                  last_modified: Optional[datetime], media_type: str) -> Response:
+    """Serve a cached file, honouring Range"""
+    headers = {**validator_headers(etag, last_modified), 'Accept-Ranges': 'bytes'}
+    # Open first: the file may be evicted at any time, but an open handle keeps it readable
+    handle = open(path, 'rb')
+    size = os.fstat(handle.fileno()).st_size
+    try:
+        byte_range = parse_range(_range_header(request, etag), size)
+    except RangeNotSatisfiable:
+        handle.close()
+        return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+
+    if byte_range is None:
+        handle.close()
+        # FileResponse hands the path to the server via http.response.pathsend
+        # when supported, letting it use sendfile()
+        return FileResponse(path, headers=headers, media_type=media_type, method=request.method)
+
+    start, end = byte_range
+    length = end - start + 1
+    headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    headers['Content-Length'] = str(length)
+    if request.method == 'HEAD':
+        handle.close()
+        return Response(status_code=206, headers=headers, media_type=media_type)
+    return StreamingResponse(_read_range(handle, start, length), status_code=206, headers=headers, media_type=media_type)
+
+
+async def _read_range(handle, start: int, length: int):
+    try:
+        offset, end = start, start + length
+        while offset < end:
+            chunk = await asyncio.to_thread(os.pread, handle.fileno(), min(CHUNK_SIZE, end - offset), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+async def proxy_response(request: Request, url: str, etag: str,
+                         last_modified: Optional[datetime], media_type: str) -> Response:
+    """Stream a file from storage without buffering it, passing Range through"""
+    upstream_headers = {}
+    range_header = _range_header(request, etag)
+    if range_header:
+        upstream_headers['Range'] = range_header
+
+    client = httpx.AsyncClient(timeout=httpx.Timeout(10.0, read=60.0))
+    try:
+        upstream = await client.send(client.build_request(request.method, url, headers=upstream_headers), stream=True)
+    except Exception:
+        await client.aclose()
+        raise
+
+    async def close() -> None:
+        await upstream.aclose()
+        await client.aclose()
+
+    if upstream.status_code not in (200, 206, 416):
+        await close()
+        raise httpx.HTTPStatusError(f"Storage returned {upstream.status_code}", request=upstream.request, response=upstream)
+
+    headers = {**validator_headers(etag, last_modified), 'Accept-Ranges': 'bytes'}
+    for name in ('Content-Length', 'Content-Range'):
+        if name in upstream.headers:
+            headers[name] = upstream.headers[name]
+
+    if request.method == 'HEAD' or upstream.status_code == 416:
+        await close()
+        return Response(status_code=upstream.status_code, headers=headers, media_type=media_type)
+
+    async def body():
+        try:
+            async for chunk in upstream.aiter_raw(CHUNK_SIZE):
+                yield chunk
+        finally:
+            await close()
+
+    return StreamingResponse(body(), status_code=upstream.status_code, headers=headers, media_type=media_type)
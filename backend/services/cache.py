@@ -0,0 +1,483 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence
+
+from pymongo import ReplaceOne
+
+from services.cache_bus import InvalidationBus
+from services.deadlines import start_shared, within_deadline
+from services.tracing import span
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[Any]]
+BatchLoader = Callable[[List[str]], Awaitable[Dict[str, Any]]]
+
+# An entry is a plain dict so every tier can store it as-is:
+# {'value': ..., 'negative': bool, 'fresh_until': epoch, 'stale_until': epoch}
+Entry = Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class Namespace:
+    """Caching policy for one kind of value.
+
+    ``ttl`` is how long a value is fresh, ``stale_ttl`` how much longer it may
+    be served while a refresh runs in the background, and ``negative_ttl``
+    how long a "not found" (a loader returning None) is remembered; 0 turns
+    negative caching off. ``local_only`` keeps values in the in-process tier,
+    for data that must not leave the worker.
+    """
+
+    name: str
+    ttl: float
+    stale_ttl: float = 0.0
+    negative_ttl: float = 0.0
+    local_only: bool = False
+
+
+def _dumps(entry: Entry) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(entry)
+    return json.dumps(entry, separators=(',', ':')).encode()
+
+
+def _loads(data: bytes) -> Entry:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class CacheBackend:
+    """One storage tier. Backends swallow and log their own errors so a
+    failing tier degrades to a miss instead of failing the request."""
+
+    name = 'backend'
+    # Local tiers live inside one worker and need invalidations broadcast to them
+    local = False
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Entry]:
+        raise NotImplementedError
+
+    async def set_many(self, entries: Dict[str, Entry]) -> None:
+        raise NotImplementedError
+
+    async def delete(self, keys: List[str]) -> None:
+        raise NotImplementedError
+
+    async def clear(self, prefix: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """Process-local LRU tier"""
+
+    name = 'memory'
+    local = True
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._data: 'OrderedDict[str, Entry]' = OrderedDict()
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Entry]:
+        now = time.time()
+        found = {}
+        for key in keys:
+            entry = self._data.get(key)
+            if entry is None:
+                continue
+            if entry['stale_until'] <= now:
+                del self._data[key]
+                continue
+            self._data.move_to_end(key)
+            found[key] = entry
+        return found
+
+    async def set_many(self, entries: Dict[str, Entry]) -> None:
+        for key, entry in entries.items():
+            self._data[key] = entry
+            self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    async def delete(self, keys: List[str]) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def clear(self, prefix: str) -> None:
+        for key in [key for key in self._data if key.startswith(prefix)]:
+            del self._data[key]
+
+
+class MongoBackend(CacheBackend):
+    """Shared tier in MongoDB; expired entries are removed by a TTL index"""
+
+    name = 'mongo'
+
+    def __init__(self, db, collection: str = 'cache'):
+        self.collection = db[collection]
+
+    async def ensure_indexes(self) -> None:
+        """Create the TTL index that purges entries once they are past stale"""
+        try:
+            await self.collection.create_index('expire_at', expireAfterSeconds=0)
+        except Exception as e:
+            logger.error(f"Error creating cache indexes: {e}")
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Entry]:
+        try:
+            # The TTL monitor runs about once a minute, so filter expired entries here too
+            cursor = self.collection.find(
+                {'_id': {'$in': keys}, 'stale_until': {'$gt': time.time()}},
+                {'expire_at': 0}
+            )
+            return {doc.pop('_id'): doc async for doc in cursor}
+        except Exception as e:
+            logger.error(f"Error reading Mongo cache: {e}")
+            return {}
+
+    async def set_many(self, entries: Dict[str, Entry]) -> None:
+        if not entries:
+            return
+        try:
+            await self.collection.bulk_write([
+                ReplaceOne(
+                    {'_id': key},
+                    {**entry, 'expire_at': datetime.fromtimestamp(entry['stale_until'], timezone.utc)},
+                    upsert=True
+                )
+                for key, entry in entries.items()
+            ], ordered=False)
+        except Exception as e:
+            logger.error(f"Error writing Mongo cache: {e}")
+
+    async def delete(self, keys: List[str]) -> None:
+        try:
+            await self.collection.delete_many({'_id': {'$in': keys}})
+        except Exception as e:
+            logger.error(f"Error deleting from Mongo cache: {e}")
+
+    async def clear(self, prefix: str) -> None:
+        try:
+            # An anchored prefix regex is answered from the _id index
+            await self.collection.delete_many({'_id': {'$regex': f'^{re.escape(prefix)}'}})
+        except Exception as e:
+            logger.error(f"Error clearing Mongo cache: {e}")
+
+
+class RedisBackend(CacheBackend):
+    """Shared tier on any Redis-protocol server (Redis, Valkey, KeyDB, Dragonfly)"""
+
+    name = 'redis'
+
+    def __init__(self, url: Optional[str] = None, client=None):
+        if client is None:
+            # redis is only needed when this tier is configured
+            import redis.asyncio as redis
+            client = redis.from_url(url)
+        self.client = client
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Entry]:
+        try:
+            values = await self.client.mget(keys)
+            return {key: _loads(value) for key, value in zip(keys, values) if value is not None}
+        except Exception as e:
+            logger.error(f"Error reading Redis cache: {e}")
+            return {}
+
+    async def set_many(self, entries: Dict[str, Entry]) -> None:
+        if not entries:
+            return
+        try:
+            now = time.time()
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, entry in entries.items():
+                    pipe.set(key, _dumps(entry), px=max(1, int((entry['stale_until'] - now) * 1000)))
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error writing Redis cache: {e}")
+
+    async def delete(self, keys: List[str]) -> None:
+        try:
+            await self.client.delete(*keys)
+        except Exception as e:
+            logger.error(f"Error deleting from Redis cache: {e}")
+
+    async def clear(self, prefix: str) -> None:
+        try:
+            batch = []
+            async for key in self.client.scan_iter(match=f'{prefix}*', count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    await self.client.delete(*batch)
+                    batch = []
+            if batch:
+                await self.client.delete(*batch)
+        except Exception as e:
+            logger.error(f"Error clearing Redis cache: {e}")
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class TieredCache:
+    """Read-through cache over ordered tiers, fastest first.
+
+    A hit in a lower tier is copied into the tiers above it. Concurrent
+    misses for the same key share one load (stampede protection), and stale
+    values are served while a single background refresh runs. A shared load
+    runs without a request deadline; each caller waits for it within its own. With a
+    ``bus``, invalidations are broadcast so other workers drop their local
+    copies too.
+    """
+
+    def __init__(self, backends: Sequence[CacheBackend], bus: Optional[InvalidationBus] = None):
+        self.backends = list(backends)
+        self.bus = bus
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    async def get(self, namespace: Namespace, key: str, default: Any = None, refresh: Optional[Loader] = None) -> Any:
+        """Return a cached value (fresh or stale) without loading.
+
+        With ``refresh``, a stale value also starts a background reload
+        through it, as ``get_or_load`` does; a miss still returns ``default``.
+        """
+        full_key = self._key(namespace, key)
+        entry = (await self._lookup(namespace, [full_key])).get(full_key)
+        if entry is None:
+            self._count(namespace, 'misses')
+            return default
+        if self._count_hit(namespace, entry) == 'stale_hits' and refresh is not None:
+            self._refresh(namespace, [full_key], lambda: self._load_one(namespace, full_key, refresh))
+        return entry['value']
+
+    async def set(self, namespace: Namespace, key: str, value: Any) -> None:
+        """Store a value; None is stored as a negative entry.
+
+        Other workers drop their local copies and read the new value from a
+        shared tier. Values of ``local_only`` namespaces are not broadcast:
+        no other worker can have seen them.
+        """
+        full_key = self._key(namespace, key)
+        await self._store(namespace, {full_key: value})
+        if self.bus is not None and not namespace.local_only:
+            await self.bus.publish({'op': 'delete', 'keys': [full_key]})
+
+    async def get_or_load(self, namespace: Namespace, key: str, loader: Loader) -> Any:
+        """Return the cached value, calling ``loader`` on a miss.
+
+        A loader returning None means "not found" and is cached for the
+        namespace's ``negative_ttl``. Loader exceptions are not cached.
+        """
+        full_key = self._key(namespace, key)
+        entry = (await self._lookup(namespace, [full_key])).get(full_key)
+        if entry is not None:
+            if self._count_hit(namespace, entry) == 'stale_hits':
+                self._refresh(namespace, [full_key], lambda: self._load_one(namespace, full_key, loader))
+            return entry['value']
+
+        self._count(namespace, 'misses')
+        task = self._inflight.get(full_key)
+        if task is None:
+            task = self._start(namespace, [full_key], lambda: self._load_one(namespace, full_key, loader))
+        return (await within_deadline(asyncio.shield(task)))[full_key]
+
+    async def get_many_or_load(self, namespace: Namespace, keys: Iterable[str], loader: BatchLoader) -> Dict[str, Any]:
+        """Batch variant of ``get_or_load``.
+
+        ``loader`` receives the missing keys and returns a dict of the ones it
+        found; keys it leaves out are cached as negative entries.
+        """
+        keys = list(dict.fromkeys(keys))
+        full_keys = {self._key(namespace, key): key for key in keys}
+        found = await self._lookup(namespace, list(full_keys))
+
+        results: Dict[str, Any] = {}
+        stale = []
+        for full_key, entry in found.items():
+            if self._count_hit(namespace, entry) == 'stale_hits':
+                stale.append(full_key)
+            results[full_keys[full_key]] = entry['value']
+        if stale:
+            self._refresh(namespace, stale, lambda: self._load_many(namespace, stale, full_keys, loader))
+
+        missing = [full_key for full_key in full_keys if full_key not in found]
+        if not missing:
+            return results
+        self._count(namespace, 'misses', len(missing))
+
+        # Join loads already running for some keys and start one load for the rest
+        waits = {self._inflight[full_key] for full_key in missing if full_key in self._inflight}
+        to_load = [full_key for full_key in missing if full_key not in self._inflight]
+        if to_load:
+            waits.add(self._start(namespace, to_load, lambda: self._load_many(namespace, to_load, full_keys, loader)))
+        loaded: Dict[str, Any] = {}
+        for values in await within_deadline(asyncio.gather(*(asyncio.shield(task) for task in waits))):
+            loaded.update(values)
+        for full_key in missing:
+            results[full_keys[full_key]] = loaded.get(full_key)
+        return results
+
+    async def invalidate(self, namespace: Namespace, *keys: str) -> None:
+        """Drop specific keys from every tier"""
+        full_keys = [self._key(namespace, key) for key in keys]
+        await asyncio.gather(*(backend.delete(full_keys) for backend in self._tiers(namespace)))
+        if self.bus is not None:
+            await self.bus.publish({'op': 'delete', 'keys': full_keys})
+
+    async def clear(self, namespace: Namespace) -> None:
+        """Drop every key in a namespace from every tier"""
+        prefix = self._key(namespace, '')
+        await asyncio.gather(*(backend.clear(prefix) for backend in self._tiers(namespace)))
+        if self.bus is not None:
+            await self.bus.publish({'op': 'clear', 'prefix': prefix})
+
+    async def start(self) -> None:
+        """Start applying invalidations broadcast by other workers"""
+        if self.bus is not None:
+            await self.bus.start(self._apply_invalidation)
+
+    async def _apply_invalidation(self, message: Dict) -> None:
+        for backend in self.backends:
+            if not backend.local:
+                continue
+            if message['op'] == 'delete':
+                await backend.delete(message['keys'])
+            elif message['op'] == 'clear':
+                await backend.clear(message['prefix'])
+
+    async def close(self) -> None:
+        if self.bus is not None:
+            await self.bus.stop()
+        for task in list(self._inflight.values()):
+            task.cancel()
+        for backend in self.backends:
+            await backend.close()
+
+    def metrics(self) -> Dict[str, Dict]:
+        """Per-namespace hit, miss and load counters with the overall hit rate"""
+        report = {}
+        for name, stats in self._stats.items():
+            hits = stats.get('hits', 0) + stats.get('stale_hits', 0)
+            lookups = hits + stats.get('misses', 0)
+            report[name] = {**stats, 'hit_rate': round(hits / lookups, 4) if lookups else 0}
+        return report
+
+    def _tiers(self, namespace: Namespace) -> List[CacheBackend]:
+        if namespace.local_only:
+            return [backend for backend in self.backends if backend.local]
+        return self.backends
+
+    @staticmethod
+    def _key(namespace: Namespace, key: str) -> str:
+        return f'{namespace.name}:{key}'
+
+    def _count(self, namespace: Namespace, counter: str, amount: int = 1) -> None:
+        stats = self._stats.setdefault(namespace.name, {})
+        stats[counter] = stats.get(counter, 0) + amount
+
+    def _count_hit(self, namespace: Namespace, entry: Entry) -> str:
+        counter = 'hits' if entry['fresh_until'] > time.time() else 'stale_hits'
+        self._count(namespace, counter)
+        if entry['negative']:
+            self._count(namespace, 'negative_hits')
+        return counter
+
+    async def _lookup(self, namespace: Namespace, full_keys: List[str]) -> Dict[str, Entry]:
+        found: Dict[str, Entry] = {}
+        remaining = full_keys
+        tiers = self._tiers(namespace)
+        with span('cache lookup', attributes={'cache.namespace': namespace.name, 'cache.keys': len(full_keys)}) as lookup:
+            for depth, backend in enumerate(tiers):
+                if not remaining:
+                    break
+                hits = await backend.get_many(remaining)
+                if not hits:
+                    continue
+                self._count(namespace, f'{backend.name}_hits', len(hits))
+                lookup.set(f'cache.{backend.name}_hits', len(hits))
+                if depth:
+                    await asyncio.gather(*(upper.set_many(hits) for upper in tiers[:depth]))
+                found.update(hits)
+                remaining = [full_key for full_key in remaining if full_key not in hits]
+        return found
+
+    def _start(self, namespace: Namespace, full_keys: List[str], load: Callable[[], Awaitable[Dict[str, Any]]]) -> asyncio.Task:
+        self._count(namespace, 'loads')
+        # Shared by every caller of the key, so no one caller's deadline applies
+        task = start_shared(load())
+        for full_key in full_keys:
+            self._inflight[full_key] = task
+
+        def done(finished: asyncio.Task) -> None:
+            for full_key in full_keys:
+                if self._inflight.get(full_key) is finished:
+                    del self._inflight[full_key]
+            if not finished.cancelled() and finished.exception() is not None:
+                self._count(namespace, 'load_errors')
+
+        task.add_done_callback(done)
+        return task
+
+    def _refresh(self, namespace: Namespace, full_keys: List[str], load: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        full_keys = [full_key for full_key in full_keys if full_key not in self._inflight]
+        if not full_keys:
+            return
+        task = self._start(namespace, full_keys, load)
+
+        def report(finished: asyncio.Task) -> None:
+            # Nobody awaits a refresh, so its errors would otherwise go unseen
+            if not finished.cancelled() and finished.exception() is not None:
+                logger.warning(f"Background refresh in {namespace.name} failed: {finished.exception()}")
+
+        task.add_done_callback(report)
+
+    async def _load_one(self, namespace: Namespace, full_key: str, loader: Loader) -> Dict[str, Any]:
+        values = {full_key: await loader()}
+        await self._store(namespace, values)
+        return values
+
+    async def _load_many(self, namespace: Namespace, full_keys: List[str],
+                         original: Dict[str, str], loader: BatchLoader) -> Dict[str, Any]:
+        loaded = await loader([original[full_key] for full_key in full_keys])
+        values = {full_key: loaded.get(original[full_key]) for full_key in full_keys}
+        await self._store(namespace, values)
+        return values
+
+    async def _store(self, namespace: Namespace, values: Dict[str, Any]) -> None:
+        now = time.time()
+        entries = {}
+        for full_key, value in values.items():
+            if value is None:
+                if namespace.negative_ttl <= 0:
+                    continue
+                entries[full_key] = {
+                    'value': None,
+                    'negative': True,
+                    'fresh_until': now + namespace.negative_ttl,
+                    'stale_until': now + namespace.negative_ttl
+                }
+            else:
+                entries[full_key] = {
+                    'value': value,
+                    'negative': False,
+                    'fresh_until': now + namespace.ttl,
+                    'stale_until': now + namespace.ttl + namespace.stale_ttl
+                }
+        if entries:
+            await asyncio.gather(*(backend.set_many(entries) for backend in self._tiers(namespace)))
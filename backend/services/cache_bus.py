@@ -0,0 +1,142 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[Dict], Awaitable[None]]
+
+
+class InvalidationBus:
+    """Broadcasts cache invalidations so every worker drops its local copies.
+
+    Messages carry the publishing worker's ``origin`` so it can skip its own.
+    Delivery is best effort: a missed message only means a local entry lives
+    until its TTL.
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex[:12]
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, message: Dict) -> None:
+        raise NotImplementedError
+
+    async def start(self, handler: MessageHandler) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen(handler))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _listen(self, handler: MessageHandler) -> None:
+        raise NotImplementedError
+
+    async def _dispatch(self, handler: MessageHandler, message: Dict) -> None:
+        if message.get('origin') == self.origin:
+            return
+        try:
+            await handler(message)
+        except Exception as e:
+            logger.error(f"Error applying cache invalidation: {e}")
+
+
+class MongoInvalidationBus(InvalidationBus):
+    """Bus over a capped collection read with a tailable cursor.
+
+    Unlike change streams this works on a standalone mongod, not only on
+    replica sets.
+    """
+
+    def __init__(self, db, collection: str = 'cache_invalidations', size: int = 1 << 20, retry_interval: float = 1.0):
+        super().__init__()
+        self.db = db
+        self.name = collection
+        self.size = size
+        self.retry_interval = retry_interval
+
+    @property
+    def collection(self):
+        return self.db[self.name]
+
+    async def publish(self, message: Dict) -> None:
+        try:
+            await self.collection.insert_one({**message, 'origin': self.origin})
+        except Exception as e:
+            logger.error(f"Error publishing cache invalidation: {e}")
+
+    async def _listen(self, handler: MessageHandler) -> None:
+        last_id = None
+        started = False
+        while True:
+            try:
+                if not started:
+                    last_id = await self._latest_id()
+                    started = True
+                query = {'_id': {'$gt': last_id}} if last_id is not None else {}
+                cursor = self.collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                async for doc in cursor:
+                    last_id = doc['_id']
+                    doc.pop('_id')
+                    await self._dispatch(handler, doc)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache invalidation listener error: {e}")
+            # A tailable cursor dies on an empty collection; retry after a pause
+            await asyncio.sleep(self.retry_interval)
+
+    async def _latest_id(self):
+        try:
+            await self.db.create_collection(self.name, capped=True, size=self.size)
+        except CollectionInvalid:
+            pass
+        latest = await self.collection.find_one({}, {'_id': 1}, sort=[('$natural', -1)])
+        # Start after the newest message so old invalidations are not replayed
+        return latest['_id'] if latest else None
+
+
+class RedisInvalidationBus(InvalidationBus):
+    """Bus over Redis pub/sub"""
+
+    def __init__(self, url: Optional[str] = None, client=None, channel: str = 'cache:invalidate', retry_interval: float = 1.0):
+        super().__init__()
+        if client is None:
+            # redis is only needed when this bus is configured
+            import redis.asyncio as redis
+            client = redis.from_url(url)
+        self.client = client
+        self.channel = channel
+        self.retry_interval = retry_interval
+
+    async def publish(self, message: Dict) -> None:
+        try:
+            await self.client.publish(self.channel, json.dumps({**message, 'origin': self.origin}))
+        except Exception as e:
+            logger.error(f"Error publishing cache invalidation: {e}")
+
+    async def _listen(self, handler: MessageHandler) -> None:
+        while True:
+            try:
+                async with self.client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            await self._dispatch(handler, json.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache invalidation listener error: {e}")
+            await asyncio.sleep(self.retry_interval)
+
+    async def stop(self) -> None:
+        await super().stop()
+        await self.client.aclose()
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set, Tuple, TypeVar
+
+import httpx
+
+from services import deadlines
+from services.deadlines import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Upstreams that served this request from a fallback; one set per request
+_degraded: ContextVar[Optional[Set[str]]] = ContextVar('degraded_upstreams', default=None)
+
+
+def begin_degradation_tracking() -> Set[str]:
+    """Start collecting degraded upstreams for the current request"""
+    upstreams: Set[str] = set()
+    _degraded.set(upstreams)
+    return upstreams
+
+
+def mark_degraded(upstream: str) -> None:
+    """Flag the current response as built from cached or partial data because ``upstream`` failed"""
+    upstreams = _degraded.get()
+    if upstreams is not None:
+        upstreams.add(upstream)
+
+
+def is_degraded(upstream: str) -> bool:
+    upstreams = _degraded.get()
+    return upstreams is not None and upstream in upstreams
+
+
+def is_connection_failure(error: BaseException) -> bool:
+    """Timeouts and network errors: the upstream did not answer"""
+    return isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError))
+
+
+class CircuitOpen(Exception):
+    """The upstream is failing and calls to it are rejected without being made"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} is unavailable (circuit open)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Stops calling an upstream that is failing or too slow.
+
+    Outcomes of the calls finished in the last ``window`` seconds are kept;
+    once there are at least ``min_calls``, the circuit opens if the share of
+    failures reaches ``failure_threshold`` or the share of calls slower than
+    ``slow_call_seconds`` reaches ``slow_call_threshold``. Calls are also cut
+    off after ``timeout``, which counts as a failure, so a hanging upstream
+    cannot hold requests for the whole HTTP client timeout.
+
+    While open, calls raise ``CircuitOpen`` immediately. After
+    ``open_seconds`` the circuit is half-open: up to ``half_open_calls``
+    probes go through, closing it when all succeed and reopening it on the
+    first failing or slow one. State is per worker, so checking it costs
+    nothing on the request path.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 5.0,
+        slow_call_seconds: float = 2.0,
+        failure_threshold: float = 0.5,
+        slow_call_threshold: float = 0.8,
+        window: float = 30.0,
+        min_calls: int = 10,
+        open_seconds: float = 15.0,
+        half_open_calls: int = 3,
+        is_failure: Callable[[BaseException], bool] = is_connection_failure
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.slow_call_seconds = slow_call_seconds
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.window = window
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.is_failure = is_failure
+
+        self.state = CLOSED
+        self._opened_at = 0.0
+        # (finished_at, failed, slow) of recent calls, with running totals
+        self._outcomes: Deque[Tuple[float, bool, bool]] = deque()
+        self._failures = 0
+        self._slow = 0
+        self._probes = 0
+        self._probe_successes = 0
+
+        self.calls = 0
+        self.failed_calls = 0
+        self.slow_calls = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def closed(self) -> bool:
+        return self.state == CLOSED
+
+    async def call(
+        self,
+        func: Callable[[], Awaitable[T]],
+        timeout: Optional[float] = None,
+        failed: Optional[Callable[[T], bool]] = None
+    ) -> T:
+        """Await ``func()`` unless the circuit is open.
+
+        ``failed`` classifies a returned value, e.g. an HTTP 5xx response;
+        raised exceptions are classified by ``is_failure``. Exceptions that
+        are not failures (a 404, a bad request) count as successful calls.
+        The timeout is shortened to what is left of the request's deadline;
+        running out of that raises DeadlineExceeded and is not held against
+        the upstream.
+        """
+        limit = timeout or self.timeout
+        allowed = deadlines.budget(limit)
+        probe = self._admit()
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(func(), allowed)
+        except TimeoutError as e:
+            if allowed < limit:
+                self._release(probe)
+                raise DeadlineExceeded(f"Request deadline exceeded waiting for {self.name}") from e
+            self._record(probe, time.monotonic() - started, True)
+            raise TimeoutError(f"{self.name} did not answer within {limit:g}s") from e
+        except asyncio.CancelledError:
+            # The caller went away; the call says nothing about the upstream
+            self._release(probe)
+            raise
+        except Exception as e:
+            self._record(probe, time.monotonic() - started, self.is_failure(e))
+            raise
+        self._record(probe, time.monotonic() - started, bool(failed and failed(result)))
+        return result
+
+    def raise_if_open(self) -> None:
+        """Raise CircuitOpen while calls would be rejected, without taking a half-open probe slot"""
+        if self.state == OPEN and self._retry_after() > 0:
+            self.rejected += 1
+            raise CircuitOpen(self.name, self._retry_after())
+
+    def metrics(self) -> Dict:
+        self._trim(time.monotonic())
+        recent = len(self._outcomes)
+        return {
+            'state': self.state,
+            'retry_after': round(self._retry_after(), 1) if self.state == OPEN else 0,
+            'recent_calls': recent,
+            'recent_failure_rate': round(self._failures / recent, 4) if recent else 0,
+            'recent_slow_rate': round(self._slow / recent, 4) if recent else 0,
+            'calls': self.calls,
+            'failed_calls': self.failed_calls,
+            'slow_calls': self.slow_calls,
+            'rejected': self.rejected,
+            'times_opened': self.times_opened
+        }
+
+    def _retry_after(self) -> float:
+        return max(self._opened_at + self.open_seconds - time.monotonic(), 0.0)
+
+    def _admit(self) -> bool:
+        """Raise CircuitOpen or let the call through; True if it is a half-open probe"""
+        if self.state == OPEN:
+            if self._retry_after() > 0:
+                self.rejected += 1
+                raise CircuitOpen(self.name, self._retry_after())
+            self.state = HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+            logger.info(f"Circuit {self.name} half-open, probing upstream")
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_calls:
+                self.rejected += 1
+                raise CircuitOpen(self.name, 1.0)
+            self._probes += 1
+            return True
+        return False
+
+    def _release(self, probe: bool) -> None:
+        if probe:
+            self._probes = max(self._probes - 1, 0)
+
+    def _record(self, probe: bool, duration: float, failed: bool) -> None:
+        slow = duration >= self.slow_call_seconds
+        now = time.monotonic()
+        self.calls += 1
+        self.failed_calls += failed
+        self.slow_calls += slow
+
+        if probe:
+            self._release(probe)
+            if self.state != HALF_OPEN:
+                return
+            if failed or slow:
+                self._open(now, 'probe failed' if failed else f'probe took {duration:.1f}s')
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_calls:
+                self.state = CLOSED
+                logger.info(f"Circuit {self.name} closed, upstream recovered")
+            return
+
+        if self.state != CLOSED:
+            # Started before the circuit opened; the decision is already made
+            return
+        self._outcomes.append((now, failed, slow))
+        self._failures += failed
+        self._slow += slow
+        self._trim(now)
+
+        recent = len(self._outcomes)
+        if recent < self.min_calls:
+            return
+        if self._failures / recent >= self.failure_threshold:
+            self._open(now, f'{self._failures} of {recent} recent calls failed')
+        elif self._slow / recent >= self.slow_call_threshold:
+            self._open(now, f'{self._slow} of {recent} recent calls took over {self.slow_call_seconds}s')
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            _, failed, slow = self._outcomes.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _open(self, now: float, reason: str) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        self.times_opened += 1
+        # Start the next closed period with a clean window
+        self._outcomes.clear()
+        self._failures = 0
+        self._slow = 0
+        logger.warning(f"Circuit {self.name} opened for {self.open_seconds:.0f}s: {reason}")
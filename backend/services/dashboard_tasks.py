@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Tuple
+
+from services.deadlines import start_shared
+
+logger = logging.getLogger(__name__)
+
+# How long finished-but-unclaimed dashboard work is kept for the next poll
+DASHBOARD_PENDING_TTL = 60.0
+
+
+class DashboardTasks:
+    """Dashboard parts that missed their timeout, kept running for the client's next poll.
+
+    Keyed by client and part, in this worker. Finished work is dropped
+    ``ttl`` seconds after it completes if nobody collects it; ``cancel_all``
+    stops whatever is still running at shutdown.
+    """
+
+    def __init__(self, ttl: float = DASHBOARD_PENDING_TTL):
+        self.ttl = ttl
+        self._pending: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def resume(self, client_id: str, part: str, factory: Callable[[], Awaitable]) -> asyncio.Task:
+        """Resume work parked by an earlier dashboard call, or start it fresh"""
+        task = self._pending.pop((client_id, part), None)
+        if task is None or task.cancelled():
+            # A later poll may collect it, so it must not die with this request's deadline
+            task = start_shared(factory())
+        return task
+
+    def parked(self, client_id: str, part: str) -> bool:
+        """Whether ``resume`` would pick up earlier work rather than start it"""
+        task = self._pending.get((client_id, part))
+        return task is not None and not task.cancelled()
+
+    def park(self, client_id: str, part: str, task: asyncio.Task) -> None:
+        """Keep slow dashboard work running so a follow-up poll can collect it"""
+        key = (client_id, part)
+        self._pending[key] = task
+
+        def expire(_):
+            if self._pending.get(key) is task:
+                del self._pending[key]
+
+        task.add_done_callback(
+            lambda _: asyncio.get_running_loop().call_later(self.ttl, expire, None)
+        )
+
+    async def cancel_all(self) -> None:
+        tasks = list(self._pending.values())
+        self._pending.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if tasks:
+            logger.info(f"Cancelled {len(tasks)} pending dashboard tasks")
+
+    def __len__(self) -> int:
+        return len(self._pending)
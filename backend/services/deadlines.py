@@ -0,0 +1,78 @@
+import asyncio
+import contextvars
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Coroutine, Optional, TypeVar
+
+T = TypeVar('T')
+
+# Deadline of the request being handled, as a time.monotonic() value; None outside a request.
+# A mutable holder so the middleware can lift the deadline for work that outlives the response.
+_deadline: ContextVar[Optional['Deadline']] = ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before an upstream call could finish"""
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.expires_at: Optional[float] = time.monotonic() + seconds
+
+    def remaining(self) -> Optional[float]:
+        return None if self.expires_at is None else self.expires_at - time.monotonic()
+
+    def lift(self) -> None:
+        """Stop limiting the work still running, e.g. background tasks after the response"""
+        self.expires_at = None
+
+
+def begin_deadline(seconds: float) -> Deadline:
+    """Give the current request ``seconds`` to respond"""
+    deadline = Deadline(seconds)
+    _deadline.set(deadline)
+    return deadline
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget; None without a deadline"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def budget(timeout: Optional[float]) -> Optional[float]:
+    """The time an upstream call may take: its own ``timeout`` capped by what is left of the request's.
+
+    Raises DeadlineExceeded when nothing is left, so the call is not made at all.
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return left if timeout is None else min(timeout, left)
+
+
+async def within_deadline(awaitable: Awaitable[T]) -> T:
+    """Await ``awaitable``, cancelling it with DeadlineExceeded when the request's budget runs out"""
+    left = remaining()
+    if left is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, max(left, 0))
+    except TimeoutError as e:
+        if (remaining() or 0) > 0:
+            raise
+        raise DeadlineExceeded("Request deadline exceeded") from e
+
+
+def start_shared(coro: Coroutine[Any, Any, T]) -> 'asyncio.Task[T]':
+    """Start work other requests may join, without the current request's deadline.
+
+    A cache load or coalesced search must not fail on the budget of
+    whichever request happened to start it. Each caller applies its own
+    with ``within_deadline(asyncio.shield(task))``.
+    """
+    context = contextvars.copy_context()
+    context.run(_deadline.set, None)
+    return asyncio.create_task(coro, context=context)
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class DiskLRUCache:
+    """Size-bounded on-disk cache of immutable files, evicting least recently used.
+
+    Recency is tracked with file mtimes so every worker sharing the directory
+    sees the same order. Files are written to a temp name and renamed into
+    place, so a reader never sees a partial file.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, chunk_size: int = 256 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self._filling: Dict[str, asyncio.Task] = {}
+        self._size: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.fill_errors = 0
+        self.evictions = 0
+
+    def start(self) -> None:
+        """Create the directory and drop temp files left by a crashed fill"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for leftover in self.directory.glob('.fill-*'):
+            leftover.unlink(missing_ok=True)
+        self._size = sum(path.stat().st_size for path in self._files())
+
+    def path_for(self, key: str) -> Path:
+        # Keys are storage filenames; never let one escape the cache directory
+        return self.directory / Path(key).name
+
+    def get(self, key: str) -> Optional[Path]:
+        """Return the cached file and mark it recently used"""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def fill_in_background(self, key: str, url: str) -> None:
+        """Download ``url`` into the cache unless a download is already running"""
+        if key not in self._filling:
+            task = asyncio.create_task(self._fill(key, url))
+            self._filling[key] = task
+            task.add_done_callback(lambda _: self._filling.pop(key, None))
+
+    async def _fill(self, key: str, url: str) -> None:
+        fd, temp_name = tempfile.mkstemp(prefix='.fill-', dir=self.directory)
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                async with httpx.AsyncClient(timeout=httpx.Timeout(10.0, read=60.0)) as client:
+                    async with client.stream('GET', url) as response:
+                        response.raise_for_status()
+                        async for chunk in response.aiter_bytes(self.chunk_size):
+                            await asyncio.to_thread(out.write, chunk)
+                            size += len(chunk)
+            os.replace(temp_name, self.path_for(key))
+            self.fills += 1
+            self._size = (self._size or 0) + size
+            await asyncio.to_thread(self._evict)
+        except Exception as e:
+            self.fill_errors += 1
+            logger.error(f"Error caching {key} on disk: {e}")
+            Path(temp_name).unlink(missing_ok=True)
+
+    def _files(self):
+        return [path for path in self.directory.iterdir() if path.is_file() and not path.name.startswith('.fill-')]
+
+    def _evict(self) -> None:
+        if (self._size or 0) <= self.max_bytes:
+            return
+        # Rescan: other workers add and evict files in the same directory
+        entries = []
+        for path in self._files():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            # Open streams keep reading an unlinked file, so this is safe mid-playback
+            path.unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+        self._size = total
+
+    def metrics(self) -> Dict:
+        """Hit rate, fills, evictions and bytes on disk"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+            'fills': self.fills,
+            'fill_errors': self.fill_errors,
+            'evictions': self.evictions,
+            'bytes': self._size or 0,
+            'max_bytes': self.max_bytes
+        }
@@ -0,0 +1,108 @@
+import logging
+from typing import Callable, Dict, List, Optional, Sequence
+
+from services.cache import Namespace, TieredCache
+from services.circuit_breaker import CircuitBreaker
+from services.mood_index import MoodIndex, feature_vector
+from services.playlist_mood_store import PlaylistMoodStore
+from services.playlist_moods import calculate_playlist_moods
+from services.rate_limiter import DistributedTokenBucket
+from services.spotify_oauth import SpotifyOAuth
+from services.spotify_service import FEATURED_LIMIT, SpotifyService
+from services.worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+# Featured playlists with their mood embedded, per market. Served stale for a
+# day so a failed refresh never leaves the endpoint cold.
+FEATURED_MOODS = Namespace('spotify.featured_moods', ttl=900, stale_ttl=86400)
+
+
+class FeaturedPrecompute:
+    """Keeps featured playlists and their moods warm in the cache.
+
+    Featured playlists are the same for every user in a market, so they are
+    fetched with the app's client-credentials token on a schedule. Computing
+    the moods also warms the playlist-track and audio-feature caches.
+
+    Being public, they are the playlists kept in ``playlist_index`` for mood
+    recommendations to every user.
+    """
+
+    def __init__(
+        self,
+        get_oauth: Callable[[], SpotifyOAuth],
+        cache: TieredCache,
+        limiter: DistributedTokenBucket,
+        store: PlaylistMoodStore,
+        pool: WorkerPool,
+        countries: Sequence[Optional[str]] = (None,),
+        breaker: Optional[CircuitBreaker] = None,
+        track_index: Optional[MoodIndex] = None,
+        playlist_index: Optional[MoodIndex] = None
+    ):
+        self.get_oauth = get_oauth
+        self.cache = cache
+        self.limiter = limiter
+        self.store = store
+        self.pool = pool
+        self.countries = list(countries)
+        self.breaker = breaker
+        self.track_index = track_index
+        self.playlist_index = playlist_index
+
+    async def run(self) -> None:
+        """Refresh every configured market; scheduled on the leader worker"""
+        try:
+            token = await self.get_oauth().get_app_token()
+        except Exception as e:
+            logger.error(f"Error getting Spotify app token for featured precompute: {e}")
+            return
+
+        service = SpotifyService(token, self.cache, self.limiter, self.breaker, self.track_index)
+        for country in self.countries:
+            try:
+                playlists = await service.refresh_featured_playlists(country)
+                featured = await self.build(service, playlists)
+                await self.cache.set(FEATURED_MOODS, country or 'default', featured)
+                logger.info(f"Precomputed moods for {len(featured)} featured playlists ({country or 'default'})")
+            except Exception as e:
+                logger.error(f"Error precomputing featured playlists ({country or 'default'}): {e}")
+
+    async def get(self, service: SpotifyService, country: Optional[str] = None) -> List[Dict]:
+        """Featured playlists with moods, computed with the caller's token only on a cold cache"""
+        async def load() -> List[Dict]:
+            playlists = await service.get_featured_playlists(limit=FEATURED_LIMIT, country=country)
+            return await self.build(service, playlists)
+
+        featured = await self.cache.get_or_load(FEATURED_MOODS, country or 'default', load)
+        # The cached list may have been built by another worker
+        self._index(featured)
+        return featured
+
+    async def build(self, service: SpotifyService, playlists: List[Dict]) -> List[Dict]:
+        playlists = [playlist for playlist in playlists if playlist and playlist.get('id')]
+        moods = await calculate_playlist_moods(service, playlists, self.store, self.pool)
+        featured = [{**playlist, 'mood': moods.get(playlist['id'])} for playlist in playlists]
+        self._index(featured)
+        return featured
+
+    async def index_cached(self) -> int:
+        """Index the cached featured playlists of every market, e.g. after a restart"""
+        indexed = 0
+        for country in self.countries:
+            featured = await self.cache.get(FEATURED_MOODS, country or 'default')
+            indexed += self._index(featured or [])
+        return indexed
+
+    def _index(self, featured: List[Dict]) -> int:
+        if self.playlist_index is None:
+            return 0
+        indexed = 0
+        for playlist in featured:
+            mood_data = playlist.get('mood')
+            vector = feature_vector(mood_data) if mood_data else None
+            if vector is not None and mood_data['overall_mood'] != 'Unknown':
+                self.playlist_index.add(playlist['id'], vector)
+                indexed += 1
+        return indexed
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict], Awaitable[Optional[Dict]]]
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+# What a job's submitter may see: the payload names storage files and
+# errors carry internal details, so both are left to the admin views
+STATUS_FIELDS = ('type', 'status', 'attempts', 'max_attempts', 'result', 'run_at', 'created_at', 'updated_at')
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobQueue:
+    """Durable background job queue stored in MongoDB.
+
+    Workers lease jobs atomically with ``find_one_and_update``; a lease is a
+    visibility timeout that running workers keep extending. If a worker dies,
+    its lease expires and another worker picks the job up. Failed jobs are
+    retried with exponential backoff until ``max_attempts`` is reached.
+    """
+
+    def __init__(
+        self,
+        db,
+        concurrency: int = 2,
+        visibility_timeout: float = 60.0,
+        poll_interval: float = 1.0,
+        retry_backoff: float = 5.0
+    ):
+        self.collection = db.jobs
+        self.concurrency = concurrency
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.worker_id = uuid.uuid4().hex[:12]
+        self._handlers: Dict[str, JobHandler] = {}
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def register(self, job_type: str, handler: JobHandler) -> None:
+        """Register the coroutine that runs jobs of a given type"""
+        self._handlers[job_type] = handler
+
+    async def ensure_indexes(self) -> None:
+        """Create the indexes used for leasing and status queries"""
+        try:
+            await self.collection.create_index([('status', 1), ('priority', -1), ('run_at', 1)])
+            await self.collection.create_index([('status', 1), ('lease_until', 1)])
+            await self.collection.create_index([('type', 1), ('created_at', -1)])
+        except Exception as e:
+            logger.error(f"Error creating job indexes: {e}")
+
+    async def enqueue(
+        self,
+        job_type: str,
+        payload: Dict,
+        priority: int = 0,
+        max_attempts: int = 3,
+        delay: float = 0
+    ) -> str:
+        """Add a job and return its id; higher priority runs first"""
+        now = _now()
+        job_id = uuid.uuid4().hex
+        await self.collection.insert_one({
+            '_id': job_id,
+            'type': job_type,
+            'payload': payload,
+            'status': QUEUED,
+            'priority': priority,
+            'attempts': 0,
+            'max_attempts': max_attempts,
+            'run_at': now + timedelta(seconds=delay),
+            'lease_until': None,
+            'lease_id': None,
+            'worker_id': None,
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now
+        })
+        self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """Return a job's full document, payload and error included"""
+        doc = await self.collection.find_one({'_id': job_id})
+        return self._document(doc) if doc else None
+
+    async def get_status(self, job_id: str) -> Optional[Dict]:
+        """Return the part of a job its submitter may see (``STATUS_FIELDS``)"""
+        doc = await self.collection.find_one({'_id': job_id}, dict.fromkeys(STATUS_FIELDS, 1))
+        return self._document(doc) if doc else None
+
+    async def list_jobs(self, status: Optional[str] = None, job_type: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """Return recent jobs, newest first"""
+        query = {}
+        if status:
+            query['status'] = status
+        if job_type:
+            query['type'] = job_type
+        cursor = self.collection.find(query).sort('created_at', -1).limit(limit)
+        return [self._document(doc) async for doc in cursor]
+
+    async def stats(self) -> Dict[str, int]:
+        """Count jobs per status"""
+        counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        async for row in self.collection.aggregate([{'$group': {'_id': '$status', 'count': {'$sum': 1}}}]):
+            counts[row['_id']] = row['count']
+        return counts
+
+    async def purge(self, older_than: timedelta) -> int:
+        """Delete finished jobs last updated before ``older_than`` ago"""
+        try:
+            result = await self.collection.delete_many({
+                'status': {'$in': [SUCCEEDED, FAILED]},
+                'updated_at': {'$lt': _now() - older_than}
+            })
+            return result.deleted_count
+        except Exception as e:
+            logger.error(f"Error purging finished jobs: {e}")
+            return 0
+
+    def start(self) -> None:
+        """Start the configured number of async workers"""
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+            logger.info(f"Job queue started {self.concurrency} workers ({self.worker_id})")
+
+    async def stop(self) -> None:
+        """Stop workers; jobs they were running are picked up again once leases expire"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _lease(self) -> Optional[Dict]:
+        now = _now()
+        return await self.collection.find_one_and_update(
+            {
+                'type': {'$in': list(self._handlers)},
+                '$or': [
+                    {'status': QUEUED, 'run_at': {'$lte': now}},
+                    {'status': RUNNING, 'lease_until': {'$lte': now}}
+                ]
+            },
+            {
+                '$set': {
+                    'status': RUNNING,
+                    'lease_until': now + timedelta(seconds=self.visibility_timeout),
+                    'lease_id': uuid.uuid4().hex,
+                    'worker_id': self.worker_id,
+                    'updated_at': now
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=[('priority', -1), ('run_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                job = await self._lease()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error leasing job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(job)
+
+    async def _run(self, job: Dict) -> None:
+        if job['attempts'] > job['max_attempts']:
+            # Lease expired on the final attempt (worker crashed or hung)
+            await self._finish(job, FAILED, error='Lease expired on final attempt')
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            result = await self._handlers[job['type']](job['payload'])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job {job['_id']} ({job['type']}) failed on attempt {job['attempts']}: {e}")
+            if job['attempts'] >= job['max_attempts']:
+                await self._finish(job, FAILED, error=str(e))
+            else:
+                backoff = self.retry_backoff * 2 ** (job['attempts'] - 1)
+                await self._finish(job, QUEUED, error=str(e), run_at=_now() + timedelta(seconds=backoff))
+            return
+        finally:
+            heartbeat.cancel()
+
+        await self._finish(job, SUCCEEDED, result=result)
+
+    async def _heartbeat(self, job: Dict) -> None:
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                await self.collection.update_one(
+                    {'_id': job['_id'], 'lease_id': job['lease_id'], 'status': RUNNING},
+                    {'$set': {'lease_until': _now() + timedelta(seconds=self.visibility_timeout)}}
+                )
+            except Exception as e:
+                logger.error(f"Error extending lease of job {job['_id']}: {e}")
+
+    async def _finish(self, job: Dict, status: str, result: Optional[Dict] = None,
+                      error: Optional[str] = None, run_at: Optional[datetime] = None) -> None:
+        update = {
+            'status': status,
+            'lease_until': None,
+            'lease_id': None,
+            'result': result,
+            'error': error,
+            'updated_at': _now()
+        }
+        if run_at is not None:
+            update['run_at'] = run_at
+        try:
+            # Only the current lease holder may settle the job
+            await self.collection.update_one(
+                {'_id': job['_id'], 'lease_id': job['lease_id'], 'status': RUNNING},
+                {'$set': update}
+            )
+        except Exception as e:
+            logger.error(f"Error recording result of job {job['_id']}: {e}")
+
+    @staticmethod
+    def _document(doc: Dict) -> Dict:
+        doc = {key: value for key, value in doc.items() if key != 'lease_id'}
+        doc['id'] = doc.pop('_id')
+        return doc
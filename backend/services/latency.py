@@ -0,0 +1,43 @@
+from collections import deque
+from typing import Deque, Dict
+
+import numpy as np
+
+# Durations kept per route; percentiles describe roughly the last this-many requests
+LATENCY_SAMPLES = 2048
+PERCENTILES = (50, 90, 99)
+
+
+class RouteLatency:
+    """Recent request durations and outcomes per route, in this worker.
+
+    Outcomes are the status class (``2xx``...), ``cancelled`` when the
+    client disconnected first and ``deadline`` when the request ran out of
+    its time budget. Cancelled requests are kept out of the percentiles:
+    their duration says when the client gave up, not how slow the route is.
+    """
+
+    def __init__(self, samples: int = LATENCY_SAMPLES):
+        self.samples = samples
+        self._durations: Dict[str, Deque[float]] = {}
+        self._outcomes: Dict[str, Dict[str, int]] = {}
+
+    def record(self, route: str, seconds: float, outcome: str) -> None:
+        outcomes = self._outcomes.setdefault(route, {})
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        if outcome != 'cancelled':
+            self._durations.setdefault(route, deque(maxlen=self.samples)).append(seconds)
+
+    def metrics(self) -> Dict[str, Dict]:
+        """Per route: request counts by outcome and p50/p90/p99/max latency in ms"""
+        report = {}
+        for route, outcomes in sorted(self._outcomes.items()):
+            entry: Dict = {'requests': sum(outcomes.values()), 'outcomes': dict(outcomes)}
+            durations = self._durations.get(route)
+            if durations:
+                values = np.fromiter(durations, dtype=np.float64) * 1000
+                for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                    entry[f'p{percentile}_ms'] = round(float(value), 1)
+                entry['max_ms'] = round(float(values.max()), 1)
+            report[route] = entry
+        return report
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+PeriodicJob = Callable[[], Awaitable[None]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class LeaderLease:
+    """A named lease in MongoDB held by at most one worker at a time.
+
+    The holder renews it before ``ttl`` runs out; if it dies, the lease
+    expires and another worker takes over.
+    """
+
+    def __init__(self, db, name: str, ttl: float = 30.0):
+        self.collection = db.leases
+        self.name = name
+        self.ttl = ttl
+        self.holder = uuid.uuid4().hex[:12]
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease; True if this worker holds it"""
+        now = _now()
+        try:
+            await self.collection.find_one_and_update(
+                {'_id': self.name, '$or': [{'holder': self.holder}, {'expires_at': {'$lte': now}}]},
+                {'$set': {'holder': self.holder, 'expires_at': now + timedelta(seconds=self.ttl)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # Another worker holds an unexpired lease, so the upsert collided with it
+            return False
+        except Exception as e:
+            logger.error(f"Error acquiring lease {self.name}: {e}")
+            return False
+
+    async def release(self) -> None:
+        """Give the lease up so another worker can take over immediately"""
+        try:
+            await self.collection.delete_one({'_id': self.name, 'holder': self.holder})
+        except Exception as e:
+            logger.error(f"Error releasing lease {self.name}: {e}")
+
+
+@dataclass
+class _Schedule:
+    name: str
+    interval: float
+    job: PeriodicJob
+    last_run: Optional[datetime] = None
+    task: Optional[asyncio.Task] = None
+
+
+class Scheduler:
+    """Runs periodic jobs on exactly one worker across the deployment.
+
+    Workers compete for a single leader lease; only the leader runs jobs.
+    Last run times are stored in MongoDB, so a new leader after a failover
+    keeps the schedule instead of running everything at once.
+    """
+
+    def __init__(self, db, lease_ttl: float = 30.0, tick: float = 5.0):
+        self.lease = LeaderLease(db, 'scheduler', lease_ttl)
+        self.runs = db.scheduled_runs
+        self.tick = min(tick, lease_ttl / 3)
+        self.is_leader = False
+        self._schedules: Dict[str, _Schedule] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def every(self, name: str, interval: float, job: PeriodicJob) -> None:
+        """Run ``job`` every ``interval`` seconds on the leader"""
+        self._schedules[name] = _Schedule(name, interval, job)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        running = [schedule.task for schedule in self._schedules.values() if schedule.task]
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        if self.is_leader:
+            await self.lease.release()
+            self.is_leader = False
+
+    def status(self) -> Dict:
+        """Leadership and last run time per job, as seen by this worker"""
+        return {
+            'leader': self.is_leader,
+            'holder': self.lease.holder,
+            'jobs': {
+                name: {
+                    'interval': schedule.interval,
+                    'last_run': schedule.last_run.isoformat() if schedule.last_run else None,
+                    'running': schedule.task is not None and not schedule.task.done()
+                }
+                for name, schedule in self._schedules.items()
+            }
+        }
+
+    async def _loop(self) -> None:
+        while True:
+            leader = await self.lease.acquire()
+            if leader and not self.is_leader:
+                logger.info(f"Worker {self.lease.holder} became scheduler leader")
+                await self._load_last_runs()
+            elif self.is_leader and not leader:
+                logger.info(f"Worker {self.lease.holder} lost scheduler leadership")
+            self.is_leader = leader
+            if leader:
+                self._run_due()
+            await asyncio.sleep(self.tick)
+
+    async def _load_last_runs(self) -> None:
+        try:
+            async for doc in self.runs.find({'_id': {'$in': list(self._schedules)}}):
+                self._schedules[doc['_id']].last_run = doc['last_run'].replace(tzinfo=timezone.utc)
+        except Exception as e:
+            logger.error(f"Error loading scheduled run times: {e}")
+
+    def _run_due(self) -> None:
+        now = _now()
+        for schedule in self._schedules.values():
+            if schedule.task is not None and not schedule.task.done():
+                continue
+            if schedule.last_run and (now - schedule.last_run).total_seconds() < schedule.interval:
+                continue
+            schedule.last_run = now
+            schedule.task = asyncio.create_task(self._run(schedule))
+
+    async def _run(self, schedule: _Schedule) -> None:
+        try:
+            await self.runs.update_one(
+                {'_id': schedule.name}, {'$set': {'last_run': schedule.last_run}}, upsert=True
+            )
+            await schedule.job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Scheduled job {schedule.name} failed: {e}")
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from services.mood_index import FEATURES, MoodIndex
+from services.projection import TRACK_FIELDS, parse_fields, project
+from services.spotify_service import TOP_TRACK_RANGES, SpotifyService
+
+logger = logging.getLogger(__name__)
+
+LIBRARY_SCOPES = ('saved',) + TOP_TRACK_RANGES
+# A sync that has not finished after this long is assumed dead and may be restarted
+SYNC_LEASE = timedelta(minutes=15)
+# Libraries this large have their mood breakdown computed in the worker pool
+LIBRARY_MOOD_POOL_MIN_TRACKS = 500
+
+
+def _track_doc_id(user_id: str, track_id: str) -> str:
+    return f"{user_id}:{track_id}"
+
+
+class LibraryStore:
+    """Users' saved tracks and top tracks with their audio features, in MongoDB.
+
+    Each (user, track) pair is one ``library_tracks`` document holding the
+    projected track, its features (``None`` once Spotify has none, absent
+    until looked up) and ``saved_at``, the ``added_at`` of a saved track.
+    ``library_sync`` holds one document per user with the sync cursor, the
+    top-track lists and the state of the running or last sync.
+    """
+
+    def __init__(self, db):
+        self.tracks = db.library_tracks
+        self.syncs = db.library_sync
+
+    async def ensure_indexes(self) -> None:
+        """Create the per-user lookup indexes"""
+        try:
+            await self.tracks.create_index([('user_id', 1), ('saved_at', -1)])
+            await self.tracks.create_index([('user_id', 1), ('track_id', 1)])
+        except Exception as e:
+            logger.error(f"Error creating library indexes: {e}")
+
+    async def begin_sync(self, user_id: str) -> bool:
+        """Mark a sync of this user's library as running; False if one already is"""
+        now = datetime.now(timezone.utc)
+        try:
+            await self.syncs.find_one_and_update(
+                {'_id': user_id, '$or': [{'status': {'$ne': 'running'}}, {'started_at': {'$lte': now - SYNC_LEASE}}]},
+                {'$set': {'status': 'running', 'started_at': now, 'error': None}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # A running sync holds the document, so the upsert collided with it
+            return False
+
+    async def finish_sync(self, user_id: str, update: Dict) -> None:
+        await self.syncs.update_one(
+            {'_id': user_id},
+            {'$set': {**update, 'status': 'idle', 'finished_at': datetime.now(timezone.utc)}}
+        )
+
+    async def fail_sync(self, user_id: str, error: str) -> None:
+        try:
+            await self.syncs.update_one(
+                {'_id': user_id},
+                {'$set': {'status': 'failed', 'error': error, 'finished_at': datetime.now(timezone.utc)}}
+            )
+        except Exception as e:
+            logger.error(f"Error recording failed library sync: {e}")
+
+    async def status(self, user_id: str) -> Optional[Dict]:
+        """The user's sync state, without the top-track lists"""
+        doc = await self.syncs.find_one({'_id': user_id}, {'top_tracks': 0})
+        if doc:
+            doc['user_id'] = doc.pop('_id')
+            for field in ('started_at', 'finished_at', 'synced_at'):
+                if doc.get(field):
+                    doc[field] = doc[field].replace(tzinfo=timezone.utc)
+        return doc
+
+    async def cursor(self, user_id: str) -> Optional[str]:
+        """``added_at`` of the newest saved track seen by the last completed sync"""
+        doc = await self.syncs.find_one({'_id': user_id}, {'saved_cursor': 1})
+        return doc.get('saved_cursor') if doc else None
+
+    async def tracks_with_features(self, user_id: str, track_ids: List[str]) -> List[str]:
+        """Which of these tracks already had their features looked up"""
+        cursor = self.tracks.find(
+            {'user_id': user_id, 'track_id': {'$in': track_ids}, 'features': {'$exists': True}},
+            {'track_id': 1}
+        )
+        return [doc['track_id'] async for doc in cursor]
+
+    async def index_features(self, index: MoodIndex) -> int:
+        """Add every stored track's features to a mood index; returns how many were new"""
+        added = 0
+        cursor = self.tracks.find({'features': {'$ne': None, '$exists': True}}, {'_id': 0, 'features': 1})
+        async for doc in cursor:
+            added += index.add_features([doc['features']])
+        return added
+
+    async def upsert_tracks(self, user_id: str, tracks: List[Dict], synced_at: datetime) -> None:
+        """Write tracks given as {track, features?, saved_at?}; omitted fields keep their stored value"""
+        if not tracks:
+            return
+        field_tree = parse_fields(TRACK_FIELDS)
+        operations = []
+        for entry in tracks:
+            track_id = entry['track']['id']
+            fields = {
+                'user_id': user_id,
+                'track_id': track_id,
+                'track': project(entry['track'], field_tree),
+                'synced_at': synced_at
+            }
+            for name in ('features', 'saved_at'):
+                if name in entry:
+                    fields[name] = entry[name]
+            operations.append(UpdateOne({'_id': _track_doc_id(user_id, track_id)}, {'$set': fields}, upsert=True))
+        await self.tracks.bulk_write(operations, ordered=False)
+
+    async def unsave_missing(self, user_id: str, synced_at: datetime) -> int:
+        """After a full sync: clear ``saved_at`` on saved tracks that sync did not see"""
+        result = await self.tracks.update_many(
+            {'user_id': user_id, 'saved_at': {'$ne': None}, 'synced_at': {'$lt': synced_at}},
+            {'$set': {'saved_at': None}}
+        )
+        return result.modified_count
+
+    async def library(self, user_id: str, scope: str = 'saved', limit: Optional[int] = None) -> List[Dict]:
+        """Stored tracks of a scope (saved, or a top-tracks time range) with ``features`` and ``saved_at``"""
+        projection = {'_id': 0, 'track': 1, 'features': 1, 'saved_at': 1}
+        if scope == 'saved':
+            cursor = self.tracks.find({'user_id': user_id, 'saved_at': {'$ne': None}}, projection).sort('saved_at', -1)
+            if limit:
+                cursor = cursor.limit(limit)
+            return await cursor.to_list(None)
+
+        doc = await self.syncs.find_one({'_id': user_id}, {f'top_tracks.{scope}': 1})
+        track_ids = ((doc or {}).get('top_tracks') or {}).get(scope, [])[:limit or None]
+        docs = await self.tracks.find(
+            {'_id': {'$in': [_track_doc_id(user_id, track_id) for track_id in track_ids]}}, projection
+        ).to_list(None)
+        # Keep the ranking order
+        by_id = {doc['track']['id']: doc for doc in docs}
+        return [by_id[track_id] for track_id in track_ids if track_id in by_id]
+
+
+class LibrarySync:
+    """Copies a user's saved tracks and top tracks, with audio features, into the library store.
+
+    Saved tracks are synced incrementally: Spotify lists them newest first,
+    so paging stops once it reaches the ``added_at`` cursor of the previous
+    sync. Top tracks are short lists and are replaced on every sync. Audio
+    features are only fetched for tracks that have not been looked up yet.
+    Incremental syncs cannot see tracks removed from the library; a full
+    sync re-reads everything and clears ``saved_at`` on the missing ones.
+    """
+
+    def __init__(self, store: LibraryStore, concurrency: int = 4):
+        self.store = store
+        self.concurrency = concurrency
+
+    async def sync(self, service: SpotifyService, user_id: str, full: bool = False) -> Optional[Dict]:
+        """Sync one user's library once ``store.begin_sync`` succeeded; None if the sync failed"""
+        try:
+            return await self._sync(service, user_id, full)
+        except Exception as e:
+            logger.error(f"Error syncing library of {user_id}: {e}")
+            await self.store.fail_sync(user_id, str(e))
+            return None
+
+    async def _sync(self, service: SpotifyService, user_id: str, full: bool) -> Dict:
+        synced_at = datetime.now(timezone.utc)
+        cursor = None if full else await self.store.cursor(user_id)
+
+        saved_items, *top_lists = await asyncio.gather(
+            service.get_saved_track_items(since=cursor, concurrency=self.concurrency),
+            *(service.get_top_tracks(time_range) for time_range in TOP_TRACK_RANGES)
+        )
+
+        tracks: Dict[str, Dict] = {}
+        for top_tracks in top_lists:
+            for track in top_tracks:
+                tracks.setdefault(track['id'], {'track': track})
+        for item in saved_items:
+            tracks[item['track']['id']] = {'track': item['track'], 'saved_at': item['added_at']}
+
+        looked_up = set(await self.store.tracks_with_features(user_id, list(tracks)))
+        missing = [track_id for track_id in tracks if track_id not in looked_up]
+        if missing:
+            audio_features = await service.get_audio_features(missing)
+            if len(audio_features) != len(missing):
+                raise RuntimeError("Audio features unavailable")
+            for track_id, features in zip(missing, audio_features):
+                tracks[track_id]['features'] = {name: features[name] for name in FEATURES} if features else None
+
+        await self.store.upsert_tracks(user_id, list(tracks.values()), synced_at)
+        unsaved = await self.store.unsave_missing(user_id, synced_at) if full else 0
+
+        update = {
+            'synced_at': synced_at,
+            'top_tracks': {
+                time_range: [track['id'] for track in top_tracks]
+                for time_range, top_tracks in zip(TOP_TRACK_RANGES, top_lists)
+            },
+            'last_sync': {'full': full, 'saved_added': len(saved_items), 'features_fetched': len(missing), 'unsaved': unsaved}
+        }
+        if saved_items:
+            update['saved_cursor'] = max(item['added_at'] for item in saved_items)
+        await self.store.finish_sync(user_id, update)
+        logger.info(
+            f"Synced library of {user_id}: {len(saved_items)} saved tracks, "
+            f"{len(missing)} feature lookups{' (full)' if full else ''}"
+        )
+        return {'user_id': user_id, **update}
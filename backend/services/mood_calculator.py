@@ -4,6 +4,16 @@ import statistics
 class MoodCalculator:
     """Calculate playlist mood based on audio features"""
 
+    MOOD_CATEGORIES = (
+        'Energetic & Uplifting',
+        'Relaxed & Cool',
+        'Chill & Mellow',
+        'Melancholic & Reflective',
+        'Intense & Focused',
+        'Danceable & Groovy',
+        'Balanced & Versatile'
+    )
+
     @staticmethod
     def calculate_mood(audio_features: List[Dict]) -> Dict:
         """Calculate overall mood from track audio features"""
@@ -45,6 +55,11 @@ class MoodCalculator:
             'description': description
         }
 
+    @staticmethod
+    def calculate_moods(feature_sets: List[List[Dict]]) -> List[Dict]:
+        """Calculate moods for many playlists at once (one worker-pool round trip)"""
+        return [MoodCalculator.calculate_mood(audio_features) for audio_features in feature_sets]
+
     @staticmethod
     def _determine_mood_category(energy: float, valence: float, tempo: float, danceability: float) -> tuple:
         """Determine mood category based on audio features"""
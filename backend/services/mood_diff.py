@@ -0,0 +1,72 @@
+from typing import Dict
+
+import numpy as np
+
+from services.mood_history import MOOD_FIELDS, unpack_features
+from services.mood_index import FEATURES, MAX_TEMPO
+
+# Put tempo on the 0-1 scale of the other features when ranking tracks by impact
+FEATURE_SCALE = np.array([1.0, 1.0, 1.0 / MAX_TEMPO, 1.0], dtype=np.float64)
+
+
+def _summary(snapshot: Dict) -> Dict:
+    return {'ts': snapshot['ts'], **{field: snapshot[field] for field in MOOD_FIELDS}, 'track_count': snapshot['track_count']}
+
+
+def diff_snapshots(before: Dict, after: Dict, limit: int = 20) -> Dict:
+    """Explain how a playlist's mood moved between two snapshots.
+
+    The mood features are means over tracks, so the change splits exactly
+    into per-track terms: with mean ``m`` before and ``n`` tracks with
+    features after, an added track with features ``f`` moves each mean by
+    ``(f - m) / n`` and a removed one by ``-(f - m) / n``. Tracks are
+    ranked by the size of that contribution.
+    """
+    before_features = unpack_features(before['features']).astype(np.float64)
+    after_features = unpack_features(after['features']).astype(np.float64)
+    before_rows = {track_id: row for row, track_id in enumerate(before['track_ids'])}
+    after_rows = {track_id: row for row, track_id in enumerate(after['track_ids'])}
+
+    added = [track_id for track_id in after['track_ids'] if track_id not in before_rows]
+    removed = [track_id for track_id in before['track_ids'] if track_id not in after_rows]
+
+    has_before = ~np.isnan(before_features).any(axis=1)
+    has_after = ~np.isnan(after_features).any(axis=1)
+    before_mean = before_features[has_before].mean(axis=0) if has_before.any() else np.zeros(len(FEATURES))
+    after_count = max(int(has_after.sum()), 1)
+
+    def contributions(features: np.ndarray, sign: float) -> np.ndarray:
+        # Tracks without features (NaN rows) did not count towards either mean
+        return np.nan_to_num(sign * (features - before_mean) / after_count)
+
+    tracks = []
+    for track_ids, features, sign, change in (
+        (added, after_features[[after_rows[t] for t in added]], 1.0, 'added'),
+        (removed, before_features[[before_rows[t] for t in removed]], -1.0, 'removed')
+    ):
+        if not track_ids:
+            continue
+        terms = contributions(features.reshape(-1, len(FEATURES)), sign)
+        impact = np.abs(terms * FEATURE_SCALE).sum(axis=1)
+        for track_id, term, weight in zip(track_ids, terms, impact):
+            tracks.append({
+                'id': track_id,
+                'change': change,
+                'contribution': {name: round(float(value), 4) for name, value in zip(FEATURES, term)},
+                'impact': round(float(weight), 4)
+            })
+    tracks.sort(key=lambda track: track['impact'], reverse=True)
+
+    return {
+        'from': _summary(before),
+        'to': _summary(after),
+        'mood_changed': before['overall_mood'] != after['overall_mood'],
+        'change': {
+            name: round(after[name] - before[name], 0 if name == 'tempo' else 2)
+            for name in ('mood_score',) + FEATURES
+        },
+        'added_count': len(added),
+        'removed_count': len(removed),
+        'unchanged_count': len(after_rows) - len(added),
+        'tracks': tracks[:limit]
+    }
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from bson import Binary
+
+from services.cache import TieredCache
+from services.circuit_breaker import CircuitBreaker
+from services.mood_calculator import MoodCalculator
+from services.mood_index import FEATURES
+from services.rate_limiter import DistributedTokenBucket
+from services.spotify_oauth import SpotifyOAuth
+from services.spotify_service import SpotifyService
+
+logger = logging.getLogger(__name__)
+
+# Playlists keep being snapshotted for this long after their mood was last requested
+WATCH_WINDOW = timedelta(days=30)
+SNAPSHOT_CONCURRENCY = 5
+SNAPSHOT_TRACK_LIMIT = 50
+HISTORY_INTERVALS = ('hour', 'day', 'week', 'month')
+MOOD_FIELDS = ('overall_mood', 'mood_score') + FEATURES
+
+
+def pack_features(audio_features: List[Optional[Dict]]) -> bytes:
+    """Audio features as a float32 (tracks x FEATURES) matrix; NaN rows for tracks without features"""
+    matrix = np.full((len(audio_features), len(FEATURES)), np.nan, dtype='<f4')
+    for row, features in enumerate(audio_features):
+        if features:
+            matrix[row] = [features.get(name, np.nan) for name in FEATURES]
+    return matrix.tobytes()
+
+
+def unpack_features(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype='<f4').reshape(-1, len(FEATURES))
+
+
+def _utc(doc: Dict) -> Dict:
+    doc['ts'] = doc['ts'].replace(tzinfo=timezone.utc)
+    return doc
+
+
+class MoodHistoryStore:
+    """Playlist mood snapshots over time, in a MongoDB time-series collection.
+
+    MongoDB groups a time-series collection's documents into buckets per
+    playlist and time span, so range queries over months of history read a
+    few bucket documents instead of one document per snapshot. Each snapshot
+    keeps the track IDs and their audio features as a packed float32 matrix,
+    enough to explain any change between two snapshots later.
+    """
+
+    COLLECTION = 'playlist_mood_history'
+
+    def __init__(self, db, retention_days: float = 365):
+        self.db = db
+        self.collection = db[self.COLLECTION]
+        self.watched = db.mood_history_watch
+        self.retention_days = retention_days
+
+    async def ensure_indexes(self) -> None:
+        """Create the time-series collection and its indexes"""
+        try:
+            if self.COLLECTION not in await self.db.list_collection_names(filter={'name': self.COLLECTION}):
+                await self.db.create_collection(
+                    self.COLLECTION,
+                    timeseries={'timeField': 'ts', 'metaField': 'playlist_id', 'granularity': 'hours'},
+                    expireAfterSeconds=int(self.retention_days * 86400)
+                )
+        except Exception as e:
+            # MongoDB before 5.0: a regular collection with the same index works, just less compactly
+            logger.warning(f"Could not create time-series collection {self.COLLECTION}: {e}")
+        try:
+            await self.collection.create_index([('playlist_id', 1), ('ts', -1)])
+            await self.watched.create_index('last_requested')
+        except Exception as e:
+            logger.error(f"Error creating mood history indexes: {e}")
+
+    async def watch(self, playlist_id: str) -> bool:
+        """Keep snapshotting a playlist; True if it was not watched before"""
+        try:
+            result = await self.watched.update_one(
+                {'_id': playlist_id},
+                {'$set': {'last_requested': datetime.now(timezone.utc)}},
+                upsert=True
+            )
+            return result.upserted_id is not None
+        except Exception as e:
+            logger.error(f"Error watching playlist mood: {e}")
+            return False
+
+    async def watched_playlists(self) -> List[str]:
+        """Playlists whose mood was requested within the watch window"""
+        cursor = self.watched.find({'last_requested': {'$gte': datetime.now(timezone.utc) - WATCH_WINDOW}}, {'_id': 1})
+        return [doc['_id'] async for doc in cursor]
+
+    async def record(self, playlist_id: str, mood_data: Dict, track_ids: List[str],
+                     audio_features: List[Optional[Dict]]) -> Dict:
+        """Store a snapshot of a playlist's mood and the tracks it was computed from"""
+        doc = {
+            'ts': datetime.now(timezone.utc),
+            'playlist_id': playlist_id,
+            **{field: mood_data[field] for field in MOOD_FIELDS},
+            'track_count': len(track_ids),
+            'track_ids': track_ids,
+            'features': Binary(pack_features(audio_features))
+        }
+        await self.collection.insert_one(doc)
+        return doc
+
+    async def history(self, playlist_id: str, since: datetime, until: Optional[datetime] = None,
+                      interval: Optional[str] = None) -> List[Dict]:
+        """Mood over time, oldest first; with ``interval``, averaged per hour/day/week/month"""
+        match = {'playlist_id': playlist_id, 'ts': {'$gte': since, '$lte': until or datetime.now(timezone.utc)}}
+        try:
+            if interval is None:
+                cursor = self.collection.find(match, {'_id': 0, 'track_ids': 0, 'features': 0}).sort('ts', 1)
+                return [_utc(doc) async for doc in cursor]
+
+            pipeline = [
+                {'$match': match},
+                {'$sort': {'ts': 1}},
+                {'$group': {
+                    '_id': {'$dateTrunc': {'date': '$ts', 'unit': interval}},
+                    **{name: {'$avg': f'${name}'} for name in ('mood_score',) + FEATURES},
+                    'overall_mood': {'$last': '$overall_mood'},
+                    'track_count': {'$last': '$track_count'},
+                    'snapshots': {'$sum': 1}
+                }},
+                {'$sort': {'_id': 1}}
+            ]
+            points = []
+            async for row in self.collection.aggregate(pipeline):
+                row['ts'] = row.pop('_id')
+                for name in ('mood_score',) + FEATURES:
+                    row[name] = round(row[name], 0 if name == 'tempo' else 2)
+                points.append(_utc(row))
+            return points
+        except Exception as e:
+            logger.error(f"Error reading playlist mood history: {e}")
+            return []
+
+    async def snapshot_at(self, playlist_id: str, at: Optional[datetime] = None, skip: int = 0) -> Optional[Dict]:
+        """The latest snapshot taken at or before ``at`` (default now), skipping ``skip`` newer ones"""
+        query = {'playlist_id': playlist_id}
+        if at is not None:
+            query['ts'] = {'$lte': at}
+        try:
+            cursor = self.collection.find(query, {'_id': 0}).sort('ts', -1).skip(skip).limit(1)
+            docs = await cursor.to_list(1)
+            return _utc(docs[0]) if docs else None
+        except Exception as e:
+            logger.error(f"Error reading playlist mood snapshot: {e}")
+            return None
+
+
+class MoodSnapshotter:
+    """Periodically records the mood of watched playlists.
+
+    Runs on the scheduler leader with the app's client-credentials token, so
+    only playlists readable without a user (public ones) are snapshotted.
+    """
+
+    def __init__(
+        self,
+        get_oauth: Callable[[], SpotifyOAuth],
+        cache: TieredCache,
+        limiter: DistributedTokenBucket,
+        history: MoodHistoryStore,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.get_oauth = get_oauth
+        self.cache = cache
+        self.limiter = limiter
+        self.history = history
+        self.breaker = breaker
+
+    async def run(self) -> None:
+        try:
+            token = await self.get_oauth().get_app_token()
+            playlist_ids = await self.history.watched_playlists()
+        except Exception as e:
+            logger.error(f"Error starting playlist mood snapshots: {e}")
+            return
+
+        service = SpotifyService(token, self.cache, self.limiter, self.breaker)
+        semaphore = asyncio.Semaphore(SNAPSHOT_CONCURRENCY)
+
+        async def snapshot(playlist_id: str) -> bool:
+            async with semaphore:
+                return await self.snapshot(service, playlist_id) is not None
+
+        recorded = await asyncio.gather(*(snapshot(playlist_id) for playlist_id in playlist_ids))
+        logger.info(f"Recorded mood snapshots for {sum(recorded)} of {len(playlist_ids)} watched playlists")
+
+    async def snapshot(self, service: SpotifyService, playlist_id: str) -> Optional[Dict]:
+        """Compute a playlist's current mood from its tracks and record it"""
+        try:
+            tracks = await service.get_playlist_tracks(playlist_id, limit=SNAPSHOT_TRACK_LIMIT, fields='id')
+            track_ids = [track['id'] for track in tracks if track and track.get('id')]
+            if not track_ids:
+                return None
+            audio_features = await service.get_audio_features(track_ids)
+            if not any(audio_features):
+                # Features unavailable: an 'Unknown' point would only distort the history
+                return None
+            mood_data = MoodCalculator.calculate_mood([features for features in audio_features if features])
+            return await self.history.record(playlist_id, mood_data, track_ids, audio_features)
+        except Exception as e:
+            logger.error(f"Error snapshotting mood of playlist {playlist_id}: {e}")
+            return None
@@ -0,0 +1,159 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+FEATURES = ('energy', 'valence', 'tempo', 'danceability')
+
+# Tempo is in BPM; scale it into the same 0-1 range as the other features
+MAX_TEMPO = 220.0
+
+
+def feature_vector(features: Dict) -> Optional[np.ndarray]:
+    """Build a normalized mood vector from a Spotify audio-features object"""
+    if not features or any(features.get(name) is None for name in FEATURES):
+        return None
+    vector = np.array([float(features[name]) for name in FEATURES], dtype=np.float32)
+    vector[2] = min(vector[2] / MAX_TEMPO, 1.0)
+    return vector
+
+
+class MoodIndex:
+    """In-memory exact nearest-neighbour index over normalized mood vectors.
+
+    Vectors live in one contiguous float32 matrix that grows geometrically,
+    so adds are amortized O(1). Rows are also bucketed into a uniform grid
+    over the unit hypercube; queries visit cells in order of their lower-bound
+    distance and stop once no unvisited cell can beat the current k-th best,
+    so only a handful of cells are scanned even with millions of rows.
+
+    Each cell keeps its rows in a growable int64 array that queries slice
+    without copying. A row moving to another cell is swapped out of its old
+    one in O(1), using the row's slot in that array.
+    """
+
+    GRID = 8
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._vectors = np.zeros((initial_capacity, len(FEATURES)), dtype=np.float32)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._row_cells: List[int] = []
+        # Row -> its index in its cell's row array
+        self._row_slots: List[int] = []
+        cells = self.GRID ** len(FEATURES)
+        self._cells: List[np.ndarray] = [np.empty(0, dtype=np.int64) for _ in range(cells)]
+        self._cell_sizes: List[int] = [0] * cells
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._rows
+
+    def add(self, item_id: str, vector: np.ndarray) -> None:
+        """Insert or replace the vector stored for an item"""
+        cell = self._cell_of(vector)
+        with self._lock:
+            row = self._rows.get(item_id)
+            if row is None:
+                row = len(self._ids)
+                if row == self._vectors.shape[0]:
+                    grown = np.zeros((row * 2, len(FEATURES)), dtype=np.float32)
+                    grown[:row] = self._vectors
+                    self._vectors = grown
+                self._ids.append(item_id)
+                self._rows[item_id] = row
+                self._row_cells.append(cell)
+                self._row_slots.append(0)
+                self._insert(cell, row)
+            elif self._row_cells[row] != cell:
+                self._remove(self._row_cells[row], row)
+                self._row_cells[row] = cell
+                self._insert(cell, row)
+            self._vectors[row] = vector
+
+    def _insert(self, cell: int, row: int) -> None:
+        size = self._cell_sizes[cell]
+        rows = self._cells[cell]
+        if size == len(rows):
+            grown = np.empty(max(4, size * 2), dtype=np.int64)
+            grown[:size] = rows[:size]
+            self._cells[cell] = rows = grown
+        rows[size] = row
+        self._row_slots[row] = size
+        self._cell_sizes[cell] = size + 1
+
+    def _remove(self, cell: int, row: int) -> None:
+        rows = self._cells[cell]
+        last = self._cell_sizes[cell] - 1
+        slot = self._row_slots[row]
+        moved = int(rows[last])
+        rows[slot] = moved
+        self._row_slots[moved] = slot
+        self._cell_sizes[cell] = last
+
+    def add_features(self, audio_features: Iterable[Dict]) -> int:
+        """Index Spotify audio-features objects by track id, skipping incomplete ones.
+
+        A track's features never change, so tracks already indexed are skipped.
+        """
+        added = 0
+        for features in audio_features:
+            if not features or not features.get('id') or features['id'] in self:
+                continue
+            vector = feature_vector(features)
+            if vector is not None:
+                self.add(features['id'], vector)
+                added += 1
+        return added
+
+    def get(self, item_id: str) -> Optional[np.ndarray]:
+        """Return the stored vector for an item, if indexed"""
+        row = self._rows.get(item_id)
+        return None if row is None else self._vectors[row].copy()
+
+    def nearest(self, target: np.ndarray, k: int = 20, exclude: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        """Return up to ``k`` (item_id, distance) pairs closest to ``target``"""
+        target = np.asarray(target, dtype=np.float32)
+        gaps = np.maximum(np.maximum(_CELL_LOWS - target, target - _CELL_LOWS - 1.0 / self.GRID), 0)
+        bounds = np.einsum('ij,ij->i', gaps, gaps)
+
+        with self._lock:
+            excluded = {self._rows[item_id] for item_id in exclude if item_id in self._rows}
+            want = k + len(excluded)
+            best_rows = np.empty(0, dtype=np.int64)
+            best_dist = np.empty(0, dtype=np.float32)
+            for cell in np.argsort(bounds, kind='stable'):
+                if len(best_dist) >= want and bounds[cell] > best_dist.max():
+                    break
+                size = self._cell_sizes[cell]
+                if not size:
+                    continue
+                rows = self._cells[cell][:size]
+                diff = self._vectors[rows] - target
+                best_rows = np.concatenate([best_rows, rows])
+                best_dist = np.concatenate([best_dist, np.einsum('ij,ij->i', diff, diff)])
+                if len(best_dist) > want:
+                    keep = np.argpartition(best_dist, want - 1)[:want]
+                    best_rows, best_dist = best_rows[keep], best_dist[keep]
+            ids = [self._ids[row] for row in best_rows]
+
+        results = []
+        for i in np.argsort(best_dist):
+            if int(best_rows[i]) in excluded:
+                continue
+            results.append((ids[i], float(np.sqrt(best_dist[i]))))
+            if len(results) == k:
+                break
+        return results
+
+    def _cell_of(self, vector: np.ndarray) -> int:
+        coords = np.clip((np.asarray(vector) * self.GRID).astype(np.int64), 0, self.GRID - 1)
+        return int(np.ravel_multi_index(tuple(coords), (self.GRID,) * len(FEATURES)))
+
+
+_CELL_LOWS = np.array(
+    list(np.ndindex(*(MoodIndex.GRID,) * len(FEATURES))), dtype=np.float32
+) / MoodIndex.GRID
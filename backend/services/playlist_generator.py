@@ -0,0 +1,158 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from services.mood_calculator import MoodCalculator
+from services.mood_index import FEATURES, MAX_TEMPO
+
+ARCS = ('flat', 'warmup', 'cooldown', 'warmup_cooldown')
+# Features an arc moves; valence and danceability stay at their targets
+ARC_FEATURES = ('energy', 'tempo')
+# Weight of the playlist-average term relative to the per-slot fit
+MEAN_WEIGHT = 1.0
+# Replacement candidates considered per slot during local search
+SHORTLIST_SIZE = 32
+MAX_PASSES = 8
+# Smaller pools are cheaper to search inline than to ship to a worker process
+GENERATOR_POOL_MIN_TRACKS = 500
+
+
+def feature_matrix(audio_features: Sequence[Dict]) -> np.ndarray:
+    """Normalized (tracks x FEATURES) matrix, tempo scaled into 0-1 like the mood index"""
+    matrix = np.array([[float(features[name]) for name in FEATURES] for features in audio_features], dtype=np.float64)
+    matrix = matrix.reshape(-1, len(FEATURES))
+    matrix[:, 2] = np.minimum(matrix[:, 2] / MAX_TEMPO, 1.0)
+    return matrix
+
+
+def arc_shape(arc: str, length: int) -> np.ndarray:
+    """Offset per slot in [-1, 1]: the mood arc the playlist follows"""
+    position = np.linspace(0.0, 1.0, length) if length > 1 else np.zeros(1)
+    if arc == 'warmup':
+        return position * 2 - 1
+    if arc == 'cooldown':
+        return 1 - position * 2
+    if arc == 'warmup_cooldown':
+        return 1 - np.abs(position * 2 - 1) * 2
+    return np.zeros(length)
+
+
+def slot_targets(target: Dict[str, Optional[float]], length: int, arc: str = 'flat', arc_span: float = 0.4):
+    """Per-slot target vectors and feature weights; features without a target get weight 0"""
+    weights = np.array([0.0 if target.get(name) is None else 1.0 for name in FEATURES])
+    base = np.array([target.get(name) or 0.0 for name in FEATURES], dtype=np.float64)
+    base[2] = min(base[2] / MAX_TEMPO, 1.0)
+
+    targets = np.tile(base, (length, 1))
+    offsets = arc_shape(arc, length) * arc_span / 2
+    for name in ARC_FEATURES:
+        column = FEATURES.index(name)
+        if weights[column]:
+            targets[:, column] = np.clip(base[column] + offsets, 0.0, 1.0)
+    return targets, weights
+
+
+def _total_cost(slot_costs: np.ndarray, mean_error: np.ndarray, weights: np.ndarray, length: int) -> float:
+    return float(slot_costs.sum() + MEAN_WEIGHT * length * (weights * mean_error ** 2).sum())
+
+
+def select_tracks(features: np.ndarray, targets: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Choose one distinct track per slot, close to each slot's target.
+
+    Minimizes the summed weighted squared distance of each track to its
+    slot's target plus a term keeping the playlist average on the average
+    target (the average is what MoodCalculator scores). A greedy pass fills
+    the slots in order; local search then tries replacing each track with
+    one of its slot's nearest unused candidates and swapping pairs of slots,
+    until a pass brings no improvement.
+    """
+    length = min(len(targets), len(features))
+    targets = targets[:length]
+    target_mean = targets.mean(axis=0)
+
+    # (slots x tracks) fit of every track to every slot
+    distances = ((features[None, :, :] - targets[:, None, :]) ** 2 * weights).sum(axis=2)
+
+    chosen = np.empty(length, dtype=np.int64)
+    used = np.zeros(len(features), dtype=bool)
+    total = np.zeros(len(FEATURES))
+    for slot in range(length):
+        # Fit to the slot plus how far the running average would drift from the target's
+        drift = ((total + features) / (slot + 1) - targets[:slot + 1].mean(axis=0)) ** 2
+        cost = distances[slot] + MEAN_WEIGHT * (drift * weights).sum(axis=1)
+        cost[used] = np.inf
+        best = int(np.argmin(cost))
+        chosen[slot] = best
+        used[best] = True
+        total += features[best]
+
+    shortlist_size = min(SHORTLIST_SIZE, len(features) - 1)
+    shortlist = np.argpartition(distances, shortlist_size, axis=1)[:, :shortlist_size + 1] if shortlist_size > 0 else None
+
+    for _ in range(MAX_PASSES):
+        improved = False
+
+        if shortlist is not None:
+            for slot in range(length):
+                candidates = shortlist[slot][~used[shortlist[slot]]]
+                if not len(candidates):
+                    continue
+                current = chosen[slot]
+                new_means = (total - features[current] + features[candidates]) / length
+                delta = (distances[slot, candidates] - distances[slot, current]) + MEAN_WEIGHT * length * (
+                    ((new_means - target_mean) ** 2 * weights).sum(axis=1)
+                    - ((total / length - target_mean) ** 2 * weights).sum()
+                )
+                best = int(np.argmin(delta))
+                if delta[best] < -1e-12:
+                    replacement = candidates[best]
+                    used[current], used[replacement] = False, True
+                    total += features[replacement] - features[current]
+                    chosen[slot] = replacement
+                    improved = True
+
+        # Reordering only changes the per-slot fit; take the best pairwise swap until none helps
+        for _ in range(length):
+            fit = distances[:, chosen]  # fit[slot, position]: track at position placed in slot
+            current_fit = np.diag(fit)
+            delta = fit + fit.T - current_fit[:, None] - current_fit[None, :]
+            first, second = np.unravel_index(int(np.argmin(delta)), delta.shape)
+            if delta[first, second] >= -1e-12:
+                break
+            chosen[[first, second]] = chosen[[second, first]]
+            improved = True
+
+        if not improved:
+            break
+    return chosen
+
+
+def generate_playlist(
+    track_ids: List[str],
+    audio_features: List[Dict],
+    target: Dict[str, Optional[float]],
+    length: int,
+    arc: str = 'flat',
+    arc_span: float = 0.4
+) -> Dict:
+    """Pick ``length`` tracks from a pool to match a target mood; pure CPU, safe for the worker pool"""
+    features = feature_matrix(audio_features)
+    targets, weights = slot_targets(target, min(length, len(track_ids)), arc, arc_span)
+    chosen = select_tracks(features, targets, weights)
+
+    selected = [audio_features[index] for index in chosen]
+    slot_costs = ((features[chosen] - targets) ** 2 * weights).sum(axis=1)
+    mean_error = features[chosen].mean(axis=0) - targets.mean(axis=0)
+    return {
+        'track_ids': [track_ids[index] for index in chosen],
+        # Per-slot targets in Spotify units; None for features the caller left open
+        'targets': [
+            {
+                name: round(float(value) * (MAX_TEMPO if name == 'tempo' else 1), 2) if weight else None
+                for name, value, weight in zip(FEATURES, row, weights)
+            }
+            for row in targets
+        ],
+        'mood': MoodCalculator.calculate_mood(selected),
+        'cost': round(_total_cost(slot_costs, mean_error, weights, len(chosen)), 4)
+    }
@@ -0,0 +1,119 @@
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Fingerprints kept per playlist; older snapshots are not asked about again
+MAX_FINGERPRINTS = 8
+
+
+def track_set_fingerprint(track_ids: Iterable[str]) -> str:
+    """Hash a playlist's track IDs; order does not affect mood, so it is ignored"""
+    digest = hashlib.sha1()
+    for track_id in sorted(track_ids):
+        digest.update(track_id.encode())
+        digest.update(b'\0')
+    return f"tracks:{digest.hexdigest()}"
+
+
+def snapshot_fingerprint(snapshot_id: str) -> str:
+    """Fingerprint derived from a Spotify playlist snapshot_id"""
+    return f"snapshot:{snapshot_id}"
+
+
+class PlaylistMoodStore:
+    """Persisted playlist moods, invalidated by a track-set fingerprint.
+
+    A playlist can carry two fingerprints: the Spotify ``snapshot_id`` (known
+    from the cheap playlist listing) and a hash of its track IDs (known once
+    tracks are fetched). Either one matching means the stored mood is current.
+    """
+
+    def __init__(self, db):
+        self.collection = db.playlist_moods
+
+    async def ensure_indexes(self) -> None:
+        """Create the lookup and mood-category indexes"""
+        try:
+            await self.collection.create_index('playlist_id', unique=True)
+            await self.collection.create_index([('overall_mood', 1), ('mood_score', -1)])
+        except Exception as e:
+            logger.error(f"Error creating playlist mood indexes: {e}")
+
+    async def get(self, playlist_id: str, fingerprint: str) -> Optional[Dict]:
+        """Return the stored mood if it was computed for this fingerprint"""
+        try:
+            doc = await self.collection.find_one(
+                {'playlist_id': playlist_id, 'fingerprints': fingerprint},
+                {'_id': 0, 'mood': 1}
+            )
+            return doc['mood'] if doc else None
+        except Exception as e:
+            logger.error(f"Error reading stored playlist mood: {e}")
+            return None
+
+    async def save(self, playlist_id: str, fingerprints: List[str], mood_data: Dict) -> None:
+        """Persist a playlist's mood along with the fingerprints it is valid for"""
+        try:
+            await self.collection.update_one(
+                {'playlist_id': playlist_id},
+                {'$set': {
+                    'fingerprints': fingerprints,
+                    'overall_mood': mood_data['overall_mood'],
+                    'mood_score': mood_data['mood_score'],
+                    'mood': mood_data,
+                    'updated_at': datetime.now(timezone.utc).isoformat()
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Error saving playlist mood: {e}")
+
+    async def add_fingerprint(self, playlist_id: str, fingerprint: str) -> None:
+        """Record that an unchanged stored mood is also valid for a new fingerprint"""
+        try:
+            # Keeps the newest MAX_FINGERPRINTS: every edit of a busy playlist adds a snapshot
+            await self.collection.update_one(
+                {'playlist_id': playlist_id, 'fingerprints': {'$ne': fingerprint}},
+                {'$push': {'fingerprints': {'$each': [fingerprint], '$slice': -MAX_FINGERPRINTS}}}
+            )
+        except Exception as e:
+            logger.error(f"Error updating playlist mood fingerprint: {e}")
+
+    async def stale(self, fingerprints: Dict[str, str]) -> List[str]:
+        """Return the playlist IDs whose stored mood is missing or outdated"""
+        current = set()
+        try:
+            cursor = self.collection.find(
+                {'playlist_id': {'$in': list(fingerprints)}},
+                {'_id': 0, 'playlist_id': 1, 'fingerprints': 1}
+            )
+            async for doc in cursor:
+                if fingerprints[doc['playlist_id']] in doc.get('fingerprints', []):
+                    current.add(doc['playlist_id'])
+        except Exception as e:
+            logger.error(f"Error checking stored playlist moods: {e}")
+        return [playlist_id for playlist_id in fingerprints if playlist_id not in current]
+
+    async def moods(self, playlist_ids: List[str]) -> Dict[str, Dict]:
+        """Last stored mood of each of these playlists that has one, current or not"""
+        try:
+            cursor = self.collection.find({'playlist_id': {'$in': playlist_ids}}, {'_id': 0, 'playlist_id': 1, 'mood': 1})
+            return {doc['playlist_id']: doc['mood'] async for doc in cursor}
+        except Exception as e:
+            logger.error(f"Error reading stored playlist moods: {e}")
+            return {}
+
+    async def find_by_mood(self, overall_mood: str, playlist_ids: List[str]) -> List[Dict]:
+        """Return stored moods in a category for the given playlists, best score first"""
+        try:
+            cursor = self.collection.find(
+                {'overall_mood': overall_mood, 'playlist_id': {'$in': playlist_ids}},
+                {'_id': 0, 'playlist_id': 1, 'mood': 1}
+            ).sort('mood_score', -1)
+            return await cursor.to_list(len(playlist_ids))
+        except Exception as e:
+            logger.error(f"Error filtering playlists by mood: {e}")
+            return []
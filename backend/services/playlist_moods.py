@@ -0,0 +1,77 @@
+import asyncio
+from typing import Dict, List
+
+from services.mood_calculator import MoodCalculator
+from services.playlist_mood_store import PlaylistMoodStore, snapshot_fingerprint, track_set_fingerprint
+from services.spotify_service import SpotifyService
+from services.tracing import span
+from services.worker_pool import WorkerPool
+
+# Bound concurrent mood recomputations triggered by a single request
+MOOD_REFRESH_CONCURRENCY = 5
+# Smaller batches are cheaper to calculate inline than to ship to a worker process
+MOOD_POOL_MIN_BATCH = 8
+
+
+async def calculate_playlist_moods(
+    service: SpotifyService,
+    playlists: List[Dict],
+    store: PlaylistMoodStore,
+    pool: WorkerPool
+) -> Dict[str, Dict]:
+    """Return moods for playlists, recalculating only those whose tracks changed.
+
+    Each playlist is a dict with ``id`` and optionally ``snapshot_id``.
+    A stored mood matching the snapshot is returned without fetching the
+    tracks, so ``snapshot_id`` must come from Spotify for this service's
+    token (a playlist listing or lookup), never from the client.
+    Fresh calculations are batched into a single worker-pool submission.
+    """
+    semaphore = asyncio.Semaphore(MOOD_REFRESH_CONCURRENCY)
+    moods: Dict[str, Dict] = {}
+    pending = []
+
+    async def resolve(playlist: Dict) -> None:
+        playlist_id, snapshot_id = playlist['id'], playlist.get('snapshot_id')
+        async with semaphore:
+            fingerprints = []
+            if snapshot_id:
+                fingerprints.append(snapshot_fingerprint(snapshot_id))
+                stored = await store.get(playlist_id, fingerprints[0])
+                if stored is not None:
+                    moods[playlist_id] = stored
+                    return
+
+            tracks = await service.get_playlist_tracks(playlist_id, limit=50, snapshot_id=snapshot_id, fields='id')
+            if not tracks:
+                return
+
+            track_ids = [track['id'] for track in tracks if track and track.get('id')]
+            tracks_fingerprint = track_set_fingerprint(track_ids)
+            stored = await store.get(playlist_id, tracks_fingerprint)
+            if stored is not None:
+                # Same tracks under a new snapshot (e.g. a renamed playlist); keep the mood
+                if fingerprints:
+                    await store.add_fingerprint(playlist_id, fingerprints[0])
+                moods[playlist_id] = stored
+                return
+
+            audio_features = [f for f in await service.get_audio_features(track_ids) if f]
+            pending.append((playlist_id, fingerprints + [tracks_fingerprint], audio_features))
+
+    await asyncio.gather(*(resolve(playlist) for playlist in playlists))
+
+    if pending:
+        feature_sets = [audio_features for _, _, audio_features in pending]
+        if len(pending) >= MOOD_POOL_MIN_BATCH:
+            results = await pool.submit(MoodCalculator.calculate_moods, feature_sets)
+        else:
+            with span('MoodCalculator.calculate_moods', attributes={'mood.sets': len(feature_sets)}):
+                results = MoodCalculator.calculate_moods(feature_sets)
+        saves = []
+        for (playlist_id, fingerprints, audio_features), mood_data in zip(pending, results):
+            moods[playlist_id] = mood_data
+            if audio_features:
+                saves.append(store.save(playlist_id, fingerprints, mood_data))
+        await asyncio.gather(*saves)
+    return moods
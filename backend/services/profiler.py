@@ -0,0 +1,72 @@
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+
+# Longest profile a request may ask for
+MAX_PROFILE_SECONDS = 60.0
+
+
+class ProfileInProgress(Exception):
+    """Another profile is already sampling this worker"""
+
+
+class SamplingProfiler:
+    """Samples the Python stacks of every thread in this worker.
+
+    ``profile`` runs in its own thread and returns how often each stack was
+    seen, in the collapsed format (``thread;outer;...;inner count``) read by
+    flamegraph.pl, inferno and speedscope. The event-loop thread's stacks
+    show where the loop spends CPU: JSON encoding, mood scoring run inline,
+    cache serialisation; an idle loop sits in ``select``. Time a request
+    spends awaiting an upstream is not on any thread's stack, the slow
+    request traces cover that. Work sent to the worker pool runs in other
+    processes and is not sampled.
+
+    One profile runs at a time per worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._roots: Optional[List[str]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, seconds: float, interval: float, stop: threading.Event) -> str:
+        """Sample every ``interval`` seconds for ``seconds`` or until ``stop`` is set"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfileInProgress("A profile is already running on this worker")
+        try:
+            me = threading.get_ident()
+            stacks: Counter = Counter()
+            ends_at = time.monotonic() + seconds
+            while time.monotonic() < ends_at and not stop.is_set():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident != me:
+                        stacks[self._collapse(names.get(ident, str(ident)), frame)] += 1
+                stop.wait(interval)
+            return ''.join(f'{stack} {count}\n' for stack, count in sorted(stacks.items()))
+        finally:
+            self._lock.release()
+
+    def _collapse(self, thread: str, frame) -> str:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f'{code.co_qualname} ({self._short(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        frames.append(thread)
+        return ';'.join(reversed(frames))
+
+    def _short(self, filename: str) -> str:
+        """Path relative to the import root it was loaded from, e.g. ``fastapi/encoders.py``"""
+        if self._roots is None:
+            self._roots = sorted({path.rstrip('/') + '/' for path in sys.path if path}, key=len, reverse=True)
+        for root in self._roots:
+            if filename.startswith(root):
+                return filename[len(root):]
+        return filename
@@ -0,0 +1,49 @@
+from functools import lru_cache
+from typing import Any, Dict, Union
+
+# Compact shapes covering everything the UI reads; drops available_markets & co.
+TRACK_FIELDS = (
+    'id,name,uri,duration_ms,explicit,preview_url,'
+    'artists.id,artists.name,album.id,album.name,album.images'
+)
+PLAYLIST_FIELDS = 'id,name,description,uri,snapshot_id,images,owner.id,owner.display_name,tracks.total'
+
+FieldTree = Dict[str, Union[bool, 'FieldTree']]
+
+
+@lru_cache(maxsize=256)
+def parse_fields(fields: str) -> FieldTree:
+    """Parse 'id,artists.name,album' into a nested tree of selected keys"""
+    tree: Dict = {}
+    for path in fields.split(','):
+        parts = [part for part in path.strip().split('.') if part]
+        if not parts:
+            continue
+        node = tree
+        for part in parts[:-1]:
+            child = node.get(part)
+            if child is True:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = True
+    return tree
+
+
+def project(value: Any, tree: Union[bool, FieldTree]) -> Any:
+    """Keep only the selected keys of a (list of) Spotify object(s)"""
+    if tree is True or value is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: project(value[key], sub) for key, sub in tree.items() if key in value}
+    return value
+
+
+def spotify_fields(tree: FieldTree) -> str:
+    """Render a field tree in the Spotify Web API ``fields`` syntax, e.g. 'id,artists(name)'"""
+    return ','.join(
+        key if sub is True else f'{key}({spotify_fields(sub)})'
+        for key, sub in tree.items()
+    )
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitTimeout(Exception):
+    """Raised when no token became available within ``max_wait``"""
+
+
+class DistributedTokenBucket:
+    """Token bucket shared by every worker through one MongoDB document.
+
+    Refill and take happen in a single atomic pipeline update, so N workers
+    together stay within ``rate`` requests per second (bursting to
+    ``capacity``) instead of each getting their own quota. ``penalize``
+    pauses the whole deployment, e.g. after an upstream 429. If MongoDB is
+    unreachable the bucket fails open and the request goes ahead.
+    """
+
+    def __init__(self, db, name: str, rate: float, capacity: float, max_wait: float = 10.0):
+        self.collection = db.rate_limits
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait_seconds = 0.0
+        self.timeouts = 0
+        self.errors = 0
+        self.penalties = 0
+
+    async def acquire(self, max_wait: Optional[float] = None) -> None:
+        """Wait until a token is available and take it, for at most ``max_wait`` (default the bucket's)"""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        waited = False
+        started = time.monotonic()
+        while True:
+            try:
+                state = await self._take()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Rate limiter {self.name} unavailable, allowing request: {e}")
+                return
+            if state['granted']:
+                self.acquired += 1
+                if waited:
+                    self.waited += 1
+                    self.total_wait_seconds += time.monotonic() - started
+                return
+
+            now = time.time()
+            delay = max(state.get('blocked_until', 0) - now, (1 - state['tokens']) / self.rate, 0.01)
+            if time.monotonic() + delay > deadline:
+                self.timeouts += 1
+                raise RateLimitTimeout(f"{self.name}: no token within {max_wait:g}s")
+            waited = True
+            await asyncio.sleep(delay)
+
+    async def penalize(self, seconds: float) -> None:
+        """Stop every worker from taking tokens for ``seconds``"""
+        self.penalties += 1
+        try:
+            await self.collection.update_one(
+                {'_id': self.name},
+                {'$max': {'blocked_until': time.time() + seconds}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Error recording rate limit penalty for {self.name}: {e}")
+
+    async def _take(self) -> Dict:
+        now = time.time()
+        refilled = {'$min': [
+            self.capacity,
+            {'$add': [
+                {'$ifNull': ['$tokens', self.capacity]},
+                {'$multiply': [{'$subtract': [now, {'$ifNull': ['$updated_at', now]}]}, self.rate]}
+            ]}
+        ]}
+        can_take = {'$and': [
+            {'$gte': ['$tokens', 1]},
+            {'$lte': [{'$ifNull': ['$blocked_until', 0]}, now]}
+        ]}
+        return await self.collection.find_one_and_update(
+            {'_id': self.name},
+            [
+                {'$set': {'tokens': refilled, 'updated_at': now}},
+                {'$set': {
+                    'granted': can_take,
+                    'tokens': {'$cond': [can_take, {'$subtract': ['$tokens', 1]}, '$tokens']}
+                }}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    def metrics(self) -> Dict:
+        """Tokens taken, waits, timeouts and upstream penalties in this worker"""
+        return {
+            'rate': self.rate,
+            'capacity': self.capacity,
+            'acquired': self.acquired,
+            'waited': self.waited,
+            'avg_wait_seconds': round(self.total_wait_seconds / self.waited, 4) if self.waited else 0,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'penalties': self.penalties
+        }
@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import logging
+import unicodedata
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.deadlines import start_shared, within_deadline
+
+logger = logging.getLogger(__name__)
+
+SearchFetcher = Callable[[str, int], Awaitable[List[Dict]]]
+# Spotify treats these as operators only in upper case, so they keep their case in cache keys
+SEARCH_OPERATORS = frozenset({'AND', 'OR', 'NOT'})
+
+
+class SearchSuperseded(Exception):
+    """Raised when a newer search from the same client replaces a pending one"""
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so equivalent keystrokes share a cache entry.
+
+    Only for keys: case and spacing do not change what Spotify matches,
+    except for operators and field filter names (``artist:``), which are
+    left as typed. The query sent upstream is always the original.
+    """
+    tokens = []
+    for token in unicodedata.normalize('NFKC', query).split():
+        if token in SEARCH_OPERATORS:
+            tokens.append(token)
+        elif ':' in token:
+            field, value = token.split(':', 1)
+            tokens.append(f'{field}:{value.casefold()}')
+        else:
+            tokens.append(token.casefold())
+    return ' '.join(tokens)
+
+
+def client_key(access_token: str) -> str:
+    """Derive a stable per-client key without keeping raw tokens in memory"""
+    return hashlib.sha256(access_token.encode()).hexdigest()[:16]
+
+
+class SearchCache:
+    """Coalesces concurrent track searches and drops superseded ones.
+
+    Results are cached by ``SpotifyService.search_tracks`` in the tiered
+    cache. This only lets equivalent searches in flight (same client, same
+    normalized query, a limit no larger) share one upstream request, and
+    lets a newer search from the same client replace its pending one. The
+    shared request runs on one caller's token, so it is never shared with
+    other clients: their errors and rate limits would become everyone's.
+    """
+
+    def __init__(self):
+        # client and normalized query -> (limit, task) of the upstream search in flight
+        self._inflight: Dict[str, Tuple[int, asyncio.Task]] = {}
+        self._waiters: Dict[str, int] = {}
+        self._client_generation: Dict[str, int] = {}
+        self._client_waits: Dict[str, asyncio.Future] = {}
+
+    async def search(
+        self,
+        query: str,
+        limit: int,
+        fetch: SearchFetcher,
+        client_id: Optional[str] = None
+    ) -> List[Dict]:
+        """Run ``fetch(query, limit)``, or join an equivalent search already running.
+
+        When ``client_id`` is given, a newer call from the same client drops
+        this one: it raises ``SearchSuperseded`` and the upstream request is
+        cancelled if nobody else is waiting on it.
+        """
+        key = f'{client_id or ""}:{normalize_query(query)}'
+        task = self._start_fetch(key, query, limit, fetch)
+        tracks = await self._wait(key, task, client_id)
+        return tracks[:limit]
+
+    def _start_fetch(self, key: str, query: str, limit: int, fetch: SearchFetcher) -> asyncio.Task:
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[0] >= limit:
+            return inflight[1]
+
+        task = start_shared(fetch(query, limit))
+        self._inflight[key] = (limit, task)
+
+        def done(finished: asyncio.Task) -> None:
+            if self._inflight.get(key, (0, None))[1] is finished:
+                del self._inflight[key]
+            if not finished.cancelled() and finished.exception() is not None:
+                logger.error(f"Error searching for '{key}': {finished.exception()}")
+
+        task.add_done_callback(done)
+        return task
+
+    async def _wait(self, key: str, task: asyncio.Task, client_id: Optional[str]) -> List[Dict]:
+        generation = 0
+        if client_id is not None:
+            generation = self._client_generation.get(client_id, 0) + 1
+            self._client_generation[client_id] = generation
+            previous = self._client_waits.get(client_id)
+            if previous is not None and not previous.done():
+                previous.cancel()
+
+        waiter = asyncio.shield(task)
+        if client_id is not None:
+            self._client_waits[client_id] = waiter
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # The fetch may have been started by a request with less time left
+            return await within_deadline(waiter)
+        except asyncio.CancelledError:
+            if client_id is not None and self._client_generation.get(client_id) != generation:
+                raise SearchSuperseded(key) from None
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                # Nobody wants this result any more; stop spending upstream quota on it
+                if not task.done():
+                    task.cancel()
+            if client_id is not None and self._client_generation.get(client_id) == generation:
+                del self._client_generation[client_id]
+                self._client_waits.pop(client_id, None)
@@ -0,0 +1,78 @@
+import logging
+from typing import Callable, Dict, Optional, Sequence
+
+from services.audio_analysis import probe_duration_ms
+from services.supabase_service import SupabaseService
+from services.transcoding import (
+    HLS_CONTENT_TYPES, MASTER_PLAYLIST, rendition_name, transcode_to_hls, upload_order
+)
+from services.waveform import waveform_from_audio
+from services.waveform_store import WaveformStore
+from services.worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+
+class SongProcessor:
+    """Post-upload processing for songs, run as background jobs"""
+
+    POST_PROCESS_JOB = 'songs.post_process'
+    TRANSCODE_JOB = 'songs.transcode'
+    WAVEFORM_JOB = 'songs.waveform'
+
+    def __init__(
+        self,
+        get_supabase_service: Callable[[], SupabaseService],
+        pool: WorkerPool,
+        transcode_pool: Optional[WorkerPool] = None,
+        bitrates: Sequence[int] = (),
+        ffmpeg: str = 'ffmpeg',
+        waveform_store: Optional[WaveformStore] = None
+    ):
+        # Resolved per job so the Supabase client is only built once a job actually runs
+        self.get_supabase_service = get_supabase_service
+        self.pool = pool
+        # Transcoding holds a worker for the length of an ffmpeg run, so it gets its own pool
+        self.transcode_pool = transcode_pool or pool
+        self.bitrates = list(bitrates)
+        self.ffmpeg = ffmpeg
+        self.waveform_store = waveform_store
+
+    async def post_process(self, payload: Dict) -> Dict:
+        """Fill in metadata that needs the audio itself (currently the duration)"""
+        supabase_service = self.get_supabase_service()
+        contents = await supabase_service.download_song_file(payload['filename'])
+        duration_ms = await self.pool.submit(probe_duration_ms, contents)
+        if duration_ms:
+            await supabase_service.update_song(payload['song_id'], {"duration_ms": duration_ms})
+        return {"duration_ms": duration_ms}
+
+    async def transcode(self, payload: Dict) -> Dict:
+        """Transcode to the configured bitrates, publish HLS renditions and record them on the song"""
+        supabase_service = self.get_supabase_service()
+        contents = await supabase_service.download_song_file(payload['filename'])
+        files = await self.transcode_pool.submit(transcode_to_hls, contents, self.bitrates, self.ffmpeg)
+
+        prefix = f"hls/{payload['song_id']}"
+        urls = {}
+        for name in upload_order(files):
+            content_type = HLS_CONTENT_TYPES.get(name[name.rfind('.'):], 'application/octet-stream')
+            urls[name] = await supabase_service.upload_stream_file(f"{prefix}/{name}", files[name], content_type)
+
+        renditions = [
+            {"bitrate_kbps": bitrate, "url": urls[f"{rendition_name(bitrate)}/index.m3u8"]}
+            for bitrate in self.bitrates
+        ]
+        await supabase_service.update_song(payload['song_id'], {
+            "hls_url": urls[MASTER_PLAYLIST],
+            "renditions": renditions
+        })
+        return {"hls_url": urls[MASTER_PLAYLIST], "files": len(files)}
+
+    async def waveform(self, payload: Dict) -> Dict:
+        """Precompute the song's waveform peaks so players never download the audio to draw them"""
+        supabase_service = self.get_supabase_service()
+        contents = await supabase_service.download_song_file(payload['filename'])
+        waveform = await self.pool.submit(waveform_from_audio, contents, self.ffmpeg)
+        await self.waveform_store.save(payload['song_id'], waveform)
+        return {"duration_ms": waveform['duration_ms'], "resolutions": list(waveform['levels'])}
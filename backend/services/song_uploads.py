@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import mimetypes
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import UploadFile
+
+from services.audio_files import AudioFileStore, SpooledUpload, UploadTooLarge, content_filename, spool_and_hash
+from services.circuit_breaker import CircuitOpen
+from services.job_queue import JobQueue
+from services.song_processing import SongProcessor
+from services.supabase_service import SupabaseService
+from services.waveform_store import WaveformStore
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+MAX_BATCH_FILES = 50
+
+
+class UploadRejected(Exception):
+    """The file is not acceptable as a song; the message is safe to show to the user"""
+
+
+class SongUploader:
+    """Stores uploaded audio, creates the songs rows and queues their processing"""
+
+    def __init__(
+        self,
+        supabase_service: SupabaseService,
+        audio_files: AudioFileStore,
+        waveform_store: WaveformStore,
+        job_queue: JobQueue,
+        transcode: bool = False,
+        concurrency: int = 4
+    ):
+        self.supabase_service = supabase_service
+        self.audio_files = audio_files
+        self.waveform_store = waveform_store
+        self.job_queue = job_queue
+        self.transcode = transcode
+        self.concurrency = concurrency
+
+    async def upload(self, file: UploadFile, metadata: Dict) -> Dict:
+        """Store one file and create its song"""
+        stored = await self.store_file(file)
+        try:
+            song_data, processed = await self._song_data(stored, metadata)
+            song = await self.supabase_service.create_song(song_data)
+        except Exception:
+            await self._discard([stored])
+            raise
+        return await self._finish(stored, song_data, processed, song)
+
+    async def upload_many(self, files: Sequence[UploadFile], metadata: Sequence[Dict]) -> List[Dict]:
+        """Store files concurrently, then create every song in one insert.
+
+        At most ``concurrency`` files are read and uploaded at once. A file
+        that fails is reported in its result without affecting the others.
+        If the songs cannot be created, the files stored for them are
+        deleted again before the error is raised.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def store(file: UploadFile) -> Dict:
+            async with semaphore:
+                return await self.store_file(file)
+
+        stored_files = await asyncio.gather(*(store(file) for file in files), return_exceptions=True)
+
+        results: List[Optional[Dict]] = [None] * len(files)
+        pending = []
+        try:
+            for index, (file, stored) in enumerate(zip(files, stored_files)):
+                if isinstance(stored, UploadRejected):
+                    results[index] = {"filename": file.filename, "success": False, "error": str(stored)}
+                elif isinstance(stored, CircuitOpen):
+                    results[index] = {"filename": file.filename, "success": False, "error": "Song storage is unavailable"}
+                elif isinstance(stored, BaseException):
+                    logger.error(f"Error storing {file.filename}: {stored}")
+                    results[index] = {"filename": file.filename, "success": False, "error": "Failed to store file"}
+                else:
+                    song_data, processed = await self._song_data(stored, metadata[index])
+                    pending.append((index, stored, song_data, processed))
+            if pending:
+                songs = await self.supabase_service.create_songs([song_data for _, _, song_data, _ in pending])
+        except Exception:
+            await self._discard([stored for stored in stored_files if not isinstance(stored, BaseException)])
+            raise
+
+        if pending:
+            for (index, stored, song_data, processed), song in zip(pending, songs):
+                results[index] = {
+                    "filename": files[index].filename,
+                    **await self._finish(stored, song_data, processed, song)
+                }
+        return results
+
+    async def store_file(self, file: UploadFile) -> Dict:
+        """Validate and hash a file, uploading it unless identical contents are already stored"""
+        if not file.content_type or not file.content_type.startswith('audio/'):
+            raise UploadRejected("File must be an audio file")
+        try:
+            async with spool_and_hash(file, MAX_UPLOAD_SIZE) as spooled:
+                return await self._store_spooled(file, spooled)
+        except UploadTooLarge:
+            raise UploadRejected("File size must be less than 10MB")
+
+    async def _store_spooled(self, file: UploadFile, spooled: SpooledUpload) -> Dict:
+        content_hash = spooled.content_hash
+        # Identical files share one storage object, so a repeat upload skips storage entirely
+        stored = await self.audio_files.get(content_hash)
+        if stored:
+            await self.audio_files.record_use(content_hash)
+            return {
+                "filename": stored["filename"],
+                "audio_url": stored["audio_url"],
+                "content_hash": content_hash,
+                "deduplicated": True
+            }
+
+        file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'mp3'
+        filename = content_filename(content_hash, file_extension)
+        # Label the object with the format that was actually uploaded
+        content_type = mimetypes.guess_type(filename)[0] or file.content_type
+        audio_url = await self.supabase_service.upload_song_file(spooled.path, filename, content_type)
+        await self.audio_files.add(content_hash, filename, audio_url, spooled.size, content_type)
+        return {"filename": filename, "audio_url": audio_url, "content_hash": content_hash, "deduplicated": False}
+
+    async def _discard(self, stored_files: Sequence[Dict]) -> None:
+        """Delete files stored for songs that were never created, unless another upload has reused them"""
+        for stored in stored_files:
+            if stored["deduplicated"] or not await self.audio_files.remove_unused(stored["content_hash"]):
+                continue
+            try:
+                await self.supabase_service.delete_song_file(stored["filename"])
+            except Exception as e:
+                logger.error(f"Error deleting unused file {stored['filename']}: {e}")
+
+    async def _song_data(self, stored: Dict, metadata: Dict) -> Tuple[Dict, Optional[Dict]]:
+        song_data = {
+            "title": metadata["title"],
+            "artist": metadata["artist"],
+            "album": metadata.get("album"),
+            "genre": metadata.get("genre"),
+            "duration_ms": 0,  # Filled in by the post-processing job
+            "audio_url": stored["audio_url"],
+            "uploaded_by": metadata.get("uploaded_by"),
+            "is_public": True
+        }
+
+        # Another song with the same file already has everything derived from the audio
+        processed = None
+        if stored["deduplicated"]:
+            processed = await self.supabase_service.find_song_by_audio_url(stored["audio_url"])
+        if processed:
+            song_data["duration_ms"] = processed.get("duration_ms") or 0
+            if processed.get("hls_url"):
+                song_data["hls_url"] = processed["hls_url"]
+                song_data["renditions"] = processed.get("renditions")
+        return song_data, processed
+
+    async def _finish(self, stored: Dict, song_data: Dict, processed: Optional[Dict], song: Optional[Dict]) -> Dict:
+        # Reading metadata from the audio and transcoding happen in the background
+        job_id = None
+        transcode_job_id = None
+        if song:
+            payload = {"song_id": song["id"], "filename": stored["filename"]}
+            try:
+                if not song_data["duration_ms"]:
+                    job_id = await self.job_queue.enqueue(SongProcessor.POST_PROCESS_JOB, payload)
+                if not (processed and await self.waveform_store.copy(processed["id"], song["id"])):
+                    await self.job_queue.enqueue(SongProcessor.WAVEFORM_JOB, payload)
+                if self.transcode and not song_data.get("hls_url"):
+                    # Below post-processing: the original file plays fine until the renditions exist
+                    transcode_job_id = await self.job_queue.enqueue(
+                        SongProcessor.TRANSCODE_JOB, payload, priority=-1
+                    )
+            except Exception as e:
+                logger.error(f"Error queueing song post-processing: {e}")
+
+        return {
+            "success": song is not None,
+            "song": song,
+            "job_id": job_id,
+            "transcode_job_id": transcode_job_id,
+            "deduplicated": stored["deduplicated"]
+        }
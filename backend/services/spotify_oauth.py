@@ -1,19 +1,14 @@
-import os
+import asyncio
+import time
 import httpx
 from urllib.parse import urlencode
 from typing import Dict, Optional
-from dotenv import load_dotenv
-from pathlib import Path
 
 class SpotifyOAuth:
-    def __init__(self):
-        # Load environment variables
-        ROOT_DIR = Path(__file__).parent.parent
-        load_dotenv(ROOT_DIR / '.env')
-        
-        self.client_id = os.environ.get('SPOTIFY_CLIENT_ID')
-        self.client_secret = os.environ.get('SPOTIFY_CLIENT_SECRET')
-        self.redirect_uri = os.environ.get('SPOTIFY_REDIRECT_URI')
+    def __init__(self, client_id: Optional[str], client_secret: Optional[str], redirect_uri: Optional[str]):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
         self.auth_url = 'https://accounts.spotify.com/authorize'
         self.token_url = 'https://accounts.spotify.com/api/token'
         self.scopes = [
@@ -24,6 +19,9 @@ class SpotifyOAuth:
             'user-library-read',
             'user-top-read'
         ]
+        self._app_token: Optional[str] = None
+        self._app_token_expires_at = 0.0
+        self._app_token_lock = asyncio.Lock()
 
     def get_auth_url(self) -> str:
         """Generate Spotify authorization URL"""
@@ -68,3 +66,23 @@ class SpotifyOAuth:
             )
             response.raise_for_status()
             return response.json()
+
+    async def get_app_token(self) -> str:
+        """Client-credentials token for non-user data, reused until shortly before it expires"""
+        if not self.client_id or not self.client_secret:
+            raise ValueError("Spotify client credentials are not configured")
+        async with self._app_token_lock:
+            if self._app_token and time.monotonic() < self._app_token_expires_at:
+                return self._app_token
+            async with httpx.AsyncClient() as client:
+                response = await client.post(
+                    self.token_url,
+                    data={'grant_type': 'client_credentials'},
+                    auth=(self.client_id, self.client_secret),
+                    headers={'Content-Type': 'application/x-www-form-urlencoded'}
+                )
+                response.raise_for_status()
+                tokens = response.json()
+            self._app_token = tokens['access_token']
+            self._app_token_expires_at = time.monotonic() + tokens.get('expires_in', 3600) - 60
+            return self._app_token
@@ -1,110 +1,338 @@
+import asyncio
 import httpx
+import hashlib
 from typing import List, Dict, Optional
 import logging
+from services.cache import Namespace, TieredCache
+from services import deadlines
+from services.circuit_breaker import CircuitBreaker, CircuitOpen, is_connection_failure, mark_degraded
+from services.deadlines import DeadlineExceeded
+from services.mood_index import MoodIndex
+from services.rate_limiter import DistributedTokenBucket
+from services.search_cache import normalize_query
+from services.tracing import CLIENT, span
 
 logger = logging.getLogger(__name__)
 
+# (token, path, params) -> {etag, body} for If-None-Match revalidation. Keyed
+# per token because an entry may be served without asking Spotify when it is
+# down; it holds per-user bodies, so it never leaves the worker
+ETAGS = Namespace('spotify.etag', ttl=86400, local_only=True)
+# Keyed by token and snapshot_id, so entries never go stale and a private playlist
+# is only served to a token Spotify gave it to. A token's 404s are remembered
+# briefly; 401/403 raise and are never cached.
+PLAYLIST_TRACKS = Namespace('spotify.playlist_tracks', ttl=86400, negative_ttl=300)
+# Features never change for a track; tracks without features are common
+AUDIO_FEATURES = Namespace('spotify.audio_features', ttl=30 * 86400, negative_ttl=86400)
+FEATURED_PLAYLISTS = Namespace('spotify.featured_playlists', ttl=600, stale_ttl=3600)
+FEATURED_LIMIT = 50
+SAVED_TRACKS_PAGE = 50
+AUDIO_FEATURES_BATCH = 100
+TOP_TRACKS_LIMIT = 50
+TOP_TRACK_RANGES = ('short_term', 'medium_term', 'long_term')
+# Keyed on the normalized query alone; a stale page is served while it is refetched
+SEARCH_RESULTS = Namespace('spotify.search', ttl=60, stale_ttl=600)
+# Spotify's largest search page; every cached page has this many, smaller limits slice it
+SEARCH_LIMIT = 50
+UPSTREAM = 'spotify'
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Whether an error means Spotify is unavailable, rather than that the request was refused"""
+    if isinstance(error, CircuitOpen) or is_connection_failure(error):
+        return True
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code >= 500
+
+
+def _degrade_on(error: BaseException) -> None:
+    """Flag the response when a method falls back to an empty result because Spotify is down"""
+    if is_upstream_failure(error):
+        mark_degraded(UPSTREAM)
+    elif isinstance(error, DeadlineExceeded):
+        mark_degraded('deadline')
+
+
 class SpotifyService:
     """Service for interacting with Spotify API"""
 
     BASE_URL = 'https://api.spotify.com/v1'
 
-    def __init__(self, access_token: str):
+    def __init__(
+        self,
+        access_token: str,
+        cache: TieredCache,
+        limiter: Optional[DistributedTokenBucket] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        track_index: Optional[MoodIndex] = None
+    ):
         self.access_token = access_token
+        self.cache = cache
+        self.limiter = limiter
+        self.breaker = breaker
+        self.track_index = track_index
         self.headers = {
             'Authorization': f'Bearer {access_token}',
             'Content-Type': 'application/json'
         }
+        self._user_scope = hashlib.sha256(access_token.encode()).hexdigest()[:16]
+
+    async def _get(self, client: httpx.AsyncClient, path: str, params: Optional[Dict] = None) -> Dict:
+        """GET a Spotify resource, revalidating a cached copy with If-None-Match.
+
+        If Spotify is unavailable, the cached copy is returned as it is and
+        the response is flagged as degraded. Running out of the request's
+        deadline is not a reason to skip Spotify and raises DeadlineExceeded.
+        """
+        # Per token: a fallback body is served without Spotify authorizing it,
+        # so it must be one this token was already given
+        key = f"{self._user_scope}:{path}?{'&'.join(f'{name}={value}' for name, value in sorted((params or {}).items()))}"
+        cached = await self.cache.get(ETAGS, key)
+        headers = dict(self.headers)
+        if cached:
+            headers['If-None-Match'] = cached['etag']
+
+        try:
+            response = await self._request(client, path, headers, params)
+            if response.status_code == 304 and cached:
+                return cached['body']
+            response.raise_for_status()
+        except Exception as e:
+            if cached is None or not is_upstream_failure(e):
+                raise
+            _degrade_on(e)
+            logger.warning(f"Serving cached {path}, Spotify did not answer: {e}")
+            return cached['body']
+        data = response.json()
+        etag = response.headers.get('ETag')
+        if etag:
+            await self.cache.set(ETAGS, key, {'etag': etag, 'body': data})
+        return data
+
+    async def _request(self, client: httpx.AsyncClient, path: str, headers: Dict, params: Optional[Dict]) -> httpx.Response:
+        """Send a GET within the app-wide Spotify rate limit and through the circuit breaker"""
+        with span('spotify GET', CLIENT, {'http.request.method': 'GET', 'url.path': path}) as call:
+            if self.breaker is not None:
+                # Fail before taking a rate-limit token for a call that will not be made
+                self.breaker.raise_if_open()
+            if self.limiter is not None:
+                # Waiting for a token past the request's deadline would only spend quota on an abandoned request
+                await self.limiter.acquire(deadlines.budget(self.limiter.max_wait))
+            send = lambda: client.get(f'{self.BASE_URL}{path}', headers=headers, params=params)
+            if self.breaker is not None:
+                response = await self.breaker.call(send, failed=lambda response: response.status_code >= 500)
+            else:
+                response = await deadlines.within_deadline(send())
+            call.set('http.response.status_code', response.status_code)
+        if response.status_code == 429 and self.limiter is not None:
+            # Spotify's quota is per app, so back off every worker, not just this request
+            await self.limiter.penalize(float(response.headers.get('Retry-After', '1')))
+        return response
 
-    async def get_featured_playlists(self, limit: int = 20) -> List[Dict]:
+    async def _get_or_none(self, client: httpx.AsyncClient, path: str, params: Optional[Dict] = None) -> Optional[Dict]:
+        """Like ``_get`` but returns None for a 404 so it can be negatively cached"""
+        try:
+            return await self._get(client, path, params)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return None
+            raise
+
+    async def _fetch_featured_playlists(self, country: Optional[str]) -> List[Dict]:
+        params = {'limit': FEATURED_LIMIT}
+        if country:
+            params['country'] = country
+        async with httpx.AsyncClient() as client:
+            data = await self._get(client, '/browse/featured-playlists', params)
+            return data.get('playlists', {}).get('items', [])
+
+    async def get_featured_playlists(self, limit: int = 20, country: Optional[str] = None) -> List[Dict]:
         """Get featured playlists from Spotify"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f'{self.BASE_URL}/browse/featured-playlists',
-                    headers=self.headers,
-                    params={'limit': limit}
-                )
-                response.raise_for_status()
-                data = response.json()
-                return data.get('playlists', {}).get('items', [])
+            # One cache entry per market holds the longest list; smaller limits slice it
+            playlists = await self.cache.get_or_load(
+                FEATURED_PLAYLISTS, country or 'default', lambda: self._fetch_featured_playlists(country)
+            )
+            return playlists[:limit]
         except Exception as e:
             logger.error(f"Error fetching featured playlists: {e}")
+            _degrade_on(e)
             return []
 
+    async def refresh_featured_playlists(self, country: Optional[str] = None) -> List[Dict]:
+        """Fetch featured playlists upstream and overwrite the cached copy"""
+        playlists = await self._fetch_featured_playlists(country)
+        await self.cache.set(FEATURED_PLAYLISTS, country or 'default', playlists)
+        return playlists
+
     async def get_user_playlists(self, limit: int = 50) -> List[Dict]:
         """Get current user's playlists"""
         try:
             async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f'{self.BASE_URL}/me/playlists',
-                    headers=self.headers,
-                    params={'limit': limit}
-                )
-                response.raise_for_status()
-                return response.json().get('items', [])
+                data = await self._get(client, '/me/playlists', {'limit': limit})
+                return data.get('items', [])
         except Exception as e:
             logger.error(f"Error fetching user playlists: {e}")
+            _degrade_on(e)
             return []
 
-    async def get_playlist_tracks(self, playlist_id: str, limit: int = 50) -> List[Dict]:
-        """Get tracks from a playlist"""
+    async def get_saved_tracks(self, limit: int = 50) -> List[Dict]:
+        """Get up to ``limit`` of the user's saved tracks, newest first"""
+        async def page(client: httpx.AsyncClient, offset: int) -> Dict:
+            return await self._get(client, '/me/tracks', {'limit': SAVED_TRACKS_PAGE, 'offset': offset})
+
         try:
             async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f'{self.BASE_URL}/playlists/{playlist_id}/tracks',
-                    headers=self.headers,
-                    params={'limit': limit}
+                # The first page reports the total; the remaining pages are fetched concurrently
+                first = await page(client, 0)
+                total = min(limit, first.get('total', 0))
+                rest = await asyncio.gather(*(
+                    page(client, offset) for offset in range(SAVED_TRACKS_PAGE, total, SAVED_TRACKS_PAGE)
+                ))
+            items = [item for data in [first, *rest] for item in data.get('items', [])]
+            return [item['track'] for item in items if item.get('track')][:limit]
+        except Exception as e:
+            logger.error(f"Error fetching saved tracks: {e}")
+            _degrade_on(e)
+            return []
+
+    async def get_saved_track_items(self, since: Optional[str] = None, concurrency: int = 4) -> List[Dict]:
+        """Saved-track items (``added_at`` and ``track``), newest first, back to ``since``.
+
+        Items added at or after ``since`` are returned, so an ``added_at``
+        already seen is a safe cursor. Pages are fetched ``concurrency`` at a
+        time and paging stops at the first window reaching the cursor. Errors
+        are raised: a sync must not mistake a failure for an empty library.
+        """
+        async def page(client: httpx.AsyncClient, offset: int) -> Dict:
+            return await self._get(client, '/me/tracks', {'limit': SAVED_TRACKS_PAGE, 'offset': offset})
+
+        def reached_cursor(items: List[Dict]) -> bool:
+            return since is not None and bool(items) and items[-1].get('added_at', '') < since
+
+        async with httpx.AsyncClient() as client:
+            # An incremental sync usually ends with this first page
+            first = await page(client, 0)
+            total = first.get('total', 0)
+            items = first.get('items', [])
+            offset = SAVED_TRACKS_PAGE
+            while offset < total and not reached_cursor(items):
+                offsets = range(offset, min(total, offset + SAVED_TRACKS_PAGE * concurrency), SAVED_TRACKS_PAGE)
+                for data in await asyncio.gather(*(page(client, start) for start in offsets)):
+                    items.extend(data.get('items', []))
+                offset += SAVED_TRACKS_PAGE * concurrency
+        return [
+            item for item in items
+            if item.get('track') and item['track'].get('id') and (since is None or item.get('added_at', '') >= since)
+        ]
+
+    async def get_top_tracks(self, time_range: str = 'medium_term', limit: int = TOP_TRACKS_LIMIT) -> List[Dict]:
+        """The user's top tracks for ``short_term``, ``medium_term`` or ``long_term``; errors are raised"""
+        async with httpx.AsyncClient() as client:
+            data = await self._get(client, '/me/top/tracks', {'time_range': time_range, 'limit': limit})
+        return [track for track in data.get('items', []) if track and track.get('id')]
+
+    async def get_playlist_tracks(
+        self,
+        playlist_id: str,
+        limit: int = 50,
+        snapshot_id: Optional[str] = None,
+        fields: Optional[str] = None
+    ) -> List[Dict]:
+        """Get tracks from a playlist, skipping the fetch if its snapshot is unchanged.
+
+        ``fields`` uses the Spotify field syntax for a single track (for
+        example ``id,name,artists(name)``) and is applied upstream.
+        """
+        async def load() -> Optional[List[Dict]]:
+            async with httpx.AsyncClient() as client:
+                params = {'limit': limit}
+                if fields:
+                    params['fields'] = f'items(track({fields}))'
+                data = await self._get_or_none(client, f'/playlists/{playlist_id}/tracks', params)
+                if data is None:
+                    return None
+                return [item['track'] for item in data.get('items', []) if item.get('track')]
+
+        try:
+            if snapshot_id:
+                tracks = await self.cache.get_or_load(
+                    PLAYLIST_TRACKS, f'{self._user_scope}:{playlist_id}:{snapshot_id}:{limit}:{fields or ""}', load
                 )
-                response.raise_for_status()
-                items = response.json().get('items', [])
-                return [item['track'] for item in items if item.get('track')]
+            else:
+                tracks = await load()
+            return tracks or []
         except Exception as e:
             logger.error(f"Error fetching playlist tracks: {e}")
+            _degrade_on(e)
             return []
 
+    async def get_playlist_snapshot(self, playlist_id: str) -> Optional[str]:
+        """The playlist's current ``snapshot_id``, or None if Spotify does not know it.
+
+        A cheap way to check that this token may read the playlist. Errors
+        are raised: a 401/403 means it may not.
+        """
+        async with httpx.AsyncClient() as client:
+            data = await self._get_or_none(client, f'/playlists/{playlist_id}', {'fields': 'snapshot_id'})
+        return data.get('snapshot_id') if data else None
+
     async def get_audio_features(self, track_ids: List[str]) -> List[Dict]:
         """Get audio features for multiple tracks"""
-        try:
-            # Spotify API accepts max 100 track IDs at once
-            track_ids = track_ids[:100]
+        async def load(missing: List[str]) -> Dict[str, Dict]:
             async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f'{self.BASE_URL}/audio-features',
-                    headers=self.headers,
-                    params={'ids': ','.join(track_ids)}
-                )
-                response.raise_for_status()
-                return response.json().get('audio_features', [])
+                # Spotify API accepts max 100 track IDs at once; fetch the batches concurrently
+                pages = await asyncio.gather(*(
+                    self._get(client, '/audio-features', {'ids': ','.join(missing[start:start + AUDIO_FEATURES_BATCH])})
+                    for start in range(0, len(missing), AUDIO_FEATURES_BATCH)
+                ))
+                return {
+                    features['id']: features
+                    for data in pages
+                    for features in data.get('audio_features', [])
+                    if features and features.get('id')
+                }
+
+        try:
+            features = await self.cache.get_many_or_load(AUDIO_FEATURES, track_ids, load)
+            if self.track_index is not None:
+                # Includes hits loaded by other workers, which this worker's index has not seen
+                self.track_index.add_features(features.values())
+            return [features.get(track_id) for track_id in track_ids]
         except Exception as e:
             logger.error(f"Error fetching audio features: {e}")
+            _degrade_on(e)
             return []
 
     async def get_user_profile(self) -> Optional[Dict]:
         """Get current user's profile"""
         try:
             async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f'{self.BASE_URL}/me',
-                    headers=self.headers
-                )
-                response.raise_for_status()
-                return response.json()
+                return await self._get(client, '/me')
         except Exception as e:
             logger.error(f"Error fetching user profile: {e}")
+            _degrade_on(e)
             return None
 
     async def search_tracks(self, query: str, limit: int = 20) -> List[Dict]:
         """Search for tracks"""
-        try:
+        async def fetch() -> List[Dict]:
             async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f'{self.BASE_URL}/search',
-                    headers=self.headers,
-                    params={'q': query, 'type': 'track', 'limit': limit}
+                response = await self._request(
+                    client, '/search', self.headers, {'q': query, 'type': 'track', 'limit': SEARCH_LIMIT}
                 )
                 response.raise_for_status()
                 return response.json().get('tracks', {}).get('items', [])
+
+        key = normalize_query(query)
+        try:
+            # Not get_or_load on a miss: callers cancel superseded searches, and
+            # a shared load would keep the upstream request running
+            tracks = await self.cache.get(SEARCH_RESULTS, key, refresh=fetch)
+            if tracks is None:
+                tracks = await fetch()
+                await self.cache.set(SEARCH_RESULTS, key, tracks)
+            return tracks[:limit]
         except Exception as e:
             logger.error(f"Error searching tracks: {e}")
+            _degrade_on(e)
             return []
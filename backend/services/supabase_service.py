@@ -1,31 +1,126 @@
-import os
-from supabase import create_client, Client
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, Any, Callable, List, Dict, Optional, Union
+import asyncio
+import math
+from urllib.parse import urlparse
 import logging
-from pathlib import Path
-from dotenv import load_dotenv
+from services.cache import Namespace, TieredCache
+from services.circuit_breaker import CircuitBreaker, CircuitOpen, is_connection_failure, mark_degraded
+from services.deadlines import DeadlineExceeded, within_deadline
+from services.search_cache import normalize_query
+from services.tracing import CLIENT, span
 
-ROOT_DIR = Path(__file__).parent.parent
-load_dotenv(ROOT_DIR / '.env')
+if TYPE_CHECKING:
+    from supabase import Client
 
 logger = logging.getLogger(__name__)
 
+# Song listings change only on upload or edit, which clear these namespaces
+SONG_LISTS = Namespace('songs.list', ttl=30, stale_ttl=300)
+SONG_SEARCH = Namespace('songs.search', ttl=30, stale_ttl=300)
+FEATURED_SONG_PLAYLISTS = Namespace('songs.featured_playlists', ttl=300, stale_ttl=3600)
+SONGS_BY_ID = Namespace('songs.by_id', ttl=300, negative_ttl=60)
+UPSTREAM = 'supabase'
+
+# SQLSTATE classes meaning the database itself is in trouble: connection
+# exceptions, insufficient resources, operator intervention (e.g. statement timeout)
+SERVER_SQLSTATE_CLASSES = ('08', '53', '57')
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Whether an error means Supabase is unavailable, rather than that the request was bad"""
+    if isinstance(error, CircuitOpen) or is_connection_failure(error):
+        return True
+    # PostgREST errors carry a SQLSTATE or PGRST code, or the HTTP status when the body was not JSON;
+    # storage errors carry the HTTP status
+    code = getattr(error, 'status', None) or getattr(error, 'code', None)
+    if isinstance(code, int) or (isinstance(code, str) and code.isdigit() and len(code) == 3):
+        return int(code) >= 500
+    return isinstance(code, str) and code[:2] in SERVER_SQLSTATE_CLASSES
+
+
+def _degrade_on(error: BaseException) -> None:
+    """Flag the response when a method falls back to an empty result because Supabase is down"""
+    if is_upstream_failure(error):
+        mark_degraded(UPSTREAM)
+    elif isinstance(error, DeadlineExceeded):
+        mark_degraded('deadline')
+
+
 class SupabaseService:
-    def __init__(self):
-        url = os.environ.get("SUPABASE_URL")
-        key = os.environ.get("SUPABASE_KEY")
-        self.supabase: Client = create_client(url, key)
+    def __init__(
+        self,
+        url: Optional[str],
+        key: Optional[str],
+        cache: TieredCache,
+        breaker: Optional[CircuitBreaker] = None,
+        storage_breaker: Optional[CircuitBreaker] = None
+    ):
+        # supabase pulls in a large client stack; import it only when the service is built
+        from supabase import ClientOptions, create_client
+        # A breaker stops waiting at its timeout but cannot stop the thread making the
+        # call; the client's own timeouts end it at about the same time
+        timeouts = {}
+        if breaker is not None:
+            timeouts['postgrest_client_timeout'] = breaker.timeout
+        if storage_breaker is not None:
+            timeouts['storage_client_timeout'] = math.ceil(storage_breaker.timeout)
+        self.supabase: 'Client' = create_client(url, key, options=ClientOptions(**timeouts))
+        self.cache = cache
+        self.breaker = breaker
+        self.storage_breaker = storage_breaker
         self.storage_bucket = "audio-files"
     
-    async def upload_song_file(self, file_data: bytes, filename: str) -> str:
-        """Upload audio file to Supabase storage"""
+    async def _call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking database call in a thread, through the circuit breaker"""
+        return await self._through(self.breaker, func, *args, **kwargs)
+    
+    async def _transfer(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking storage transfer in a thread, through the storage breaker.
+
+        Transfers take as long as their file needs, so they are kept out of
+        the database breaker's slow-call accounting.
+        """
+        return await self._through(self.storage_breaker, func, *args, **kwargs)
+    
+    async def _through(self, breaker: Optional[CircuitBreaker], func: Callable[..., Any], *args, **kwargs) -> Any:
+        # The supabase client is synchronous; off the event loop a slow call
+        # only holds its own request, and the breaker can cut it off
+        call = lambda: asyncio.to_thread(func, *args, **kwargs)
+        with span('supabase', CLIENT, {'code.function': getattr(func, '__qualname__', repr(func))}):
+            if breaker is None:
+                return await within_deadline(call())
+            return await breaker.call(call)
+    
+    async def _execute(self, query) -> Any:
+        return await self._call(query.execute)
+    
+    async def _cached(self, namespace: Namespace, key: str, load: Callable) -> Any:
+        """``cache.get_or_load``, flagging values served while Supabase's circuit is not closed"""
+        value = await self.cache.get_or_load(namespace, key, load)
+        if self.breaker is not None and not self.breaker.closed:
+            mark_degraded(UPSTREAM)
+        return value
+    
+    async def _songs_changed(self) -> None:
+        await self.cache.clear(SONG_LISTS)
+        await self.cache.clear(SONG_SEARCH)
+        await self.cache.clear(FEATURED_SONG_PLAYLISTS)
+    
+    async def upload_song_file(self, file_data: Union[bytes, str], filename: str, content_type: str = "audio/mpeg") -> str:
+        """Upload audio file to Supabase storage, from bytes or the path of a local file"""
+        def upload() -> None:
+            bucket = self.supabase.storage.from_(self.storage_bucket)
+            # Names are content hashes, so overwriting an existing object changes nothing
+            options = {"content-type": content_type, "upsert": "true"}
+            if isinstance(file_data, bytes):
+                bucket.upload(filename, file_data, file_options=options)
+                return
+            with open(file_data, 'rb') as data:
+                bucket.upload(filename, data, file_options=options)
+
         try:
-            # Upload to storage
-            response = self.supabase.storage.from_(self.storage_bucket).upload(
-                filename,
-                file_data,
-                file_options={"content-type": "audio/mpeg"}
-            )
+            # Upload to storage off the event loop, so concurrent uploads overlap
+            await self._transfer(upload)
             
             # Get public URL
             public_url = self.supabase.storage.from_(self.storage_bucket).get_public_url(filename)
@@ -34,45 +129,156 @@ class SupabaseService:
             logger.error(f"Error uploading file: {e}")
             raise
     
+    async def upload_stream_file(self, path: str, file_data: bytes, content_type: str) -> str:
+        """Upload one file of a streaming rendition, replacing any earlier copy"""
+        try:
+            # Paths are unique per song and their contents never change, so CDNs may cache them for a year
+            await self._transfer(
+                self.supabase.storage.from_(self.storage_bucket).upload,
+                path,
+                file_data,
+                file_options={"content-type": content_type, "cache-control": "31536000", "upsert": "true"}
+            )
+            return self.supabase.storage.from_(self.storage_bucket).get_public_url(path)
+        except Exception as e:
+            logger.error(f"Error uploading stream file: {e}")
+            raise
+    
+    async def download_song_file(self, filename: str) -> bytes:
+        """Download an audio file from Supabase storage"""
+        try:
+            return await self._transfer(self.supabase.storage.from_(self.storage_bucket).download, filename)
+        except Exception as e:
+            logger.error(f"Error downloading file: {e}")
+            raise
+    
+    async def delete_song_file(self, filename: str) -> None:
+        """Delete an audio file from Supabase storage"""
+        try:
+            await self._transfer(self.supabase.storage.from_(self.storage_bucket).remove, [filename])
+        except Exception as e:
+            logger.error(f"Error deleting file: {e}")
+            raise
+    
     async def create_song(self, song_data: Dict) -> Dict:
         """Create a new song entry in database"""
         try:
-            response = self.supabase.table("songs").insert(song_data).execute()
+            response = await self._execute(self.supabase.table("songs").insert(song_data))
+            await self._songs_changed()
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Error creating song: {e}")
             raise
     
+    async def create_songs(self, songs_data: List[Dict]) -> List[Dict]:
+        """Create several song entries with a single insert"""
+        try:
+            response = await self._execute(self.supabase.table("songs").insert(songs_data))
+            await self._songs_changed()
+            return response.data or []
+        except Exception as e:
+            logger.error(f"Error creating songs: {e}")
+            raise
+    
+    async def update_song(self, song_id: str, song_data: Dict) -> Dict:
+        """Update fields of an existing song"""
+        try:
+            response = await self._execute(self.supabase.table("songs").update(song_data).eq("id", song_id))
+            await self.cache.invalidate(SONGS_BY_ID, song_id)
+            await self._songs_changed()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error updating song: {e}")
+            raise
+    
+    async def get_song(self, song_id: str) -> Optional[Dict]:
+        """Get a single song by id"""
+        async def load() -> Optional[Dict]:
+            response = await self._execute(self.supabase.table("songs").select("*").eq("id", song_id).limit(1))
+            return response.data[0] if response.data else None
+
+        try:
+            return await self._cached(SONGS_BY_ID, song_id, load)
+        except Exception as e:
+            logger.error(f"Error fetching song: {e}")
+            _degrade_on(e)
+            return None
+    
+    async def find_song_by_audio_url(self, audio_url: str) -> Optional[Dict]:
+        """Get the earliest song that uses a stored audio file"""
+        try:
+            query = self.supabase.table("songs")\
+                .select("*")\
+                .eq("audio_url", audio_url)\
+                .order("created_at")\
+                .limit(1)
+            response = await self._execute(query)
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error finding song by audio file: {e}")
+            _degrade_on(e)
+            return None
+    
+    @staticmethod
+    def storage_filename(audio_url: str) -> str:
+        """Name of a song's file in the storage bucket, from its public URL"""
+        return urlparse(audio_url).path.rsplit('/', 1)[-1]
+    
     async def get_all_songs(self, limit: int = 100) -> List[Dict]:
         """Get all public songs"""
-        try:
-            response = self.supabase.table("songs")\
+        async def load() -> List[Dict]:
+            query = self.supabase.table("songs")\
                 .select("*")\
                 .eq("is_public", True)\
                 .order("created_at", desc=True)\
-                .limit(limit)\
-                .execute()
+                .limit(limit)
+            response = await self._execute(query)
             return response.data
+
+        try:
+            return await self._cached(SONG_LISTS, str(limit), load)
         except Exception as e:
             logger.error(f"Error fetching songs: {e}")
+            _degrade_on(e)
+            return []
+    
+    async def search_songs(self, query: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """Search public songs by title, artist, album and genre, best match first"""
+        async def load() -> List[Dict]:
+            response = await self._execute(self.supabase.rpc(
+                "search_songs",
+                {"search_query": query, "result_limit": limit, "result_offset": offset}
+            ))
+            return response.data
+
+        try:
+            return await self._cached(SONG_SEARCH, f'{limit}:{offset}:{normalize_query(query)}', load)
+        except Exception as e:
+            logger.error(f"Error searching songs: {e}")
+            _degrade_on(e)
             return []
     
     async def get_featured_playlists(self) -> List[Dict]:
         """Get featured playlists with songs"""
-        try:
-            response = self.supabase.table("playlists")\
+        async def load() -> List[Dict]:
+            query = self.supabase.table("playlists")\
                 .select("*, playlist_songs(*, songs(*))")\
-                .eq("is_featured", True)\
-                .execute()
+                .eq("is_featured", True)
+            response = await self._execute(query)
             return response.data
+
+        try:
+            return await self._cached(FEATURED_SONG_PLAYLISTS, 'all', load)
         except Exception as e:
             logger.error(f"Error fetching playlists: {e}")
+            _degrade_on(e)
             return []
     
     async def create_playlist(self, playlist_data: Dict) -> Dict:
         """Create a new playlist"""
         try:
-            response = self.supabase.table("playlists").insert(playlist_data).execute()
+            response = await self._execute(self.supabase.table("playlists").insert(playlist_data))
+            await self.cache.clear(FEATURED_SONG_PLAYLISTS)
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Error creating playlist: {e}")
@@ -86,7 +292,8 @@ class SupabaseService:
                 "song_id": song_id,
                 "position": position
             }
-            response = self.supabase.table("playlist_songs").insert(data).execute()
+            response = await self._execute(self.supabase.table("playlist_songs").insert(data))
+            await self.cache.clear(FEATURED_SONG_PLAYLISTS)
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Error adding song to playlist: {e}")
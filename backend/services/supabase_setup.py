@@ -32,6 +32,10 @@ CREATE TABLE IF NOT EXISTS songs (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()) NOT NULL
 );
 
+-- Adaptive streaming renditions, filled in by the transcode job
+ALTER TABLE songs ADD COLUMN IF NOT EXISTS hls_url TEXT;
+ALTER TABLE songs ADD COLUMN IF NOT EXISTS renditions JSONB;
+
 -- Create playlists table  
 CREATE TABLE IF NOT EXISTS playlists (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
@@ -55,10 +59,70 @@ CREATE TABLE IF NOT EXISTS playlist_songs (
 
 -- Create indexes
 CREATE INDEX IF NOT EXISTS idx_songs_public ON songs(is_public);
+-- Songs share content-addressed files, so audio_url is not unique; the
+-- audio_files collection in MongoDB decides whether a file is stored
+CREATE INDEX IF NOT EXISTS idx_songs_audio_url ON songs(audio_url);
 CREATE INDEX IF NOT EXISTS idx_playlists_featured ON playlists(is_featured);
 CREATE INDEX IF NOT EXISTS idx_playlist_songs_playlist ON playlist_songs(playlist_id);
 CREATE INDEX IF NOT EXISTS idx_playlist_songs_song ON playlist_songs(song_id);
 
+-- Full-text + fuzzy search over the song catalog
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION songs_search_document(title TEXT, artist TEXT, album TEXT, genre TEXT)
+RETURNS tsvector
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT setweight(to_tsvector('simple'::regconfig, coalesce(title, '')), 'A') ||
+           setweight(to_tsvector('simple'::regconfig, coalesce(artist, '')), 'A') ||
+           setweight(to_tsvector('simple'::regconfig, coalesce(album, '')), 'B') ||
+           setweight(to_tsvector('simple'::regconfig, coalesce(genre, '')), 'C')
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_songs_search_document ON songs
+    USING GIN (songs_search_document(title, artist, album, genre));
+CREATE INDEX IF NOT EXISTS idx_songs_title_trgm ON songs USING GIN (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_songs_artist_trgm ON songs USING GIN (artist gin_trgm_ops);
+
+-- Ranked, paginated search: prefix full-text matches plus trigram typo tolerance
+CREATE OR REPLACE FUNCTION search_songs(
+    search_query TEXT,
+    result_limit INTEGER DEFAULT 20,
+    result_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    id UUID,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    duration_ms INTEGER,
+    audio_url TEXT,
+    cover_image_url TEXT,
+    genre TEXT,
+    uploaded_by TEXT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    rank REAL
+)
+LANGUAGE sql STABLE
+AS $$
+    WITH q AS (
+        SELECT to_tsquery('simple', string_agg(quote_literal(word) || ':*', ' & ')) AS ts
+        FROM regexp_split_to_table(lower(trim(search_query)), '\\s+') AS word
+        WHERE word <> ''
+    )
+    SELECT s.id, s.title, s.artist, s.album, s.duration_ms, s.audio_url,
+           s.cover_image_url, s.genre, s.uploaded_by, s.created_at,
+           (ts_rank_cd(songs_search_document(s.title, s.artist, s.album, s.genre), q.ts)
+            + greatest(similarity(s.title, search_query), similarity(s.artist, search_query)))::REAL AS rank
+    FROM songs s, q
+    WHERE s.is_public
+      AND (songs_search_document(s.title, s.artist, s.album, s.genre) @@ q.ts
+           OR s.title % search_query
+           OR s.artist % search_query)
+    ORDER BY rank DESC, s.created_at DESC
+    LIMIT result_limit OFFSET result_offset
+$$;
+
 -- Enable Row Level Security
 ALTER TABLE songs ENABLE ROW LEVEL SECURITY;
 ALTER TABLE playlists ENABLE ROW LEVEL SECURITY;
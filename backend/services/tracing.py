@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds
+INTERNAL = 1
+SERVER = 2
+CLIENT = 3
+
+SERVICE_NAME = 'cooldify-backend'
+# Spans kept per trace; a request fanning out over hundreds of pages keeps the first ones
+MAX_SPANS = 512
+
+# Trace of the request being handled and its innermost open span; None outside a traced request
+_trace: ContextVar[Optional['Trace']] = ContextVar('trace', default=None)
+_span: ContextVar[Optional['Span']] = ContextVar('span', default=None)
+
+
+class Span:
+    __slots__ = ('name', 'kind', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, name: str, kind: int, parent_id: Optional[str], attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.kind = kind
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = dict(attributes or {})
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class _UntracedSpan(Span):
+    """Stands in for a span outside a traced request, so callers need not check"""
+
+    def __init__(self):
+        pass
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+_UNTRACED = _UntracedSpan()
+
+
+class Trace:
+    """The spans of one request, rooted at a server span for the request itself"""
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = os.urandom(16).hex()
+        self.root = Span(name, SERVER, None, attributes)
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.closed = False
+
+    def add(self, span: Span) -> None:
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """End the root span; spans started afterwards (background tasks) are not recorded"""
+        if not self.closed:
+            self.closed = True
+            self.root.end(error)
+
+    def summary(self) -> Dict:
+        """JSON view with span times relative to the start of the request"""
+        def describe(span: Span) -> Dict:
+            return {
+                'span_id': span.span_id,
+                'parent_id': span.parent_id,
+                'name': span.name,
+                'offset_ms': round((span.start_ns - self.root.start_ns) / 1e6, 1),
+                'duration_ms': round(span.duration_ms, 1),
+                'attributes': span.attributes,
+                'error': span.error
+            }
+
+        return {
+            'trace_id': self.trace_id,
+            'name': self.root.name,
+            'started_at': datetime.fromtimestamp(self.root.start_ns / 1e9, timezone.utc).isoformat(),
+            'duration_ms': round(self.root.duration_ms, 1),
+            'error': self.root.error,
+            'attributes': self.root.attributes,
+            'spans': [describe(span) for span in sorted(self.spans, key=lambda span: span.start_ns)],
+            'dropped_spans': self.dropped
+        }
+
+
+def begin_trace(name: str, attributes: Optional[Dict[str, Any]] = None) -> Trace:
+    """Start tracing the current request"""
+    trace = Trace(name, attributes)
+    _trace.set(trace)
+    _span.set(trace.root)
+    return trace
+
+
+@contextmanager
+def span(name: str, kind: int = INTERNAL, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Span]:
+    """Time the enclosed block as a child of the current span.
+
+    Outside a traced request this does nothing. Tasks started inside the
+    block inherit it as their parent.
+    """
+    trace = _trace.get()
+    if trace is None or trace.closed:
+        yield _UNTRACED
+        return
+    parent = _span.get()
+    current = Span(name, kind, parent.span_id if parent is not None else trace.root.span_id, attributes)
+    token = _span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    else:
+        current.end()
+    finally:
+        _span.reset(token)
+        trace.add(current)
+
+
+def _otlp_value(value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_span(trace: Trace, span: Span) -> Dict:
+    encoded = {
+        'traceId': trace.trace_id,
+        'spanId': span.span_id,
+        'name': span.name,
+        'kind': span.kind,
+        'startTimeUnixNano': str(span.start_ns),
+        'endTimeUnixNano': str(span.end_ns or span.start_ns),
+        'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in span.attributes.items()]
+    }
+    if span.parent_id:
+        encoded['parentSpanId'] = span.parent_id
+    if span.error:
+        encoded['status'] = {'code': 2, 'message': span.error}
+    return encoded
+
+
+def to_otlp(traces: List[Trace]) -> Dict:
+    """OTLP/JSON ``ExportTraceServiceRequest`` body for ``traces``"""
+    spans = [_otlp_span(trace, span) for trace in traces for span in [trace.root, *trace.spans]]
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}},
+                {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}}
+            ]},
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}]
+        }]
+    }
+
+
+class OTLPExporter:
+    """Sends traces to an OpenTelemetry collector over OTLP/HTTP (JSON).
+
+    Traces are batched and posted every ``interval`` seconds. A collector
+    that is down loses the batch rather than backing traces up in memory;
+    at most ``max_queue`` traces wait between flushes.
+    """
+
+    def __init__(self, endpoint: str, interval: float = 5.0, max_queue: int = 1000, batch_size: int = 100):
+        self.endpoint = endpoint
+        self.interval = interval
+        self.batch_size = batch_size
+        self._queue: Deque[Trace] = deque(maxlen=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self.exported = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def enqueue(self, trace: Trace) -> None:
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(trace)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        if not self._queue:
+            return
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                try:
+                    response = await client.post(self.endpoint, json=to_otlp(batch))
+                    response.raise_for_status()
+                    self.exported += len(batch)
+                except Exception as e:
+                    self.failed += len(batch)
+                    logger.warning(f"Could not export {len(batch)} traces to {self.endpoint}: {e}")
+                    return
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def metrics(self) -> Dict:
+        return {
+            'endpoint': self.endpoint,
+            'queued': len(self._queue),
+            'exported': self.exported,
+            'failed': self.failed,
+            'dropped': self.dropped
+        }
+
+
+class SlowTraces:
+    """Keeps the traces of requests slower than ``threshold_ms``.
+
+    The last ``keep`` are held in memory for the admin API and each is
+    passed to ``exporter`` when one is configured. A threshold of 0 turns
+    tracing off.
+    """
+
+    def __init__(self, threshold_ms: float, keep: int = 100, exporter: Optional[OTLPExporter] = None):
+        self.threshold_ms = threshold_ms
+        self.exporter = exporter
+        self._recent: Deque[Trace] = deque(maxlen=keep)
+        self.traced = 0
+        self.recorded = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def offer(self, trace: Trace) -> None:
+        self.traced += 1
+        if trace.root.duration_ms < self.threshold_ms:
+            return
+        self.recorded += 1
+        self._recent.append(trace)
+        if self.exporter is not None:
+            self.exporter.enqueue(trace)
+
+    def recent(self, limit: int = 20) -> List[Dict]:
+        """Summaries of the latest slow traces, newest first"""
+        return [trace.summary() for trace in list(self._recent)[::-1][:limit]]
+
+    async def start(self) -> None:
+        if self.exporter is not None:
+            await self.exporter.start()
+
+    async def stop(self) -> None:
+        if self.exporter is not None:
+            await self.exporter.stop()
+
+    def metrics(self) -> Dict:
+        return {
+            'threshold_ms': self.threshold_ms,
+            'traced': self.traced,
+            'recorded': self.recorded,
+            'export': self.exporter.metrics() if self.exporter is not None else None
+        }
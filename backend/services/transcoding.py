@@ -0,0 +1,82 @@
+import logging
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+MASTER_PLAYLIST = 'master.m3u8'
+SEGMENT_SECONDS = 6
+TRANSCODE_TIMEOUT = 600
+
+HLS_CONTENT_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t'
+}
+
+
+def find_ffmpeg(ffmpeg: str = 'ffmpeg') -> Optional[str]:
+    """Resolve the ffmpeg binary, or None when it is not installed"""
+    return shutil.which(ffmpeg)
+
+
+def rendition_name(bitrate_kbps: int) -> str:
+    return f'{bitrate_kbps}k'
+
+
+def transcode_to_hls(file_data: bytes, bitrates: Sequence[int], ffmpeg: str = 'ffmpeg') -> Dict[str, bytes]:
+    """Transcode audio to AAC at each bitrate and package it as HLS.
+
+    The source is decoded once and encoded to every rendition in a single
+    ffmpeg run. Returns the files keyed by path relative to the master
+    playlist: ``master.m3u8`` plus ``<bitrate>k/index.m3u8`` and its
+    segments. Runs ffmpeg to completion, so call it on the worker pool.
+    """
+    with tempfile.TemporaryDirectory(prefix='cooldify-hls-') as work_dir:
+        work = Path(work_dir)
+        source = work / 'source'
+        source.write_bytes(file_data)
+        out = work / 'hls'
+
+        command = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y', '-i', str(source), '-vn']
+        for _ in bitrates:
+            command += ['-map', '0:a:0']
+        command += ['-c:a', 'aac', '-ac', '2']
+        for index, bitrate in enumerate(bitrates):
+            command += [f'-b:a:{index}', f'{bitrate}k']
+        command += [
+            '-f', 'hls',
+            '-hls_time', str(SEGMENT_SECONDS),
+            '-hls_playlist_type', 'vod',
+            '-hls_segment_filename', str(out / '%v' / 'segment_%03d.ts'),
+            '-master_pl_name', MASTER_PLAYLIST,
+            '-var_stream_map', ' '.join(
+                f'a:{index},name:{rendition_name(bitrate)}' for index, bitrate in enumerate(bitrates)
+            ),
+            str(out / '%v' / 'index.m3u8')
+        ]
+
+        result = subprocess.run(command, capture_output=True, timeout=TRANSCODE_TIMEOUT)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with {result.returncode}: {result.stderr.decode(errors='replace')[-500:]}")
+
+        return {
+            path.relative_to(out).as_posix(): path.read_bytes()
+            for path in sorted(out.rglob('*')) if path.is_file()
+        }
+
+
+def upload_order(files: Dict[str, bytes]) -> List[str]:
+    """Segments first, then variant playlists, then the master playlist.
+
+    A playlist is only published once everything it references exists, so a
+    player can never fetch a manifest that points at a missing file.
+    """
+    def rank(name: str) -> int:
+        if name == MASTER_PLAYLIST:
+            return 2
+        return 1 if name.endswith('.m3u8') else 0
+
+    return sorted(files, key=lambda name: (rank(name), name))
@@ -0,0 +1,70 @@
+import subprocess
+import tempfile
+from typing import Dict, Sequence
+
+import numpy as np
+
+# Peak counts per waveform, finest first; each divides the one before it so
+# coarser levels are reduced from finer ones instead of from the samples
+WAVEFORM_RESOLUTIONS = (2048, 512, 128)
+DECODE_SAMPLE_RATE = 22050
+DECODE_TIMEOUT = 120
+
+
+def decode_mono_pcm(file_data: bytes, ffmpeg: str = 'ffmpeg', sample_rate: int = DECODE_SAMPLE_RATE) -> np.ndarray:
+    """Decode any audio format to mono 16-bit PCM samples with ffmpeg"""
+    with tempfile.NamedTemporaryFile(prefix='cooldify-wave-') as source:
+        # A real file rather than stdin: MP4/M4A needs a seekable input
+        source.write(file_data)
+        source.flush()
+        result = subprocess.run(
+            [ffmpeg, '-hide_banner', '-loglevel', 'error', '-nostdin', '-i', source.name,
+             '-vn', '-ac', '1', '-ar', str(sample_rate), '-f', 's16le', 'pipe:1'],
+            capture_output=True, timeout=DECODE_TIMEOUT
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with {result.returncode}: {result.stderr.decode(errors='replace')[-500:]}")
+    return np.frombuffer(result.stdout, dtype='<i2')
+
+
+def compute_peaks(samples: np.ndarray, resolutions: Sequence[int] = WAVEFORM_RESOLUTIONS) -> Dict[int, np.ndarray]:
+    """Min/max peaks per bin at each resolution, as (bins, 2) int16 arrays"""
+    finest = resolutions[0]
+    if len(samples) == 0:
+        peaks = np.zeros((finest, 2), dtype=np.int16)
+    else:
+        # Bin boundaries spread the remainder evenly; reduceat takes each bin's min/max in one pass
+        starts = (np.arange(finest, dtype=np.int64) * len(samples)) // finest
+        peaks = np.stack([np.minimum.reduceat(samples, starts), np.maximum.reduceat(samples, starts)], axis=1)
+        peaks = peaks.astype(np.int16, copy=False)
+
+    levels = {finest: peaks}
+    for bins in resolutions[1:]:
+        grouped = peaks.reshape(bins, -1, 2)
+        levels[bins] = np.stack([grouped[:, :, 0].min(axis=1), grouped[:, :, 1].max(axis=1)], axis=1)
+    return levels
+
+
+def waveform_from_audio(file_data: bytes, ffmpeg: str = 'ffmpeg') -> Dict:
+    """Decode once and compute every waveform level; run on the worker pool.
+
+    Levels are returned as little-endian int16 bytes, interleaved min/max.
+    """
+    samples = decode_mono_pcm(file_data, ffmpeg)
+    return {
+        'duration_ms': int(len(samples) * 1000 / DECODE_SAMPLE_RATE),
+        'levels': {str(bins): peaks.astype('<i2').tobytes() for bins, peaks in compute_peaks(samples).items()}
+    }
+
+
+def to_int8(peaks: bytes) -> bytes:
+    """Scale stored int16 peaks to int8, halving the payload.
+
+    Scaled against the song's loudest peak rather than full scale, so quiet
+    recordings still use the whole int8 range.
+    """
+    values = np.frombuffer(peaks, dtype='<i2').astype(np.int32)
+    loudest = int(np.abs(values).max()) if len(values) else 0
+    if loudest == 0:
+        return bytes(len(values))
+    return np.round(values * (127 / loudest)).astype(np.int8).tobytes()
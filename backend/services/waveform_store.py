@@ -0,0 +1,55 @@
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WaveformStore:
+    """Precomputed waveform peaks per song, stored as binary in MongoDB"""
+
+    def __init__(self, db):
+        self.collection = db.waveforms
+
+    async def get(self, song_id: str, bins: int) -> Optional[Dict]:
+        """Return one resolution's peaks with the song's duration and compute time"""
+        try:
+            doc = await self.collection.find_one(
+                {'_id': song_id}, {'duration_ms': 1, 'created_at': 1, f'levels.{bins}': 1}
+            )
+        except Exception as e:
+            logger.error(f"Error reading waveform: {e}")
+            return None
+        if not doc or str(bins) not in doc.get('levels', {}):
+            return None
+        return {
+            'peaks': bytes(doc['levels'][str(bins)]),
+            'duration_ms': doc['duration_ms'],
+            'created_at': doc['created_at'].replace(tzinfo=timezone.utc)
+        }
+
+    async def save(self, song_id: str, waveform: Dict) -> None:
+        """Persist every resolution computed for a song"""
+        await self.collection.replace_one(
+            {'_id': song_id},
+            {
+                'duration_ms': waveform['duration_ms'],
+                'levels': waveform['levels'],
+                # Second precision so it round-trips through Last-Modified
+                'created_at': datetime.now(timezone.utc).replace(microsecond=0)
+            },
+            upsert=True
+        )
+
+    async def copy(self, from_song_id: str, to_song_id: str) -> bool:
+        """Give a song the waveform of another song with the same audio; False if there is none"""
+        try:
+            doc = await self.collection.find_one({'_id': from_song_id})
+            if not doc:
+                return False
+            doc['_id'] = to_song_id
+            await self.collection.replace_one({'_id': to_song_id}, doc, upsert=True)
+            return True
+        except Exception as e:
+            logger.error(f"Error copying waveform: {e}")
+            return False
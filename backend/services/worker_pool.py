@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPoolOverloaded(Exception):
+    """Raised when the worker pool queue is full; callers should answer 503"""
+
+
+class WorkerPool:
+    """Process pool for CPU-heavy work, kept off the event loop.
+
+    Admission is bounded: at most ``max_workers`` tasks run and ``max_queue``
+    wait, and anything beyond that is rejected immediately with
+    ``WorkerPoolOverloaded`` instead of queueing without limit.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: int = 64):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_task_seconds = 0.0
+        self.max_task_seconds = 0.0
+
+    def start(self) -> None:
+        """Create the worker processes; call once on app startup"""
+        if self._executor is None:
+            self._executor = self._new_executor()
+            logger.info(f"Worker pool started with {self.max_workers} processes")
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn avoids forking a process that holds the event loop and DB client threads
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+
+    async def shutdown(self) -> None:
+        """Wait for running tasks and stop the worker processes"""
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+    async def submit(self, fn: Callable, *args: Any) -> Any:
+        """Run a picklable function in a worker process and await its result"""
+        if self._executor is None:
+            raise RuntimeError("Worker pool is not started")
+        if self._in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise WorkerPoolOverloaded(f"{self._in_flight} tasks in flight")
+
+        self._in_flight += 1
+        self.submitted += 1
+        started = time.perf_counter()
+        executor = self._executor
+        try:
+            with span(f"worker_pool {getattr(fn, '__qualname__', fn)}", attributes={'worker_pool.in_flight': self._in_flight}):
+                result = await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+            self.completed += 1
+            return result
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); replace the pool so later tasks still run
+            self.failed += 1
+            if self._executor is executor:
+                logger.error("Worker process died; restarting worker pool")
+                self._executor = self._new_executor()
+                executor.shutdown(wait=False)
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            elapsed = time.perf_counter() - started
+            self.total_task_seconds += elapsed
+            self.max_task_seconds = max(self.max_task_seconds, elapsed)
+
+    def metrics(self) -> Dict:
+        """Queue depth, throughput and task-time counters"""
+        finished = self.completed + self.failed
+        return {
+            'workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'in_flight': self._in_flight,
+            'queue_depth': max(0, self._in_flight - self.max_workers),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'avg_task_seconds': round(self.total_task_seconds / finished, 4) if finished else 0,
+            'max_task_seconds': round(self.max_task_seconds, 4)
+        }
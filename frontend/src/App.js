@@ -57,7 +57,10 @@ const Home = () => {
             images: [{ url: song.cover_image_url || 'https://images.unsplash.com/photo-1619983081563-430f63602796?w=300&h=300&fit=crop' }]
           },
           duration_ms: song.duration_ms || 0,
-          preview_url: song.audio_url // This is the full audio file, not just preview
+          // Full audio file, streamed through the backend for range requests and caching
+          preview_url: `${BACKEND_URL}/api/songs/${song.id}/stream`,
+          // Adaptive bitrate stream, once the song has been transcoded
+          hls_url: song.hls_url
         }));
         setUploadedSongs(transformedSongs);
       }
@@ -112,7 +115,7 @@ const Home = () => {
     setLoading(true);
     try {
       // Load tracks for selected playlist
-      const playlistTracks = await spotifyApi.getPlaylistTracks(playlist.id);
+      const playlistTracks = await spotifyApi.getPlaylistTracks(playlist.id, 50, playlist.snapshot_id);
       console.log('Playlist tracks loaded:', playlistTracks?.length);
       console.log('First track sample:', playlistTracks?.[0]);
       
@@ -125,7 +128,7 @@ const Home = () => {
         
         // Load mood data for playlist
         try {
-          const mood = await spotifyApi.getPlaylistMood(playlist.id);
+          const mood = await spotifyApi.getPlaylistMood(playlist.id, playlist.snapshot_id);
           if (mood) {
             setMoodData(mood);
           }
@@ -25,7 +25,9 @@ const Player = ({ currentTrack }) => {
   useEffect(() => {
     if (audioRef.current && currentTrack) {
       if (currentTrack.preview_url) {
-        audioRef.current.src = currentTrack.preview_url;
+        // Use the adaptive stream where the browser plays HLS natively (Safari, iOS)
+        const playHls = currentTrack.hls_url && audioRef.current.canPlayType('application/vnd.apple.mpegurl');
+        audioRef.current.src = playHls ? currentTrack.hls_url : currentTrack.preview_url;
         setDuration(currentTrack.duration_ms / 1000);
       } else {
         // No preview URL available
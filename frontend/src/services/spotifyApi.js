@@ -107,33 +107,34 @@ class SpotifyAPI {
     }
   }
 
-  async getPlaylistTracks(playlistId, limit = 50) {
+  async getPlaylistTracks(playlistId, limit = 50, snapshotId = null) {
     try {
       const response = await axios.get(`${API_BASE}/playlists/${playlistId}/tracks`, {
         headers: this.getAuthHeaders(),
-        params: { limit }
+        params: { limit, ...(snapshotId && { snapshot_id: snapshotId }) }
       });
       return response.data.tracks;
     } catch (error) {
       if (error.response?.status === 401) {
         await this.refreshAccessToken();
-        return this.getPlaylistTracks(playlistId, limit);
+        return this.getPlaylistTracks(playlistId, limit, snapshotId);
       }
       console.error('Error fetching playlist tracks:', error);
       throw error;
     }
   }
 
-  async getPlaylistMood(playlistId) {
+  async getPlaylistMood(playlistId, snapshotId = null) {
     try {
       const response = await axios.get(`${API_BASE}/playlists/${playlistId}/mood`, {
-        headers: this.getAuthHeaders()
+        headers: this.getAuthHeaders(),
+        params: snapshotId ? { snapshot_id: snapshotId } : {}
       });
       return response.data;
     } catch (error) {
       if (error.response?.status === 401) {
         await this.refreshAccessToken();
-        return this.getPlaylistMood(playlistId);
+        return this.getPlaylistMood(playlistId, snapshotId);
       }
       console.error('Error fetching playlist mood:', error);
       throw error;
@@ -0,0 +1,82 @@
+import os
+import sys
+from typing import Callable, List, Optional
+
+import pytest
+
+# The backend imports its modules as top-level packages (``from services.x import ...``)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+# Settings are read once per process; the app tests run against in-process stand-ins
+os.environ.update(
+    MONGO_URL='mongodb://localhost:27017',
+    DB_NAME='cooldify_test',
+    CACHE_BACKENDS='memory',
+    CACHE_BUS='none',
+    FFMPEG_PATH='/nonexistent'
+)
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class FakeSpotify:
+    """Answers the app's outgoing HTTP requests with ``handler(request)``"""
+
+    def __init__(self):
+        self.handler: Optional[Callable] = None
+        self.requests: List = []
+
+    def handle(self, request):
+        import httpx
+
+        self.requests.append(request)
+        if self.handler is None:
+            return httpx.Response(404, json={'error': {'status': 404}})
+        return self.handler(request)
+
+
+@pytest.fixture
+def spotify():
+    return FakeSpotify()
+
+
+@pytest.fixture
+def fake_http(monkeypatch, spotify):
+    """Send every httpx.AsyncClient request to ``spotify``"""
+    import httpx
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        httpx, 'AsyncClient', lambda **kwargs: real_client(transport=httpx.MockTransport(spotify.handle), **kwargs)
+    )
+    return spotify
+
+
+@pytest.fixture
+def client(monkeypatch, fake_http):
+    """TestClient for the app over an in-memory MongoDB and a fake Spotify"""
+    import mongomock_motor
+    from fastapi.testclient import TestClient
+
+    import server
+
+    monkeypatch.setattr(server, 'AsyncIOMotorClient', lambda url: mongomock_motor.AsyncMongoMockClient())
+    with TestClient(server.app) as test_client:
+        server.app.state.spotify_limiter.rate = 1e9
+        server.app.state.spotify_limiter.capacity = 1e9
+        yield test_client
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    """Configure ADMIN_TOKEN for the admin endpoints and return it"""
+    import dataclasses
+
+    import dependencies
+
+    settings = dataclasses.replace(dependencies.get_settings(), admin_token='secret')
+    monkeypatch.setattr(dependencies, 'get_settings', lambda: settings)
+    return 'secret'
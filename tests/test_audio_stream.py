@@ -0,0 +1,105 @@
+import asyncio
+import os
+import time
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from services.audio_stream import RangeNotSatisfiable, file_response, not_modified_response, parse_range
+from services.disk_cache import DiskLRUCache
+
+ETAG = '"abc.mp3"'
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None),
+    ('bytes=0-99', (0, 99)),
+    ('bytes=900-', (900, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=-5000', (0, 999)),
+    ('bytes=500-5000', (500, 999)),
+    ('bytes=0-1,5-9', None),
+    ('items=0-1', None),
+    ('bytes=a-b', None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=9-3', 'bytes=-0'])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 1000)
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    path = tmp_path / 'abc.mp3'
+    path.write_bytes(bytes(range(256)) * 4)
+    return path
+
+
+@pytest.fixture
+def stream_client(audio_file):
+    async def stream(request):
+        return not_modified_response(request, ETAG, None) or file_response(request, audio_file, ETAG, None, 'audio/mpeg')
+
+    return TestClient(Starlette(routes=[Route('/stream', stream, methods=['GET', 'HEAD'])]))
+
+
+def test_cached_files_are_served_with_ranges_and_validators(stream_client, audio_file):
+    whole = stream_client.get('/stream')
+    assert whole.status_code == 200 and whole.content == audio_file.read_bytes()
+    assert whole.headers['etag'] == ETAG and whole.headers['accept-ranges'] == 'bytes'
+
+    part = stream_client.get('/stream', headers={'Range': 'bytes=10-19'})
+    assert part.status_code == 206
+    assert part.content == bytes(range(10, 20))
+    assert part.headers['content-range'] == 'bytes 10-19/1024'
+
+    assert stream_client.get('/stream', headers={'Range': 'bytes=5000-'}).status_code == 416
+    assert stream_client.get('/stream', headers={'If-None-Match': ETAG}).status_code == 304
+    # A range for an older copy of the file gets the whole file
+    assert stream_client.get('/stream', headers={'Range': 'bytes=0-1', 'If-Range': '"old.mp3"'}).status_code == 200
+    head = stream_client.head('/stream', headers={'Range': 'bytes=0-9'})
+    assert head.status_code == 206 and head.content == b''
+
+
+@pytest.mark.anyio
+async def test_the_disk_cache_fills_once_and_evicts_the_least_recently_used(fake_http, tmp_path):
+    fake_http.handler = lambda request: httpx.Response(200, content=b'x' * 100)
+    cache = DiskLRUCache(tmp_path / 'audio', max_bytes=250)
+    cache.start()
+    assert cache.get('a.mp3') is None
+
+    for key in ('a.mp3', 'b.mp3'):
+        cache.fill_in_background(key, f'https://storage.test/{key}')
+        cache.fill_in_background(key, f'https://storage.test/{key}')
+        await asyncio.gather(*cache._filling.values())
+    assert len(fake_http.requests) == 2
+
+    # Use a after b, so b is the least recently used
+    old = time.time() - 60
+    os.utime(cache.path_for('b.mp3'), (old, old))
+    assert cache.get('a.mp3').read_bytes() == b'x' * 100
+
+    cache.fill_in_background('c.mp3', 'https://storage.test/c.mp3')
+    await asyncio.gather(*cache._filling.values())
+    assert cache.get('b.mp3') is None
+    assert cache.get('a.mp3') and cache.get('c.mp3')
+    assert cache.metrics()['evictions'] == 1 and cache.metrics()['bytes'] == 200
+    # Keys cannot escape the cache directory
+    assert cache.path_for('../../etc/passwd').parent == tmp_path / 'audio'
+
+
+@pytest.mark.anyio
+async def test_failed_fills_leave_nothing_behind(fake_http, tmp_path):
+    fake_http.handler = lambda request: httpx.Response(503)
+    cache = DiskLRUCache(tmp_path, max_bytes=1000)
+    cache.start()
+    cache.fill_in_background('a.mp3', 'https://storage.test/a.mp3')
+    await asyncio.gather(*cache._filling.values())
+    assert list(tmp_path.iterdir()) == [] and cache.metrics()['fill_errors'] == 1
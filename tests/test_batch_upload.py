@@ -0,0 +1,79 @@
+import pytest
+
+from dependencies import get_supabase_service
+from services.circuit_breaker import CircuitOpen
+from services.song_uploads import MAX_BATCH_FILES
+
+
+class FakeSupabase:
+    def __init__(self, songs_table_up=True):
+        self.songs_table_up = songs_table_up
+        self.stored = set()
+        self.songs = []
+
+    async def upload_song_file(self, path, filename, content_type):
+        self.stored.add(filename)
+        return f'https://storage.test/{filename}'
+
+    async def delete_song_file(self, filename):
+        self.stored.discard(filename)
+
+    async def find_song_by_audio_url(self, audio_url):
+        return None
+
+    async def create_songs(self, songs_data):
+        if not self.songs_table_up:
+            raise CircuitOpen('supabase', 7)
+        rows = [{**song, 'id': f'song-{len(self.songs) + n}'} for n, song in enumerate(songs_data)]
+        self.songs.extend(rows)
+        return rows
+
+
+@pytest.fixture
+def supabase(client):
+    fake = FakeSupabase()
+    client.app.dependency_overrides[get_supabase_service] = lambda: fake
+    yield fake
+    client.app.dependency_overrides.clear()
+
+
+def upload(client, files, **form):
+    return client.post(
+        '/api/songs/upload/batch',
+        files=[('files', file) for file in files],
+        data={'artist': 'Band', **form}
+    )
+
+
+def test_each_file_gets_its_own_result(client, supabase):
+    response = upload(client, [
+        ('01 Intro.mp3', b'one', 'audio/mpeg'),
+        ('notes.txt', b'text', 'text/plain'),
+        ('02 Song.flac', b'two', 'audio/flac')
+    ])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body['uploaded'], body['failed']) == (2, 1)
+    intro, notes, song = body['results']
+    assert intro['success'] and intro['song']['title'] == '01 Intro' and intro['job_id']
+    assert notes == {'filename': 'notes.txt', 'success': False, 'error': 'File must be an audio file'}
+    assert song['song']['artist'] == 'Band'
+    assert len(supabase.songs) == 2 and len(supabase.stored) == 2
+
+
+def test_titles_must_match_the_files(client, supabase):
+    files = [('a.mp3', b'a', 'audio/mpeg'), ('b.mp3', b'b', 'audio/mpeg')]
+    assert upload(client, files, titles=['Only one']).status_code == 400
+    assert [result['song']['title'] for result in upload(client, files, titles=['A', 'B']).json()['results']] == ['A', 'B']
+
+    too_many = [(f'{n}.mp3', b'x', 'audio/mpeg') for n in range(MAX_BATCH_FILES + 1)]
+    assert upload(client, too_many).status_code == 400
+
+
+def test_an_unavailable_songs_table_answers_503_and_keeps_no_files(client, supabase):
+    supabase.songs_table_up = False
+    response = upload(client, [('a.mp3', b'a', 'audio/mpeg')])
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '7'
+    assert supabase.stored == set()
@@ -0,0 +1,181 @@
+import asyncio
+import fnmatch
+import time
+
+import mongomock_motor
+import pytest
+
+from services.cache import CacheBackend, MemoryBackend, MongoBackend, Namespace, RedisBackend, TieredCache
+
+pytestmark = pytest.mark.anyio
+
+SHARED = Namespace('test.shared', ttl=60, negative_ttl=60)
+LOCAL = Namespace('test.local', ttl=60, local_only=True)
+REFRESHED = Namespace('test.refreshed', ttl=0.01, stale_ttl=60)
+
+
+class SharedBackend(MemoryBackend):
+    """A non-local tier, standing in for Mongo or Redis"""
+
+    name = 'shared'
+    local = False
+
+
+async def test_local_only_values_stay_in_local_tiers_whatever_their_order():
+    shared, memory = SharedBackend(), MemoryBackend()
+    cache = TieredCache([shared, memory])
+
+    await cache.set(LOCAL, 'k', 'secret')
+    await cache.set(SHARED, 'k', 'public')
+
+    assert await shared.get_many(['test.local:k']) == {}
+    assert (await memory.get_many(['test.local:k']))['test.local:k']['value'] == 'secret'
+    assert (await shared.get_many(['test.shared:k']))['test.shared:k']['value'] == 'public'
+    assert await cache.get(LOCAL, 'k') == 'secret'
+
+
+async def test_local_only_values_are_not_cached_without_a_local_tier():
+    cache = TieredCache([SharedBackend()])
+    await cache.set(LOCAL, 'k', 'secret')
+    assert await cache.get(LOCAL, 'k') is None
+
+
+async def test_concurrent_misses_share_one_load_and_none_is_cached_negatively():
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return None
+
+    cache = TieredCache([MemoryBackend()])
+    results = await asyncio.gather(*(cache.get_or_load(SHARED, 'missing', load) for _ in range(5)))
+    assert results == [None] * 5
+    assert await cache.get_or_load(SHARED, 'missing', load) is None
+    assert loads == 1
+
+
+async def test_hits_in_a_lower_tier_are_copied_up():
+    memory, shared = MemoryBackend(), SharedBackend()
+    await TieredCache([shared]).set(SHARED, 'k', 'v')
+
+    assert await TieredCache([memory, shared]).get(SHARED, 'k') == 'v'
+    assert 'test.shared:k' in await memory.get_many(['test.shared:k'])
+
+
+def test_backends_are_not_local_unless_they_say_so():
+    assert CacheBackend.local is False and MemoryBackend.local is True
+
+
+class FakeRedis:
+    """The part of the redis.asyncio client RedisBackend uses, with expiry"""
+
+    def __init__(self):
+        self.data = {}
+
+    def _live(self, key):
+        value, expires_at = self.data.get(key, (None, 0))
+        return value if expires_at > time.time() else None
+
+    async def mget(self, keys):
+        return [self._live(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.commands = []
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc_info):
+                return False
+
+            def set(self, key, value, px):
+                self.commands.append((key, value, px))
+
+            async def execute(self):
+                for key, value, px in self.commands:
+                    redis.data[key] = (value, time.time() + px / 1000)
+
+        return Pipeline()
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def scan_iter(self, match, count):
+        for key in list(self.data):
+            if fnmatch.fnmatchcase(key, match):
+                yield key
+
+    async def aclose(self):
+        pass
+
+
+def mongo_tier():
+    return MongoBackend(mongomock_motor.AsyncMongoMockClient().db)
+
+
+def redis_tier():
+    return RedisBackend(client=FakeRedis())
+
+
+@pytest.fixture(params=[mongo_tier, redis_tier], ids=['mongo', 'redis'])
+def shared_tier(request):
+    return request.param()
+
+
+async def test_shared_tier_fills_the_memory_tiers_of_other_workers(shared_tier):
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return {'songs': ['a']}
+
+    assert await TieredCache([MemoryBackend(), shared_tier]).get_or_load(SHARED, 'k', load) == {'songs': ['a']}
+
+    memory = MemoryBackend()
+    other = TieredCache([memory, shared_tier])
+    assert await other.get_or_load(SHARED, 'k', load) == {'songs': ['a']}
+    assert len(loads) == 1
+    assert 'test.shared:k' in await memory.get_many(['test.shared:k'])
+    assert other.metrics()['test.shared'][f'{shared_tier.name}_hits'] == 1
+
+    await other.clear(SHARED)
+    assert await shared_tier.get_many(['test.shared:k']) == {}
+
+
+async def test_shared_tier_remembers_misses(shared_tier):
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return None
+
+    await TieredCache([shared_tier]).get_or_load(SHARED, 'missing', load)
+    assert await TieredCache([MemoryBackend(), shared_tier]).get_or_load(SHARED, 'missing', load) is None
+    assert len(loads) == 1
+    assert (await shared_tier.get_many(['test.shared:missing']))['test.shared:missing']['negative'] is True
+
+
+async def test_stale_values_are_served_while_one_refresh_runs(shared_tier):
+    versions = iter(['v1', 'v2', 'v3'])
+
+    async def load():
+        await asyncio.sleep(0.01)
+        return next(versions)
+
+    cache = TieredCache([MemoryBackend(), shared_tier])
+    assert await cache.get_or_load(REFRESHED, 'k', load) == 'v1'
+    await asyncio.sleep(0.02)
+
+    assert await asyncio.gather(*(cache.get_or_load(REFRESHED, 'k', load) for _ in range(3))) == ['v1'] * 3
+    await asyncio.sleep(0.02)
+
+    assert await cache.get(REFRESHED, 'k') == 'v2'
+    assert (await shared_tier.get_many(['test.refreshed:k']))['test.refreshed:k']['value'] == 'v2'
+    assert cache.metrics()['test.refreshed']['loads'] == 2
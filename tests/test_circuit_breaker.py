@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from services import deadlines
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+from services.deadlines import DeadlineExceeded
+
+pytestmark = pytest.mark.anyio
+
+
+async def ok():
+    return 'ok'
+
+
+async def down():
+    raise ConnectionError('refused')
+
+
+async def slow():
+    await asyncio.sleep(0.03)
+    return 'ok'
+
+
+def breaker(**options):
+    return CircuitBreaker('upstream', **{'min_calls': 4, 'open_seconds': 0.05, 'half_open_calls': 2, **options})
+
+
+async def fail(circuit, times):
+    for _ in range(times):
+        with pytest.raises(ConnectionError):
+            await circuit.call(down)
+
+
+async def test_opens_once_enough_recent_calls_fail_and_then_rejects_without_calling():
+    circuit = breaker()
+    await circuit.call(ok)
+    await fail(circuit, 2)
+    assert circuit.state == CLOSED  # 2 of 3 calls, below min_calls
+    await fail(circuit, 1)
+    assert circuit.state == OPEN
+
+    called = False
+
+    async def never():
+        nonlocal called
+        called = True
+
+    with pytest.raises(CircuitOpen) as rejected:
+        await circuit.call(never)
+    assert not called and rejected.value.retry_after > 0
+    with pytest.raises(CircuitOpen):
+        circuit.raise_if_open()
+    assert circuit.metrics()['rejected'] == 2
+
+
+async def test_half_open_probes_close_the_circuit_or_reopen_it():
+    circuit = breaker()
+    await fail(circuit, 4)
+    await asyncio.sleep(0.06)
+
+    assert await circuit.call(ok) == 'ok'
+    assert circuit.state == HALF_OPEN
+    await fail(circuit, 1)
+    assert circuit.state == OPEN and circuit.times_opened == 2
+
+    await asyncio.sleep(0.06)
+    await circuit.call(ok)
+    await circuit.call(ok)
+    assert circuit.state == CLOSED
+
+
+async def test_half_open_lets_only_a_few_probes_through_at_once():
+    circuit = breaker()
+    await fail(circuit, 4)
+    await asyncio.sleep(0.06)
+
+    results = await asyncio.gather(*(circuit.call(slow) for _ in range(3)), return_exceptions=True)
+    assert results.count('ok') == 2
+    assert isinstance(results[2], CircuitOpen)
+
+
+async def test_slow_calls_open_the_circuit():
+    circuit = breaker(slow_call_seconds=0.01, slow_call_threshold=0.5)
+    for _ in range(4):
+        await circuit.call(slow)
+    assert circuit.state == OPEN
+    assert circuit.metrics()['slow_calls'] == 4
+
+
+async def test_refusals_count_as_successes_and_timeouts_as_failures():
+    circuit = breaker(timeout=0.01)
+
+    async def not_found():
+        raise LookupError('404')
+
+    for _ in range(4):
+        with pytest.raises(LookupError):
+            await circuit.call(not_found)
+    assert circuit.state == CLOSED
+
+    for _ in range(4):
+        with pytest.raises(TimeoutError):
+            await circuit.call(slow)
+    assert circuit.state == OPEN
+
+
+async def test_failed_results_count_against_the_upstream():
+    circuit = breaker()
+    for _ in range(4):
+        assert await circuit.call(ok, failed=lambda result: result == 'ok') == 'ok'
+    assert circuit.state == OPEN
+
+
+async def test_running_out_of_the_request_deadline_is_not_held_against_the_upstream():
+    circuit = breaker(timeout=5)
+
+    async def request():
+        deadlines.begin_deadline(0.01)
+        with pytest.raises(DeadlineExceeded):
+            await circuit.call(slow)
+
+    for _ in range(4):
+        await asyncio.create_task(request())
+    assert circuit.state == CLOSED and circuit.calls == 0
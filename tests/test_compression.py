@@ -0,0 +1,74 @@
+import json
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from middleware.compression import CompressionMiddleware
+from responses import FastJSONResponse
+
+PAYLOAD = {'tracks': [{'id': f't{n}', 'name': 'Sång', 'artists': [{'name': 'Artist'}]} for n in range(100)]}
+
+
+async def big(request):
+    return FastJSONResponse(PAYLOAD)
+
+
+async def small(request):
+    return FastJSONResponse({'ok': True})
+
+
+async def audio(request):
+    return Response(b'\x00' * 4096, media_type='audio/mpeg')
+
+
+async def partial(request):
+    return Response('x' * 4096, status_code=206, media_type='text/plain', headers={'Content-Range': 'bytes 0-4095/9000'})
+
+
+async def stream(request):
+    async def lines():
+        for n in range(50):
+            yield f'line {n}\n'.encode()
+    return StreamingResponse(lines(), media_type='text/plain')
+
+
+@pytest.fixture
+def client():
+    routes = [Route(f'/{handler.__name__}', handler) for handler in (big, small, audio, partial, stream)]
+    app = Starlette(routes=routes)
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize('encoding', ['br', 'gzip'])
+def test_large_json_is_compressed_with_the_best_accepted_encoding(client, encoding):
+    accept = 'gzip, br' if encoding == 'br' else 'gzip, br;q=0'
+    response = client.get('/big', headers={'Accept-Encoding': accept})
+    assert response.headers['content-encoding'] == encoding
+    assert response.headers['vary'] == 'Accept-Encoding'
+    assert int(response.headers['content-length']) < len(json.dumps(PAYLOAD))
+    assert response.json() == PAYLOAD
+
+
+def test_streamed_text_is_compressed_as_it_goes(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert 'content-length' not in response.headers
+    assert response.text == ''.join(f'line {n}\n' for n in range(50))
+
+
+@pytest.mark.parametrize('path', ['/small', '/audio', '/partial'])
+def test_small_binary_and_partial_responses_are_left_alone(client, path):
+    response = client.get(path, headers={'Accept-Encoding': 'gzip, br'})
+    assert 'content-encoding' not in response.headers
+
+
+def test_nothing_is_compressed_for_clients_that_do_not_ask(client):
+    assert 'content-encoding' not in client.get('/big', headers={'Accept-Encoding': 'identity'}).headers
+
+
+def test_fast_json_is_compact_and_keeps_non_ascii_text():
+    assert FastJSONResponse({'name': 'Sång', 'n': [1, 2]}).body == '{"name":"Sång","n":[1,2]}'.encode()
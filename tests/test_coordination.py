@@ -0,0 +1,129 @@
+import asyncio
+
+import mongomock_motor
+import pytest
+
+from services.cache import MemoryBackend, MongoBackend, Namespace, TieredCache
+from services.cache_bus import InvalidationBus
+from services.leader import LeaderLease, Scheduler
+from services.rate_limiter import DistributedTokenBucket, RateLimitTimeout
+
+pytestmark = pytest.mark.anyio
+
+SONGS = Namespace('test.songs', ttl=60)
+
+
+@pytest.fixture
+def db():
+    return mongomock_motor.AsyncMongoMockClient().db
+
+
+async def test_workers_share_one_token_bucket(db):
+    workers = [DistributedTokenBucket(db, 'spotify', rate=0.001, capacity=3) for _ in range(2)]
+    granted = [(await worker._take())['granted'] for worker in workers * 2]
+    assert granted == [True, True, True, False]
+
+    with pytest.raises(RateLimitTimeout):
+        await workers[0].acquire(max_wait=0.05)
+    assert workers[0].metrics()['timeouts'] == 1
+
+
+async def test_a_penalty_blocks_every_worker(db):
+    first, second = (DistributedTokenBucket(db, 'spotify', rate=100, capacity=100) for _ in range(2))
+    await first.penalize(30)
+    assert (await second._take())['granted'] is False
+
+
+async def test_the_bucket_fails_open_without_mongodb(db):
+    bucket = DistributedTokenBucket(db, 'spotify', rate=1, capacity=1)
+
+    async def unavailable():
+        raise ConnectionError('mongod is down')
+
+    bucket._take = unavailable
+    await bucket.acquire()
+    assert bucket.metrics()['errors'] == 1
+
+
+async def test_a_lease_is_held_by_one_worker_until_it_expires_or_is_released(db):
+    first, second = LeaderLease(db, 'scheduler', ttl=0.2), LeaderLease(db, 'scheduler', ttl=0.2)
+    assert await first.acquire()
+    assert not await second.acquire()
+    assert await first.acquire()  # renewal
+
+    await asyncio.sleep(0.25)
+    assert await second.acquire()
+    assert not await first.acquire()
+
+    await second.release()
+    assert await first.acquire()
+
+
+async def test_only_the_leader_runs_scheduled_jobs(db):
+    runs = []
+    schedulers = [Scheduler(db, lease_ttl=3, tick=0.01) for _ in range(2)]
+    for number, scheduler in enumerate(schedulers):
+        scheduler.every('snapshot', 60, lambda number=number: asyncio.sleep(0, runs.append(number)))
+        scheduler.start()
+    await asyncio.sleep(0.1)
+    for scheduler in schedulers:
+        await scheduler.stop()
+
+    assert len(runs) == 1
+    # The run time is stored, so the next leader keeps the schedule
+    follower = Scheduler(db, lease_ttl=3, tick=0.01)
+    follower.every('snapshot', 60, lambda: asyncio.sleep(0, runs.append('again')))
+    follower.start()
+    await asyncio.sleep(0.05)
+    await follower.stop()
+    assert len(runs) == 1 and follower.status()['jobs']['snapshot']['last_run']
+
+
+class LoopbackBus(InvalidationBus):
+    """Delivers every message to every bus in ``network``, as Redis or Mongo would"""
+
+    def __init__(self, network):
+        super().__init__()
+        self.network = network
+        network.append(self)
+        self.handler = None
+
+    async def start(self, handler):
+        self.handler = handler
+
+    async def publish(self, message):
+        for bus in self.network:
+            await bus._dispatch(bus.handler, {**message, 'origin': self.origin})
+
+
+async def test_invalidations_reach_the_local_tiers_of_other_workers(db):
+    network = []
+    shared = MongoBackend(db)
+    workers = [TieredCache([MemoryBackend(), shared], LoopbackBus(network)) for _ in range(2)]
+    for worker in workers:
+        await worker.start()
+
+    await workers[0].set(SONGS, 'list', ['old'])
+    assert await workers[1].get(SONGS, 'list') == ['old']  # now also in worker 1's memory tier
+
+    await workers[0].invalidate(SONGS, 'list')
+    assert await workers[1].get(SONGS, 'list') is None
+
+    await workers[0].set(SONGS, 'list', ['old'])
+    await workers[1].get(SONGS, 'list')
+    await workers[0].clear(SONGS)
+    assert await workers[1].get(SONGS, 'list') is None
+
+
+async def test_overwritten_values_reach_other_workers(db):
+    network = []
+    shared = MongoBackend(db)
+    workers = [TieredCache([MemoryBackend(), shared], LoopbackBus(network)) for _ in range(2)]
+    for worker in workers:
+        await worker.start()
+
+    await workers[0].set(SONGS, 'list', ['old'])
+    assert await workers[1].get(SONGS, 'list') == ['old']
+
+    await workers[0].set(SONGS, 'list', ['new'])
+    assert await workers[1].get(SONGS, 'list') == ['new']
@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import pytest
+
+import routes.spotify_routes as spotify_routes
+from dependencies import get_spotify_service
+
+HEADERS = {'Authorization': 'Bearer token'}
+
+
+class FakeService:
+    access_token = 'token'
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_user_profile(self):
+        self.calls.append('profile')
+        await asyncio.sleep(0.3)
+        return {'id': 'me'}
+
+    async def get_featured_playlists(self):
+        self.calls.append('featured')
+        return [{'id': 'p1', 'name': 'Hits', 'description': 'Long text', 'tracks': {'total': 3}}]
+
+    async def get_user_playlists(self):
+        self.calls.append('playlists')
+        raise RuntimeError('Spotify is down')
+
+
+@pytest.fixture
+def service(client, monkeypatch):
+    monkeypatch.setitem(spotify_routes.DASHBOARD_TIMEOUTS, 'profile', 0.05)
+    service = FakeService()
+    client.app.dependency_overrides[get_spotify_service] = lambda: service
+    yield service
+    client.app.dependency_overrides.clear()
+
+
+def test_slow_parts_come_back_pending_and_are_collected_on_the_next_poll(client, service):
+    body = client.get('/api/spotify/dashboard', params={'parts': 'profile,featured'}, headers=HEADERS).json()
+
+    assert body['pending'] == ['profile'] and body['profile'] is None
+    assert [playlist['id'] for playlist in body['featured']] == ['p1']
+
+    time.sleep(0.35)
+    body = client.get('/api/spotify/dashboard', params={'parts': 'profile'}, headers=HEADERS).json()
+
+    assert body == {'pending': [], 'failed': [], 'profile': {'id': 'me'}}
+    assert service.calls == ['profile', 'featured']
+    assert len(client.app.state.dashboard_tasks) == 0
+
+
+def test_a_failing_part_does_not_fail_the_dashboard(client, service):
+    body = client.get('/api/spotify/dashboard', params={'parts': 'playlists,featured'}, headers=HEADERS).json()
+
+    assert body['failed'] == ['playlists'] and body['playlists'] is None
+    assert body['featured'] is not None
+
+
+def test_unknown_parts_are_rejected(client, service):
+    response = client.get('/api/spotify/dashboard', params={'parts': 'nope'}, headers=HEADERS)
+
+    assert response.status_code == 400
+    assert service.calls == []
+
+
+def test_polling_parked_moods_does_not_fetch_playlists_again(client, monkeypatch):
+    class Playlists(FakeService):
+        async def get_user_playlists(self):
+            self.calls.append('playlists')
+            return [{'id': 'p1'}]
+
+    async def slow_moods(service, playlists, store, pool):
+        await asyncio.sleep(0.3)
+        return {playlist['id']: {'overall_mood': 'Happy'} for playlist in playlists}
+
+    monkeypatch.setitem(spotify_routes.DASHBOARD_TIMEOUTS, 'moods', 0.05)
+    monkeypatch.setattr(spotify_routes, 'calculate_playlist_moods', slow_moods)
+    service = Playlists()
+    client.app.dependency_overrides[get_spotify_service] = lambda: service
+    try:
+        first = client.get('/api/spotify/dashboard', params={'parts': 'moods'}, headers=HEADERS).json()
+        again = client.get('/api/spotify/dashboard', params={'parts': 'moods'}, headers=HEADERS).json()
+        time.sleep(0.3)
+        last = client.get('/api/spotify/dashboard', params={'parts': 'moods'}, headers=HEADERS).json()
+    finally:
+        client.app.dependency_overrides.clear()
+
+    assert first['pending'] == again['pending'] == ['moods']
+    assert last['moods'] == {'p1': {'overall_mood': 'Happy'}}
+    assert service.calls == ['playlists']
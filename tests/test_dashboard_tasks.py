@@ -0,0 +1,35 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.dashboard_tasks import DashboardTasks
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_parked_work_is_resumed_by_the_next_poll_and_cancelled_at_shutdown():
+    tasks = DashboardTasks()
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    first = tasks.resume('client', 'moods', slow)
+    tasks.park('client', 'moods', first)
+    assert tasks.resume('client', 'moods', slow) is first
+    # Collected work is no longer parked; another client's part is separate
+    other = tasks.resume('other', 'moods', slow)
+    assert other is not first
+    other.cancel()
+
+    tasks.park('client', 'moods', first)
+    await tasks.cancel_all()
+    assert first.cancelled() and len(tasks) == 0
+
+
+def test_search_and_dashboard_state_belong_to_the_app(client, spotify):
+    spotify.handler = lambda request: httpx.Response(200, json={'tracks': {'items': [{'id': 't1', 'name': 'One'}]}})
+    response = client.get('/api/spotify/search', params={'q': 'one'}, headers={'Authorization': 'Bearer token'})
+    assert response.status_code == 200
+    assert [track['id'] for track in response.json()['tracks']] == ['t1']
+    assert len(client.app.state.dashboard_tasks) == 0
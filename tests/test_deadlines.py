@@ -0,0 +1,155 @@
+import asyncio
+
+import httpx
+import pytest
+
+from middleware.deadline import DeadlineMiddleware
+from services import deadlines
+from services.cache import MemoryBackend, Namespace, TieredCache
+from services.deadlines import DeadlineExceeded
+from services.latency import RouteLatency
+from services.search_cache import SearchCache
+from services.spotify_service import SpotifyService
+
+pytestmark = pytest.mark.anyio
+
+
+def http_scope(path='/api/x', timeout=None):
+    headers = [(b'x-request-timeout', timeout.encode())] if timeout is not None else []
+    return {'type': 'http', 'method': 'GET', 'path': path, 'headers': headers}
+
+
+async def respond(send, body=b'ok'):
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class Client:
+    """The server side of one request: a complete GET body, then a disconnect once ``leave`` is set"""
+
+    def __init__(self):
+        self.leave = asyncio.Event()
+        self.sent = []
+        self._asked = 0
+
+    async def receive(self):
+        self._asked += 1
+        if self._asked == 1:
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.leave.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    @property
+    def status(self):
+        return next(message['status'] for message in self.sent if message['type'] == 'http.response.start')
+
+
+def test_client_timeouts_are_floored_and_capped():
+    middleware = DeadlineMiddleware(None, RouteLatency(), default_timeout=10, max_timeout=30, exempt_paths=['/api/up'])
+    assert middleware._timeout(http_scope(timeout='0.0001')) == 1.0
+    assert middleware._timeout(http_scope(timeout='5')) == 5
+    assert middleware._timeout(http_scope(timeout='100')) == 30
+    assert middleware._timeout(http_scope(timeout='soon')) == 10
+    assert middleware._timeout(http_scope()) == 10
+    assert middleware._timeout(http_scope('/api/upload', timeout='5')) is None
+    # The floor never raises a request above the server's own default
+    assert DeadlineMiddleware(None, RouteLatency(), default_timeout=0.5)._timeout(http_scope(timeout='0.01')) == 0.5
+
+
+async def test_a_handler_past_its_deadline_is_cancelled_and_answered_with_504():
+    cancelled = asyncio.Event()
+
+    async def app(scope, receive, send):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    latency = RouteLatency()
+    client = Client()
+    await DeadlineMiddleware(app, latency, default_timeout=0.05)(http_scope(), client.receive, client.send)
+    assert client.status == 504
+    assert cancelled.is_set()
+    assert latency.metrics()['unmatched']['outcomes'] == {'deadline': 1}
+
+
+async def test_a_disconnect_cancels_the_handler():
+    cancelled = asyncio.Event()
+
+    async def app(scope, receive, send):
+        client.leave.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    latency = RouteLatency()
+    client = Client()
+    await DeadlineMiddleware(app, latency)(http_scope(), client.receive, client.send)
+    assert cancelled.is_set()
+    assert client.sent == []
+    assert latency.metrics()['unmatched']['outcomes'] == {'cancelled': 1}
+
+
+async def test_work_after_the_response_is_neither_cancelled_nor_timed():
+    finished = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await respond(send)
+        client.leave.set()
+        await asyncio.sleep(0.1)
+        # The deadline is lifted once the response is complete
+        assert deadlines.remaining() is None
+        finished.set()
+
+    client = Client()
+    await DeadlineMiddleware(app, RouteLatency(), default_timeout=0.05)(http_scope(), client.receive, client.send)
+    assert client.status == 200
+    assert finished.is_set()
+
+
+async def test_running_out_of_deadline_does_not_serve_a_cached_body(fake_http):
+    fake_http.handler = lambda request: httpx.Response(200, json={'id': 'p1'}, headers={'ETag': '"v1"'})
+    service = SpotifyService('token', TieredCache([MemoryBackend()]))
+
+    async def get_past_deadline():
+        deadlines.begin_deadline(-1)
+        async with httpx.AsyncClient() as client:
+            return await service._get(client, '/playlists/p1')
+
+    async with httpx.AsyncClient() as client:
+        assert await service._get(client, '/playlists/p1') == {'id': 'p1'}
+    with pytest.raises(DeadlineExceeded):
+        await asyncio.create_task(get_past_deadline())
+
+
+async def test_shared_work_is_not_bound_by_the_deadline_of_the_request_that_started_it():
+    cache = TieredCache([MemoryBackend()])
+    search_cache = SearchCache()
+    namespace = Namespace('test.shared_load', ttl=60)
+
+    async def slow_upstream():
+        # Upstream calls apply whatever deadline is in effect
+        await deadlines.within_deadline(asyncio.sleep(0.1))
+        return ['loaded']
+
+    async def request(seconds, call):
+        deadlines.begin_deadline(seconds)
+        return await call()
+
+    for call in (
+        lambda: cache.get_or_load(namespace, 'k', slow_upstream),
+        lambda: search_cache.search('q', 10, lambda query, limit: slow_upstream())
+    ):
+        hurried = asyncio.create_task(request(0.02, call))
+        await asyncio.sleep(0)
+        patient = asyncio.create_task(request(5, call))
+
+        with pytest.raises(DeadlineExceeded):
+            await hurried
+        assert await patient == ['loaded']
@@ -0,0 +1,65 @@
+import httpx
+import mongomock_motor
+import pytest
+
+from services.cache import MemoryBackend, TieredCache
+from services.featured_precompute import FeaturedPrecompute
+from services.mood_index import MoodIndex
+from services.playlist_mood_store import PlaylistMoodStore
+from services.spotify_service import SpotifyService
+
+pytestmark = pytest.mark.anyio
+
+FEATURED = [{'id': 'f1', 'name': 'Upbeat', 'snapshot_id': 's1'}, {'id': 'f2', 'name': 'Empty', 'snapshot_id': 's1'}]
+
+
+def featured_spotify(request):
+    path = request.url.path
+    if path == '/v1/browse/featured-playlists':
+        return httpx.Response(200, json={'playlists': {'items': FEATURED}})
+    if path == '/v1/playlists/f1/tracks':
+        return httpx.Response(200, json={'items': [{'track': {'id': 't1'}}, {'track': {'id': 't2'}}]})
+    if path == '/v1/playlists/f2/tracks':
+        return httpx.Response(200, json={'items': []})
+    if path == '/v1/audio-features':
+        return httpx.Response(200, json={'audio_features': [
+            {'id': track_id, 'energy': 0.9, 'valence': 0.9, 'tempo': 128, 'danceability': 0.8}
+            for track_id in request.url.params['ids'].split(',')
+        ]})
+    return httpx.Response(404)
+
+
+class AppToken:
+    async def get_app_token(self):
+        return 'app-token'
+
+
+def precompute(cache, playlist_index):
+    store = PlaylistMoodStore(mongomock_motor.AsyncMongoMockClient().db)
+    return FeaturedPrecompute(lambda: AppToken(), cache, None, store, None, playlist_index=playlist_index)
+
+
+async def test_a_scheduled_run_warms_moods_that_users_then_read_from_the_cache(fake_http):
+    fake_http.handler = featured_spotify
+    cache = TieredCache([MemoryBackend()])
+    playlist_index = MoodIndex()
+
+    await precompute(cache, playlist_index).run()
+    assert {request.headers['Authorization'] for request in fake_http.requests} == {'Bearer app-token'}
+    assert [playlist_id for playlist_id, _ in playlist_index.nearest([0.9, 0.9, 128 / 220, 0.8], 5)] == ['f1']
+
+    fake_http.requests.clear()
+    featured = await precompute(cache, MoodIndex()).get(SpotifyService('user-token', cache))
+    assert fake_http.requests == []
+    assert [playlist['id'] for playlist in featured] == ['f1', 'f2']
+    assert featured[0]['mood']['overall_mood'] != 'Unknown'
+
+
+async def test_cached_featured_playlists_are_indexed_after_a_restart(fake_http):
+    fake_http.handler = featured_spotify
+    cache = TieredCache([MemoryBackend()])
+    await precompute(cache, MoodIndex()).run()
+
+    restarted = MoodIndex()
+    assert await precompute(cache, restarted).index_cached() == 1
+    assert 'f1' in restarted and 'f2' not in restarted
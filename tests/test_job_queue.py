@@ -0,0 +1,128 @@
+import asyncio
+
+import mongomock_motor
+import pytest
+
+from services.job_queue import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def db():
+    return mongomock_motor.AsyncMongoMockClient().db
+
+
+def queue(db, handler=None, **options):
+    jobs = JobQueue(db, **{'retry_backoff': 0, 'poll_interval': 0.01, **options})
+    jobs.register('work', handler or (lambda payload: asyncio.sleep(0, {'done': payload['n']})))
+    return jobs
+
+
+async def test_jobs_are_leased_by_one_worker_in_priority_order(db):
+    first, second = queue(db), queue(db)
+    low = await first.enqueue('work', {'n': 1})
+    high = await first.enqueue('work', {'n': 2}, priority=5)
+    await first.enqueue('other', {'n': 3})
+
+    assert (await first._lease())['_id'] == high
+    assert (await second._lease())['_id'] == low
+    # Nothing left of a type these workers handle
+    assert await first._lease() is None
+    assert (await first.get(high))['status'] == RUNNING
+
+
+async def test_an_expired_lease_is_taken_over_and_the_old_holder_cannot_settle_it(db):
+    crashed, survivor = queue(db, visibility_timeout=0.05), queue(db)
+    job_id = await crashed.enqueue('work', {'n': 1})
+    stale = await crashed._lease()
+    assert await survivor._lease() is None
+
+    await asyncio.sleep(0.06)
+    job = await survivor._lease()
+    assert job['_id'] == job_id and job['attempts'] == 2
+
+    await crashed._finish(stale, FAILED, error='late')
+    await survivor._run(job)
+    assert (await survivor.get(job_id))['status'] == SUCCEEDED
+
+
+async def test_failed_jobs_are_retried_until_max_attempts(db):
+    calls = []
+
+    async def flaky(payload):
+        calls.append(payload)
+        if len(calls) < 3:
+            raise RuntimeError(f'attempt {len(calls)}')
+        return {'ok': True}
+
+    jobs = queue(db, flaky)
+    retried = await jobs.enqueue('work', {}, max_attempts=3)
+    await jobs._run(await jobs._lease())
+    job = await jobs.get(retried)
+    assert job['status'] == QUEUED and job['error'] == 'attempt 1'
+
+    await jobs._run(await jobs._lease())
+    await jobs._run(await jobs._lease())
+    job = await jobs.get(retried)
+    assert job['status'] == SUCCEEDED and job['result'] == {'ok': True} and job['attempts'] == 3
+
+    calls.clear()
+    given_up = await jobs.enqueue('work', {}, max_attempts=1)
+    await jobs._run(await jobs._lease())
+    job = await jobs.get(given_up)
+    assert job['status'] == FAILED and job['error'] == 'attempt 1'
+
+
+async def test_retries_back_off_exponentially(db):
+    async def broken(payload):
+        raise RuntimeError('broken')
+
+    jobs = queue(db, broken, retry_backoff=60)
+    job_id = await jobs.enqueue('work', {})
+    await jobs._run(await jobs._lease())
+    assert (await jobs.get(job_id))['status'] == QUEUED
+    assert await jobs._lease() is None
+
+
+async def test_a_job_whose_final_lease_expired_is_failed(db):
+    jobs = queue(db, visibility_timeout=0.01)
+    job_id = await jobs.enqueue('work', {}, max_attempts=1)
+    await jobs._lease()
+    await asyncio.sleep(0.02)
+
+    await jobs._run(await jobs._lease())
+    job = await jobs.get(job_id)
+    assert job['status'] == FAILED and job['error'] == 'Lease expired on final attempt'
+
+
+async def test_workers_run_queued_jobs(db):
+    jobs = queue(db)
+    jobs.start()
+    job_ids = [await jobs.enqueue('work', {'n': n}) for n in range(3)]
+    for _ in range(100):
+        if (await jobs.stats())[SUCCEEDED] == 3:
+            break
+        await asyncio.sleep(0.01)
+    await jobs.stop()
+
+    assert [(await jobs.get(job_id))['result'] for job_id in job_ids] == [{'done': n} for n in range(3)]
+    assert 'lease_id' not in await jobs.get(job_ids[0])
+
+
+def test_job_listings_are_admin_only_and_job_status_hides_internals(client, admin_token):
+    jobs = client.app.state.job_queue
+    job_id = client.portal.call(jobs.enqueue, 'unhandled', {'filename': 'private-song.mp3'})
+    client.portal.call(jobs.collection.update_one, {'_id': job_id}, {'$set': {'error': 'Traceback: /srv/storage'}})
+
+    for path in ('/api/jobs/', '/api/jobs/stats'):
+        assert client.get(path).status_code == 403
+        assert client.get(path, headers={'X-Admin-Token': admin_token}).status_code == 200
+    listed = client.get('/api/jobs/', headers={'X-Admin-Token': admin_token}).json()['jobs']
+    assert listed[0]['payload'] == {'filename': 'private-song.mp3'}
+
+    status = client.get(f'/api/jobs/{job_id}').json()
+    assert status['id'] == job_id and status['type'] == 'unhandled'
+    assert status['status'] in (QUEUED, RUNNING, FAILED)
+    assert 'payload' not in status and 'error' not in status and 'lease_id' not in status
+    assert client.get('/api/jobs/missing').status_code == 404
@@ -0,0 +1,98 @@
+import httpx
+import mongomock_motor
+import pytest
+
+from services.cache import MemoryBackend, TieredCache
+from services.library_sync import LibraryStore, LibrarySync
+from services.spotify_service import SpotifyService
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeLibrary:
+    """A user's saved tracks, newest first, as Spotify pages them"""
+
+    def __init__(self, count):
+        self.saved = [self.item(n) for n in reversed(range(count))]
+
+    @staticmethod
+    def item(n):
+        return {'added_at': f'2026-01-01T00:{n // 60:02d}:{n % 60:02d}Z', 'track': {'id': f't{n}', 'name': f'Track {n}'}}
+
+    def handle(self, request):
+        path, params = request.url.path, request.url.params
+        if path == '/v1/me/tracks':
+            offset, limit = int(params['offset']), int(params['limit'])
+            return httpx.Response(200, json={'items': self.saved[offset:offset + limit], 'total': len(self.saved)})
+        if path == '/v1/me/top/tracks':
+            return httpx.Response(200, json={'items': [self.saved[-1]['track']]})
+        if path == '/v1/audio-features':
+            return httpx.Response(200, json={'audio_features': [
+                {'id': track_id, 'energy': 0.5, 'valence': 0.5, 'tempo': 120, 'danceability': 0.5}
+                for track_id in params['ids'].split(',')
+            ]})
+        return httpx.Response(404)
+
+
+@pytest.fixture
+def store():
+    return LibraryStore(mongomock_motor.AsyncMongoMockClient().db)
+
+
+async def sync(store, full=False):
+    assert await store.begin_sync('user')
+    return await LibrarySync(store).sync(SpotifyService('token', TieredCache([MemoryBackend()])), 'user', full=full)
+
+
+def saved_offsets(spotify):
+    return [int(request.url.params['offset']) for request in spotify.requests if request.url.path == '/v1/me/tracks']
+
+
+async def test_incremental_syncs_stop_at_the_cursor_and_only_look_up_new_features(fake_http, store):
+    library = FakeLibrary(120)
+    fake_http.handler = library.handle
+
+    first = await sync(store)
+    assert first['last_sync']['saved_added'] == 120
+    assert first['last_sync']['features_fetched'] == 120
+    assert first['saved_cursor'] == FakeLibrary.item(119)['added_at']
+    assert sorted(saved_offsets(fake_http)) == [0, 50, 100]
+
+    fake_http.requests.clear()
+    library.saved[:0] = [FakeLibrary.item(121), FakeLibrary.item(120)]
+    second = await sync(store)
+    # The first page reaches the cursor; the track at the cursor is seen again but not looked up again
+    assert saved_offsets(fake_http) == [0]
+    assert second['last_sync']['saved_added'] == 3
+    assert second['last_sync']['features_fetched'] == 2
+    assert second['saved_cursor'] == FakeLibrary.item(121)['added_at']
+
+    saved = await store.library('user')
+    assert len(saved) == 122 and saved[0]['track']['id'] == 't121'
+    assert (await store.status('user'))['status'] == 'idle'
+
+
+async def test_a_full_sync_unsaves_tracks_removed_from_the_library(fake_http, store):
+    library = FakeLibrary(10)
+    fake_http.handler = library.handle
+    await sync(store)
+
+    del library.saved[3]
+    incremental = await sync(store)
+    assert incremental['last_sync']['unsaved'] == 0
+    assert len(await store.library('user')) == 10
+
+    full = await sync(store, full=True)
+    assert full['last_sync']['unsaved'] == 1
+    assert len(await store.library('user')) == 9
+    assert [doc['track']['id'] for doc in await store.library('user', 'short_term')] == ['t0']
+
+
+async def test_only_one_sync_per_user_runs_and_failures_are_recorded(fake_http, store):
+    fake_http.handler = lambda request: httpx.Response(500)
+    assert await store.begin_sync('user')
+    assert not await store.begin_sync('user')
+
+    assert await LibrarySync(store).sync(SpotifyService('token', TieredCache([MemoryBackend()])), 'user') is None
+    assert (await store.status('user'))['status'] == 'failed'
+    assert await store.cursor('user') is None
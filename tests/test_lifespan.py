@@ -0,0 +1,27 @@
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent / 'backend'
+
+
+def test_importing_the_songs_routes_does_not_load_the_supabase_client():
+    code = 'import sys, routes.songs_routes; print("supabase" in sys.modules, "postgrest" in sys.modules)'
+    result = subprocess.run([sys.executable, '-c', code], cwd=BACKEND, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ['False', 'False']
+
+
+def test_songs_routes_answer_503_without_supabase_credentials(client):
+    response = client.get('/api/songs/')
+
+    assert response.status_code == 503
+    assert response.json()['detail'] == 'Song storage is not configured'
+
+
+def test_the_lifespan_builds_the_database_backed_routes(client):
+    created = client.post('/api/status', json={'client_name': 'test'})
+    assert created.status_code == 200
+
+    assert [check['client_name'] for check in client.get('/api/status').json()] == ['test']
+    for name in ('db', 'playlist_mood_store', 'worker_pool', 'job_queue'):
+        assert getattr(client.app.state, name) is not None
@@ -0,0 +1,116 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import mongomock_motor
+import numpy as np
+import pytest
+
+from services.mood_calculator import MoodCalculator
+from services.mood_diff import diff_snapshots
+from services.mood_history import MoodHistoryStore, pack_features, unpack_features
+from services.mood_index import FEATURES
+
+pytestmark = pytest.mark.anyio
+
+
+def features(energy, valence, tempo=120.0, danceability=0.5):
+    return {'energy': energy, 'valence': valence, 'tempo': tempo, 'danceability': danceability}
+
+
+def snapshot(tracks, ts):
+    audio_features = [track_features for _, track_features in tracks]
+    mood = MoodCalculator.calculate_mood([f for f in audio_features if f])
+    return {
+        'ts': ts,
+        **{field: mood[field] for field in ('overall_mood', 'mood_score') + FEATURES},
+        'track_count': len(tracks),
+        'track_ids': [track_id for track_id, _ in tracks],
+        'features': pack_features(audio_features)
+    }
+
+
+def test_packed_features_keep_missing_tracks_as_nan_rows():
+    matrix = unpack_features(pack_features([features(0.25, 0.5), None]))
+    assert matrix.shape == (2, len(FEATURES))
+    assert matrix[0].tolist() == [0.25, 0.5, 120.0, 0.5]
+    assert np.isnan(matrix[1]).all()
+
+
+def test_track_contributions_add_up_to_the_change_in_the_means():
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    kept, dropped = ('a', features(0.2, 0.4)), ('b', features(0.9, 0.8, 170))
+    added = [('c', features(0.7, 0.1, 90)), ('d', None), ('e', features(0.5, 0.9))]
+    before = snapshot([kept, dropped, ('x', None)], start)
+    after = snapshot([kept, ('x', None)] + added, start + timedelta(days=1))
+
+    diff = diff_snapshots(before, after)
+
+    assert (diff['added_count'], diff['removed_count'], diff['unchanged_count']) == (3, 1, 2)
+    before_mean = np.nanmean(unpack_features(before['features']).astype(np.float64), axis=0)
+    after_mean = np.nanmean(unpack_features(after['features']).astype(np.float64), axis=0)
+    explained = np.sum([[track['contribution'][name] for name in FEATURES] for track in diff['tracks']], axis=0)
+    assert explained == pytest.approx(after_mean - before_mean, abs=1e-3)
+    # Ranked by impact; the track without features explains nothing
+    assert [track['impact'] for track in diff['tracks']] == sorted((track['impact'] for track in diff['tracks']), reverse=True)
+    assert diff['tracks'][-1] == {'id': 'd', 'change': 'added', 'contribution': dict.fromkeys(FEATURES, 0.0), 'impact': 0.0}
+
+
+async def test_snapshots_are_stored_and_read_back_by_time():
+    store = MoodHistoryStore(mongomock_motor.AsyncMongoMockClient().db)
+    tracks = [('a', features(0.2, 0.4)), ('b', features(0.8, 0.6))]
+    mood = MoodCalculator.calculate_mood([f for _, f in tracks])
+
+    first = await store.record('p1', mood, ['a', 'b'], [f for _, f in tracks])
+    # Stored times have millisecond precision; keep the two snapshots apart
+    await asyncio.sleep(0.002)
+    await store.record('p1', mood, ['a'], [tracks[0][1]])
+    await store.record('p2', mood, ['b'], [tracks[1][1]])
+
+    latest = await store.snapshot_at('p1')
+    assert latest['track_ids'] == ['a']
+    assert (await store.snapshot_at('p1', skip=1))['track_ids'] == ['a', 'b']
+    assert await store.snapshot_at('p1', at=first['ts'] - timedelta(seconds=1)) is None
+
+    history = await store.history('p1', since=first['ts'] - timedelta(minutes=1))
+    assert [point['track_count'] for point in history] == [2, 1]
+    assert 'features' not in history[0]
+
+    assert await store.watch('p1') and not await store.watch('p1')
+    assert await store.watched_playlists() == ['p1']
+
+
+def playlist_access(owners):
+    """Spotify answers playlist lookups only for tokens in ``owners``"""
+    import httpx
+
+    def handle(request):
+        token = request.headers['Authorization'].removeprefix('Bearer ')
+        if request.url.path == '/v1/playlists/p1' and token in owners:
+            return httpx.Response(200, json={'snapshot_id': 's1'})
+        return httpx.Response(404, json={'error': {'status': 404}})
+
+    return handle
+
+
+@pytest.mark.parametrize('path', ['/api/spotify/playlists/p1/mood/history', '/api/spotify/playlists/p1/mood/diff'])
+def test_mood_history_is_only_served_to_callers_who_can_read_the_playlist(client, spotify, path):
+    history = client.app.state.mood_history
+    tracks = [('a', features(0.2, 0.4)), ('b', features(0.8, 0.6))]
+    mood = MoodCalculator.calculate_mood([f for _, f in tracks])
+    client.portal.call(history.record, 'p1', mood, ['a', 'b'], [f for _, f in tracks])
+    time.sleep(0.002)
+    client.portal.call(history.record, 'p1', mood, ['a'], [tracks[0][1]])
+    spotify.handler = playlist_access({'owner'})
+
+    denied = client.get(path, headers={'Authorization': 'Bearer stranger'})
+    allowed = client.get(path, headers={'Authorization': 'Bearer owner'})
+
+    assert denied.status_code == 404
+    assert 'track_ids' not in denied.text and 'points' not in denied.json()
+    assert allowed.status_code == 200
+    assert [request.url.params['fields'] for request in spotify.requests] == ['snapshot_id', 'snapshot_id']
+
+
+def test_mood_history_requires_a_spotify_token(client):
+    assert client.get('/api/spotify/playlists/p1/mood/history').status_code == 422
@@ -0,0 +1,83 @@
+import httpx
+import numpy as np
+import pytest
+
+from services.cache import MemoryBackend, TieredCache
+from services.mood_index import MoodIndex, feature_vector
+from services.spotify_service import SpotifyService
+
+
+def features(track_id, energy, valence, tempo=110.0, danceability=0.5):
+    return {'id': track_id, 'energy': energy, 'valence': valence, 'tempo': tempo, 'danceability': danceability}
+
+
+def test_nearest_matches_a_brute_force_scan():
+    rng = np.random.default_rng(7)
+    vectors = rng.random((500, 4), dtype=np.float32)
+    index = MoodIndex(initial_capacity=16)
+    for i, vector in enumerate(vectors):
+        index.add(f't{i}', vector)
+
+    target = np.array([0.3, 0.7, 0.5, 0.2], dtype=np.float32)
+    expected = np.argsort(np.linalg.norm(vectors - target, axis=1))[:10]
+    assert [item_id for item_id, _ in index.nearest(target, 10)] == [f't{i}' for i in expected]
+    assert 't0' not in [item_id for item_id, _ in index.nearest(vectors[0], 5, exclude=['t0'])]
+
+
+def test_replaced_vectors_move_between_cells():
+    rng = np.random.default_rng(11)
+    index = MoodIndex(initial_capacity=4)
+    vectors = {}
+    for round in range(3):
+        for i in range(300):
+            vectors[f't{i}'] = rng.random(4, dtype=np.float32)
+            index.add(f't{i}', vectors[f't{i}'])
+
+    assert len(index) == 300
+    assert sum(index._cell_sizes) == 300
+    ids = list(vectors)
+    matrix = np.array([vectors[item_id] for item_id in ids])
+    target = np.array([0.6, 0.2, 0.4, 0.9], dtype=np.float32)
+    expected = np.argsort(np.linalg.norm(matrix - target, axis=1))[:15]
+    assert [item_id for item_id, _ in index.nearest(target, 15)] == [ids[i] for i in expected]
+
+
+def test_add_features_skips_incomplete_and_known_tracks():
+    index = MoodIndex()
+    assert index.add_features([features('a', 0.1, 0.2), {'id': 'b', 'energy': 0.5}, None]) == 1
+    assert index.add_features([features('a', 0.9, 0.9)]) == 0
+    assert np.allclose(index.get('a'), feature_vector(features('a', 0.1, 0.2)))
+
+
+@pytest.mark.anyio
+async def test_audio_features_feed_the_track_index(fake_http):
+    fake_http.handler = lambda request: httpx.Response(
+        200, json={'audio_features': [features('t1', 0.8, 0.6), None]}
+    )
+    index = MoodIndex()
+    service = SpotifyService('token', TieredCache([MemoryBackend()]), track_index=index)
+
+    await service.get_audio_features(['t1', 't2'])
+    assert 't1' in index and len(index) == 1
+
+
+def test_playlist_recommendations_do_not_include_other_users_playlists(client, spotify):
+    state = client.app.state
+    mood = {'energy': 0.8, 'valence': 0.8, 'tempo': 120.0, 'danceability': 0.7, 'overall_mood': 'Happy', 'mood_score': 0.8}
+    owners = {'Bearer owner-token': 'private-of-owner', 'Bearer other-token': 'own-of-other'}
+    for playlist_id in owners.values():
+        client.portal.call(state.playlist_mood_store.save, playlist_id, ['tracks:x'], mood)
+    state.playlist_index.add('featured-1', feature_vector(mood))
+
+    def handler(request):
+        playlist_id = owners[request.headers['Authorization']]
+        return httpx.Response(200, json={'items': [{'id': playlist_id, 'name': playlist_id}]})
+
+    spotify.handler = handler
+    response = client.get(
+        '/api/spotify/recommendations/mood',
+        params={'kind': 'playlists', 'energy': 0.8, 'valence': 0.8, 'tempo': 120, 'danceability': 0.7},
+        headers={'Authorization': 'Bearer other-token'}
+    )
+    assert response.status_code == 200
+    assert {result['id'] for result in response.json()['results']} == {'own-of-other', 'featured-1'}
@@ -0,0 +1,62 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from services.mood_index import FEATURES
+from services.playlist_generator import _total_cost, feature_matrix, generate_playlist, select_tracks, slot_targets
+
+
+def pool(size, seed=0):
+    rng = np.random.default_rng(seed)
+    features = [
+        {'energy': e, 'valence': v, 'tempo': t, 'danceability': d}
+        for e, v, t, d in zip(rng.random(size), rng.random(size), rng.uniform(60, 200, size), rng.random(size))
+    ]
+    return [f't{n}' for n in range(size)], features
+
+
+def cost(features, targets, weights, chosen):
+    slot_costs = ((features[chosen] - targets) ** 2 * weights).sum(axis=1)
+    return _total_cost(slot_costs, features[chosen].mean(axis=0) - targets.mean(axis=0), weights, len(chosen))
+
+
+def test_tracks_matching_the_target_are_chosen():
+    track_ids, features = pool(200)
+    features[17] = features[42] = {'energy': 0.9, 'valence': 0.2, 'tempo': 150, 'danceability': 0.7}
+    playlist = generate_playlist(track_ids, features, {'energy': 0.9, 'valence': 0.2, 'tempo': 150, 'danceability': 0.7}, 2)
+    assert sorted(playlist['track_ids']) == ['t17', 't42']
+    assert playlist['cost'] == 0
+
+
+def test_tracks_are_distinct_and_open_features_are_ignored():
+    track_ids, features = pool(30)
+    playlist = generate_playlist(track_ids, features, {'energy': 0.5}, 50)
+    assert len(playlist['track_ids']) == len(set(playlist['track_ids'])) == 30
+    assert all(target['valence'] is None and target['energy'] == 0.5 for target in playlist['targets'])
+
+
+def test_a_warmup_arc_raises_energy_across_the_playlist():
+    energies = np.linspace(0, 1, 41)
+    features = [{'energy': e, 'valence': 0.5, 'tempo': 120, 'danceability': 0.5} for e in energies]
+    playlist = generate_playlist([f't{n}' for n in range(41)], features, {'energy': 0.5}, 5, arc='warmup', arc_span=0.8)
+    chosen = [energies[int(track_id[1:])] for track_id in playlist['track_ids']]
+    assert chosen == sorted(chosen)
+    assert chosen[0] == pytest.approx(0.1) and chosen[-1] == pytest.approx(0.9)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_the_search_finds_the_optimum_of_small_pools(seed):
+    _, audio_features = pool(8, seed)
+    features = feature_matrix(audio_features)
+    targets, weights = slot_targets({'energy': 0.7, 'valence': 0.4, 'tempo': 128}, 3, arc='cooldown')
+
+    chosen = select_tracks(features, targets, weights)
+    best = min(cost(features, targets, weights, list(order)) for order in itertools.permutations(range(8), 3))
+    assert cost(features, targets, weights, chosen) == pytest.approx(best)
+
+
+def test_feature_matrix_scales_tempo_like_the_mood_index():
+    matrix = feature_matrix([{'energy': 1, 'valence': 0, 'tempo': 440, 'danceability': 0.5}])
+    assert matrix.shape == (1, len(FEATURES))
+    assert matrix[0].tolist() == [1.0, 0.0, 1.0, 0.5]
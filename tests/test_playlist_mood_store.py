@@ -0,0 +1,88 @@
+import mongomock_motor
+import pytest
+
+from services.playlist_mood_store import MAX_FINGERPRINTS, PlaylistMoodStore, snapshot_fingerprint, track_set_fingerprint
+
+pytestmark = pytest.mark.anyio
+
+
+def mood(overall: str, score: float) -> dict:
+    return {'overall_mood': overall, 'mood_score': score}
+
+
+@pytest.fixture
+async def store():
+    store = PlaylistMoodStore(mongomock_motor.AsyncMongoMockClient()['moods'])
+    await store.ensure_indexes()
+    return store
+
+
+def test_track_fingerprint_ignores_order():
+    assert track_set_fingerprint(['a', 'b']) == track_set_fingerprint(['b', 'a'])
+    assert track_set_fingerprint(['a', 'b']) != track_set_fingerprint(['a', 'c'])
+
+
+async def test_stored_mood_is_returned_only_for_a_matching_fingerprint(store):
+    await store.save('p1', [snapshot_fingerprint('s1')], mood('happy', 0.8))
+
+    assert await store.get('p1', snapshot_fingerprint('s1')) == mood('happy', 0.8)
+    assert await store.get('p1', snapshot_fingerprint('s2')) is None
+
+    await store.add_fingerprint('p1', track_set_fingerprint(['a']))
+    assert await store.get('p1', track_set_fingerprint(['a'])) == mood('happy', 0.8)
+
+
+async def test_stale_lists_missing_and_outdated_playlists(store):
+    await store.save('current', ['snapshot:1'], mood('calm', 0.5))
+    await store.save('changed', ['snapshot:1'], mood('calm', 0.5))
+
+    stale = await store.stale({'current': 'snapshot:1', 'changed': 'snapshot:2', 'new': 'snapshot:1'})
+
+    assert sorted(stale) == ['changed', 'new']
+
+
+async def test_find_by_mood_is_limited_to_the_given_playlists_best_first(store):
+    await store.save('low', ['f'], mood('happy', 0.3))
+    await store.save('high', ['f'], mood('happy', 0.9))
+    await store.save('sad', ['f'], mood('sad', 0.9))
+    await store.save('someone_elses', ['f'], mood('happy', 1.0))
+
+    found = await store.find_by_mood('happy', ['low', 'high', 'sad'])
+
+    assert [doc['playlist_id'] for doc in found] == ['high', 'low']
+    assert set(await store.moods(['low', 'sad', 'missing'])) == {'low', 'sad'}
+
+
+async def test_fingerprints_are_capped_and_not_duplicated(store):
+    await store.save('p1', ['tracks:1'], mood('calm', 0.5))
+
+    for n in range(MAX_FINGERPRINTS + 3):
+        await store.add_fingerprint('p1', snapshot_fingerprint(str(n)))
+    await store.add_fingerprint('p1', snapshot_fingerprint(str(MAX_FINGERPRINTS + 2)))
+
+    doc = await store.collection.find_one({'playlist_id': 'p1'})
+    assert doc['fingerprints'] == [snapshot_fingerprint(str(n)) for n in range(3, MAX_FINGERPRINTS + 3)]
+
+
+def test_a_stored_mood_is_not_served_on_a_client_supplied_snapshot(client, spotify):
+    import httpx
+
+    store = client.app.state.playlist_mood_store
+    client.portal.call(store.save, 'p1', [snapshot_fingerprint('s1')], mood('happy', 0.8))
+
+    def handle(request):
+        if request.headers['Authorization'] == 'Bearer owner' and request.url.path == '/v1/playlists/p1':
+            return httpx.Response(200, json={'snapshot_id': 's1'})
+        return httpx.Response(404, json={'error': {'status': 404}})
+
+    spotify.handler = handle
+    path = '/api/spotify/playlists/p1/mood'
+
+    stranger = client.get(path, params={'snapshot_id': 's1'}, headers={'Authorization': 'Bearer stranger'})
+    owner = client.get(path, headers={'Authorization': 'Bearer owner'})
+
+    assert stranger.status_code == 404 and 'happy' not in stranger.text
+    assert owner.status_code == 200 and owner.json() == mood('happy', 0.8)
+    # Served from the store after the snapshot lookup; nothing was recalculated
+    paths = [request.url.path for request in spotify.requests]
+    assert paths.count('/v1/playlists/p1') == 2 and '/v1/audio-features' not in paths
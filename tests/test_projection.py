@@ -0,0 +1,31 @@
+from services.projection import PLAYLIST_FIELDS, TRACK_FIELDS, parse_fields, project, spotify_fields
+
+TRACK = {
+    'id': 't1',
+    'name': 'Song',
+    'available_markets': ['SE', 'US'] * 90,
+    'artists': [{'id': 'a1', 'name': 'Artist', 'href': 'https://api.spotify.com/v1/artists/a1'}],
+    'album': {'id': 'al1', 'name': 'Album', 'images': [{'url': 'cover.jpg'}], 'available_markets': ['SE']},
+    'preview_url': None
+}
+
+
+def test_fields_parse_into_a_tree_and_whole_objects_win_over_subfields():
+    assert parse_fields('id, artists.name,album.images,album') == {'id': True, 'artists': {'name': True}, 'album': True}
+    assert parse_fields('album,album.name') == {'album': True}
+    assert parse_fields(',,id') == {'id': True}
+
+
+def test_projection_keeps_only_selected_keys_through_lists():
+    assert project([TRACK, None], parse_fields(TRACK_FIELDS)) == [{
+        'id': 't1',
+        'name': 'Song',
+        'preview_url': None,
+        'artists': [{'id': 'a1', 'name': 'Artist'}],
+        'album': {'id': 'al1', 'name': 'Album', 'images': [{'url': 'cover.jpg'}]}
+    }, None]
+
+
+def test_trees_render_in_the_spotify_fields_syntax():
+    assert spotify_fields(parse_fields('id,artists.name,artists.id,album.images')) == 'id,artists(name,id),album(images)'
+    assert 'owner(id,display_name)' in spotify_fields(parse_fields(PLAYLIST_FIELDS))
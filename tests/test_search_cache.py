@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from services.search_cache import SearchCache, SearchSuperseded, normalize_query
+
+pytestmark = pytest.mark.anyio
+
+
+def test_normalize_query_folds_case_and_spacing():
+    assert normalize_query('  Hello   WORLD ') == 'hello world'
+    assert normalize_query('Ｈｅｌｌｏ') == 'hello'
+
+
+def test_normalize_query_keeps_operators_and_filter_names():
+    assert normalize_query('rock NOT Metal') == 'rock NOT metal'
+    assert normalize_query('rock not metal') == 'rock not metal'
+    assert normalize_query('artist:Adele Hello') == 'artist:adele hello'
+
+
+async def test_fetch_receives_the_original_query():
+    queries = []
+
+    async def fetch(query, limit):
+        queries.append(query)
+        return [{'id': 't1'}]
+
+    cache = SearchCache()
+    await cache.search('Hello artist:Adele NOT Live', 10, fetch)
+    assert queries == ['Hello artist:Adele NOT Live']
+
+
+async def test_concurrent_equivalent_queries_share_one_fetch():
+    calls = 0
+    release = asyncio.Event()
+
+    async def fetch(query, limit):
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return [{'id': 't1'}]
+
+    cache = SearchCache()
+    waiting = [asyncio.create_task(cache.search(query, 10, fetch)) for query in ('hello', 'Hello', ' HELLO ')]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiting)
+    assert calls == 1
+    assert results == [[{'id': 't1'}]] * 3
+
+
+async def test_newer_search_from_the_same_client_supersedes_the_pending_one():
+    started = asyncio.Event()
+    cancelled = []
+
+    async def slow(query, limit):
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(query)
+            raise
+        return []
+
+    async def fast(query, limit):
+        return [{'id': query}]
+
+    cache = SearchCache()
+    first = asyncio.create_task(cache.search('hel', 10, slow, client_id='c1'))
+    await started.wait()
+    assert await cache.search('hello', 10, fast, client_id='c1') == [{'id': 'hello'}]
+    with pytest.raises(SearchSuperseded):
+        await first
+    await asyncio.sleep(0)
+    assert cancelled == ['hel']
+
+
+async def test_searches_in_flight_are_not_shared_between_clients():
+    tokens = []
+    release = asyncio.Event()
+
+    def fetch_as(token):
+        async def fetch(query, limit):
+            tokens.append(token)
+            await release.wait()
+            return [{'id': token}]
+        return fetch
+
+    cache = SearchCache()
+    waiting = [
+        asyncio.create_task(cache.search('hello', 10, fetch_as(token), client_id=token))
+        for token in ('alice', 'bob')
+    ]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiting) == [[{'id': 'alice'}], [{'id': 'bob'}]]
+    assert tokens == ['alice', 'bob']
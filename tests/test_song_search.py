@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+from dependencies import get_supabase_service
+from services.cache import MemoryBackend, TieredCache
+from services.supabase_service import SupabaseService
+
+KEY = 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.signature'
+
+
+class RecordingRpc:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def __call__(self, name, params):
+        self.calls.append((name, params))
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=self.rows))
+
+
+@pytest.mark.anyio
+async def test_search_calls_the_ranking_function_and_caches_equivalent_queries(anyio_backend):
+    service = SupabaseService('https://project.supabase.co', KEY, TieredCache([MemoryBackend()]))
+    rpc = RecordingRpc([{'id': 's1', 'title': 'Blue'}])
+    service.supabase.rpc = rpc
+
+    assert await service.search_songs('Blue  Moon', 5, 10) == [{'id': 's1', 'title': 'Blue'}]
+    assert await service.search_songs('blue moon', 5, 10) == [{'id': 's1', 'title': 'Blue'}]
+    await service.search_songs('blue moon', 5, 15)
+
+    assert rpc.calls == [
+        ('search_songs', {'search_query': 'Blue  Moon', 'result_limit': 5, 'result_offset': 10}),
+        ('search_songs', {'search_query': 'blue moon', 'result_limit': 5, 'result_offset': 15})
+    ]
+
+
+class FakeSongs:
+    def __init__(self, total):
+        self.total = total
+        self.calls = []
+
+    async def search_songs(self, query, limit, offset):
+        self.calls.append((query, limit, offset))
+        return [{'id': f's{n}'} for n in range(offset, min(offset + limit, self.total))]
+
+
+@pytest.fixture
+def songs(client):
+    songs = FakeSongs(total=3)
+    client.app.dependency_overrides[get_supabase_service] = lambda: songs
+    yield songs
+    client.app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize('offset, has_more, count', [(0, True, 2), (2, False, 1)])
+def test_search_endpoint_pages_with_a_has_more_flag(client, songs, offset, has_more, count):
+    body = client.get('/api/songs/search', params={'q': 'blue', 'limit': 2, 'offset': offset}).json()
+
+    assert songs.calls == [('blue', 3, offset)]
+    assert body['has_more'] is has_more
+    assert len(body['songs']) == count
+
+
+def test_search_endpoint_requires_a_query(client, songs):
+    assert client.get('/api/songs/search', params={'q': ''}).status_code == 422
+    assert songs.calls == []
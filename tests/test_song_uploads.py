@@ -0,0 +1,133 @@
+import hashlib
+import io
+import os
+
+import mongomock_motor
+import pytest
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from services.audio_files import AudioFileStore, content_filename
+from services.circuit_breaker import CircuitOpen
+from services.song_uploads import MAX_UPLOAD_SIZE, SongUploader, UploadRejected
+
+pytestmark = pytest.mark.anyio
+
+
+class UnreachableSongsTable:
+    """Stores files, but the songs table is unreachable"""
+
+    def __init__(self):
+        self.stored = set()
+        self.paths = []
+        self.contents = {}
+
+    async def upload_song_file(self, path, filename, content_type):
+        self.stored.add(filename)
+        self.paths.append(path)
+        with open(path, 'rb') as data:
+            self.contents[filename] = data.read()
+        return f'https://storage.test/{filename}'
+
+    async def delete_song_file(self, filename):
+        self.stored.discard(filename)
+
+    async def find_song_by_audio_url(self, audio_url):
+        return None
+
+    async def create_song(self, song_data):
+        raise CircuitOpen('supabase', 15)
+
+    async def create_songs(self, songs_data):
+        raise CircuitOpen('supabase', 15)
+
+
+def audio(name, contents):
+    return UploadFile(io.BytesIO(contents), size=len(contents), filename=name, headers=Headers({'content-type': 'audio/mpeg'}))
+
+
+def metadata(title):
+    return {'title': title, 'artist': 'Artist'}
+
+
+@pytest.fixture
+def audio_files():
+    return AudioFileStore(mongomock_motor.AsyncMongoMockClient().db)
+
+
+async def test_files_are_deleted_when_their_songs_cannot_be_created(audio_files):
+    supabase = UnreachableSongsTable()
+    uploader = SongUploader(supabase, audio_files, None, None)
+
+    with pytest.raises(CircuitOpen):
+        await uploader.upload_many([audio('a.mp3', b'aaa'), audio('b.mp3', b'bbb')], [metadata('A'), metadata('B')])
+    with pytest.raises(CircuitOpen):
+        await uploader.upload(audio('c.mp3', b'ccc'), metadata('C'))
+
+    assert supabase.stored == set()
+    assert await audio_files.collection.count_documents({}) == 0
+
+
+async def test_files_other_uploads_reuse_are_kept(audio_files):
+    supabase = UnreachableSongsTable()
+    uploader = SongUploader(supabase, audio_files, None, None)
+    stored = await uploader.store_file(audio('a.mp3', b'aaa'))
+    # Another song already shares this file
+    await audio_files.record_use(stored['content_hash'])
+
+    with pytest.raises(CircuitOpen):
+        await uploader.upload(audio('a.mp3', b'aaa'), metadata('A'))
+
+    assert supabase.stored == {stored['filename']}
+    assert await audio_files.get(stored['content_hash'])
+
+
+async def test_identical_files_are_stored_once(audio_files):
+    supabase = UnreachableSongsTable()
+    uploader = SongUploader(supabase, audio_files, None, None)
+
+    first, again, renamed = [
+        await uploader.store_file(audio(name, contents))
+        for name, contents in (('a.MP3', b'same'), ('a.MP3', b'same'), ('other.mp3', b'same'))
+    ]
+
+    assert first['filename'] == content_filename(first['content_hash'], 'MP3') == f"{first['content_hash']}.mp3"
+    assert not first['deduplicated'] and again['deduplicated'] and renamed['deduplicated']
+    assert again['audio_url'] == renamed['audio_url'] == first['audio_url']
+    assert supabase.stored == {first['filename']}
+    assert (await audio_files.get(first['content_hash']))['reuses'] == 2
+
+
+async def test_non_audio_files_are_rejected_before_they_are_read(audio_files):
+    uploader = SongUploader(UnreachableSongsTable(), audio_files, None, None)
+    text = UploadFile(io.BytesIO(b'hello'), filename='a.txt', headers=Headers({'content-type': 'text/plain'}))
+    with pytest.raises(UploadRejected):
+        await uploader.store_file(text)
+
+
+async def test_uploads_are_hashed_while_spooled_to_disk(audio_files):
+    supabase = UnreachableSongsTable()
+    uploader = SongUploader(supabase, audio_files, None, None)
+    contents = os.urandom(3 * 1024 * 1024 + 7)
+
+    stored = await uploader.store_file(audio('a.mp3', contents))
+
+    assert stored['content_hash'] == hashlib.sha256(contents).hexdigest()
+    assert supabase.contents[stored['filename']] == contents
+    assert (await audio_files.get(stored['content_hash']))['size'] == len(contents)
+    # The spooled copy is gone once the upload is stored
+    assert not os.path.exists(supabase.paths[0])
+
+
+async def test_oversized_uploads_are_rejected_while_streaming(audio_files, tmp_path, monkeypatch):
+    monkeypatch.setattr('tempfile.tempdir', str(tmp_path))
+    supabase = UnreachableSongsTable()
+    uploader = SongUploader(supabase, audio_files, None, None)
+    # No declared size, so the limit is only found while reading
+    upload = UploadFile(io.BytesIO(b'x' * (MAX_UPLOAD_SIZE + 1)), filename='a.mp3', headers=Headers({'content-type': 'audio/mpeg'}))
+
+    with pytest.raises(UploadRejected):
+        await uploader.store_file(upload)
+
+    assert supabase.stored == set()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from services import spotify_service
+from services.cache import MemoryBackend, Namespace, TieredCache
+from services.circuit_breaker import CircuitBreaker, CircuitOpen
+from services.spotify_service import SEARCH_LIMIT, SpotifyService
+
+pytestmark = pytest.mark.anyio
+
+OWNER = 'Bearer owner-token'
+PRIVATE_TRACKS = {'items': [{'track': {'id': 'PRIVt0', 'name': 'Private'}}]}
+
+
+def owner_only(request):
+    if request.headers['Authorization'] != OWNER:
+        return httpx.Response(404, json={'error': {'status': 404}})
+    return httpx.Response(200, json=PRIVATE_TRACKS, headers={'ETag': '"v1"'})
+
+
+async def test_cached_playlist_tracks_are_not_served_to_other_tokens(fake_http):
+    fake_http.handler = owner_only
+    cache = TieredCache([MemoryBackend()])
+
+    owner_tracks = await SpotifyService('owner-token', cache).get_playlist_tracks('p1', snapshot_id='s1')
+    other_tracks = await SpotifyService('other-token', cache).get_playlist_tracks('p1', snapshot_id='s1')
+
+    assert [track['id'] for track in owner_tracks] == ['PRIVt0']
+    assert other_tracks == []
+    # The other token was checked by Spotify rather than answered from the owner's entry
+    assert [request.headers['Authorization'] for request in fake_http.requests] == [OWNER, 'Bearer other-token']
+
+
+async def test_another_tokens_404_does_not_hide_the_playlist_from_its_owner(fake_http):
+    fake_http.handler = owner_only
+    cache = TieredCache([MemoryBackend()])
+
+    assert await SpotifyService('other-token', cache).get_playlist_tracks('p1', snapshot_id='s1') == []
+    owner_tracks = await SpotifyService('owner-token', cache).get_playlist_tracks('p1', snapshot_id='s1')
+    assert [track['id'] for track in owner_tracks] == ['PRIVt0']
+
+
+def search_page(version):
+    return lambda request: httpx.Response(
+        200, json={'tracks': {'items': [{'id': f'{version}-{n}'} for n in range(int(request.url.params['limit']))]}}
+    )
+
+
+async def test_search_results_are_cached_once_in_the_tiered_cache(fake_http):
+    fake_http.handler = search_page('v1')
+    cache = TieredCache([MemoryBackend()])
+    service = SpotifyService('token', cache)
+
+    assert [track['id'] for track in await service.search_tracks('Hello', 10)] == [f'v1-{n}' for n in range(10)]
+    # A smaller limit is answered from the same full page
+    assert [track['id'] for track in await service.search_tracks('hello ', 3)] == ['v1-0', 'v1-1', 'v1-2']
+    assert len(fake_http.requests) == 1
+    assert fake_http.requests[0].url.params['q'] == 'Hello'
+    assert fake_http.requests[0].url.params['limit'] == str(SEARCH_LIMIT)
+
+
+async def test_stale_search_results_are_served_while_they_are_refetched(fake_http, monkeypatch):
+    monkeypatch.setattr(spotify_service, 'SEARCH_RESULTS', Namespace('spotify.search', ttl=0.01, stale_ttl=60))
+    fake_http.handler = search_page('v1')
+    service = SpotifyService('token', TieredCache([MemoryBackend()]))
+    await service.search_tracks('hello', 1)
+
+    time.sleep(0.02)
+    fake_http.handler = search_page('v2')
+    assert await service.search_tracks('hello', 1) == [{'id': 'v1-0'}]
+    await asyncio.sleep(0.01)
+
+    assert await service.search_tracks('hello', 1) == [{'id': 'v2-0'}]
+    assert len(fake_http.requests) == 2
+
+
+async def test_fallback_bodies_are_only_served_to_the_token_that_fetched_them(fake_http):
+    fake_http.handler = owner_only
+    cache = TieredCache([MemoryBackend()])
+    breaker = CircuitBreaker('spotify')
+    owner = SpotifyService('owner-token', cache, breaker=breaker)
+    other = SpotifyService('other-token', cache, breaker=breaker)
+    async with httpx.AsyncClient() as client:
+        assert await owner._get(client, '/playlists/p1/tracks') == PRIVATE_TRACKS
+
+        fake_http.handler = lambda request: httpx.Response(503)
+        with pytest.raises(httpx.HTTPStatusError):
+            await other._get(client, '/playlists/p1/tracks')
+        assert await owner._get(client, '/playlists/p1/tracks') == PRIVATE_TRACKS
+
+        breaker._open(time.monotonic(), 'test')
+        with pytest.raises(CircuitOpen):
+            await other._get(client, '/playlists/p1/tracks')
+        assert await owner._get(client, '/playlists/p1/tracks') == PRIVATE_TRACKS
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from services.cache import MemoryBackend, TieredCache
+from services.circuit_breaker import CircuitBreaker
+from services.supabase_service import SupabaseService
+
+pytestmark = pytest.mark.anyio
+
+KEY = 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.signature'
+
+
+class SlowBucket:
+    def upload(self, path, data, file_options=None):
+        # A large file: slower than any database call should be
+        import time
+        time.sleep(0.05)
+
+    def get_public_url(self, path):
+        return f'https://storage.test/{path}'
+
+
+class SlowStorage:
+    def from_(self, bucket):
+        return SlowBucket()
+
+
+def build_service(breaker, storage_breaker):
+    service = SupabaseService('https://project.supabase.co', KEY, TieredCache([MemoryBackend()]), breaker, storage_breaker)
+    # The client builds its storage client on first use
+    service.supabase._storage = SlowStorage()
+    return service
+
+
+async def test_slow_transfers_do_not_open_the_database_circuit():
+    breaker = CircuitBreaker('supabase', slow_call_seconds=0.01, min_calls=1)
+    storage_breaker = CircuitBreaker('supabase-storage', timeout=5, slow_call_seconds=5, min_calls=1)
+    service = build_service(breaker, storage_breaker)
+
+    urls = await asyncio.gather(*(service.upload_song_file(b'audio', f'{n}.mp3') for n in range(3)))
+
+    assert urls == [f'https://storage.test/{n}.mp3' for n in range(3)]
+    assert breaker.calls == 0 and breaker.closed
+    assert storage_breaker.calls == 3 and storage_breaker.closed
+
+
+def test_client_timeouts_follow_the_breakers():
+    service = build_service(CircuitBreaker('supabase', timeout=4), CircuitBreaker('supabase-storage', timeout=90.5))
+    assert service.supabase.options.postgrest_client_timeout == 4
+    assert service.supabase.options.storage_client_timeout == 91
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from middleware.tracing import TracingMiddleware
+from services.profiler import ProfileInProgress, SamplingProfiler
+from services.tracing import CLIENT, SlowTraces, span, to_otlp
+
+
+async def slow_song(request):
+    with span('supabase', CLIENT, {'code.function': 'fetch'}):
+        await asyncio.sleep(0.05)
+    return JSONResponse({'id': request.path_params['song_id']})
+
+
+async def fast(request):
+    return JSONResponse({})
+
+
+def traced_app(slow_traces):
+    app = Starlette(routes=[Route('/songs/{song_id}', slow_song), Route('/fast', fast)])
+    app.add_middleware(TracingMiddleware, slow_traces=slow_traces)
+    return TestClient(app)
+
+
+def test_only_slow_requests_are_kept_with_their_spans_under_the_route_name():
+    slow_traces = SlowTraces(threshold_ms=20)
+    client = traced_app(slow_traces)
+
+    client.get('/fast')
+    client.get('/songs/42')
+
+    assert (slow_traces.traced, slow_traces.recorded) == (2, 1)
+    [trace] = slow_traces.recent()
+    assert trace['name'] == 'GET /songs/{song_id}'
+    assert trace['attributes']['http.response.status_code'] == 200
+    [child] = trace['spans']
+    assert child['name'] == 'supabase' and child['attributes'] == {'code.function': 'fetch'}
+    assert child['duration_ms'] >= 40
+
+
+def test_traces_export_as_otlp_json():
+    slow_traces = SlowTraces(threshold_ms=1)
+    traced_app(slow_traces).get('/songs/1')
+    trace = slow_traces._recent[0]
+
+    spans = to_otlp([trace])['resourceSpans'][0]['scopeSpans'][0]['spans']
+
+    assert [encoded['name'] for encoded in spans] == ['GET /songs/{song_id}', 'supabase']
+    assert spans[1]['parentSpanId'] == trace.root.span_id
+    assert {encoded['traceId'] for encoded in spans} == {trace.trace_id}
+
+
+def test_a_zero_threshold_turns_tracing_off():
+    slow_traces = SlowTraces(threshold_ms=0)
+    traced_app(slow_traces).get('/songs/1')
+    assert slow_traces.traced == 0
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profiler_reports_collapsed_stacks_and_runs_one_at_a_time():
+    profiler = SamplingProfiler()
+    stop = threading.Event()
+    worker = threading.Thread(target=busy, args=(stop,), name='busy-worker')
+    worker.start()
+    try:
+        result = {}
+        sampler = threading.Thread(target=lambda: result.update(stacks=profiler.profile(0.2, 0.005, threading.Event())))
+        sampler.start()
+        time.sleep(0.05)
+        with pytest.raises(ProfileInProgress):
+            profiler.profile(0.1, 0.005, threading.Event())
+        sampler.join()
+    finally:
+        stop.set()
+        worker.join()
+
+    lines = [line for line in result['stacks'].splitlines() if line.startswith('busy-worker;')]
+    assert lines and all('busy (' in line for line in lines)
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+    assert not profiler.running
+
+
+def test_admin_routes_do_not_exist_without_a_configured_token(client):
+    assert client.get('/api/admin/traces').status_code == 404
+
+
+def test_admin_routes_require_the_token(client, admin_token):
+    assert client.get('/api/admin/traces').status_code == 403
+    assert client.get('/api/admin/traces', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+
+    response = client.get('/api/admin/traces', headers={'X-Admin-Token': admin_token})
+    assert response.status_code == 200
+    assert 'traces' in response.json()
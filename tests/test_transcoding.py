@@ -0,0 +1,68 @@
+import pytest
+
+from services.song_processing import SongProcessor
+from services.transcoding import MASTER_PLAYLIST, upload_order
+
+HLS_FILES = {
+    MASTER_PLAYLIST: b'#EXTM3U master',
+    '64k/index.m3u8': b'#EXTM3U 64k',
+    '64k/segment_000.ts': b'a',
+    '64k/segment_001.ts': b'b',
+    '160k/index.m3u8': b'#EXTM3U 160k',
+    '160k/segment_000.ts': b'c'
+}
+
+
+class InlinePool:
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    async def submit(self, fn, *args):
+        self.calls.append(fn.__name__)
+        return self.result
+
+
+class RecordingSupabase:
+    def __init__(self):
+        self.uploads = []
+        self.updates = {}
+
+    async def download_song_file(self, filename):
+        return b'audio'
+
+    async def upload_stream_file(self, path, data, content_type):
+        self.uploads.append((path, content_type))
+        return f'https://storage.test/{path}'
+
+    async def update_song(self, song_id, data):
+        self.updates[song_id] = data
+
+
+def test_playlists_are_uploaded_after_everything_they_reference():
+    order = upload_order(HLS_FILES)
+    assert order[-1] == MASTER_PLAYLIST
+    assert {name for name in order[:3]} == {'64k/segment_000.ts', '64k/segment_001.ts', '160k/segment_000.ts'}
+    assert set(order[3:5]) == {'64k/index.m3u8', '160k/index.m3u8'}
+
+
+@pytest.mark.anyio
+async def test_transcoding_publishes_renditions_and_records_them_on_the_song():
+    supabase = RecordingSupabase()
+    transcode_pool = InlinePool(HLS_FILES)
+    processor = SongProcessor(lambda: supabase, InlinePool(None), transcode_pool, bitrates=[64, 160])
+
+    result = await processor.transcode({'song_id': 's1', 'filename': 'abc.mp3'})
+
+    assert transcode_pool.calls == ['transcode_to_hls']
+    assert [path for path, _ in supabase.uploads] == [f'hls/s1/{name}' for name in upload_order(HLS_FILES)]
+    assert dict(supabase.uploads)['hls/s1/64k/segment_000.ts'] == 'video/mp2t'
+    assert dict(supabase.uploads)['hls/s1/master.m3u8'] == 'application/vnd.apple.mpegurl'
+    assert supabase.updates['s1'] == {
+        'hls_url': 'https://storage.test/hls/s1/master.m3u8',
+        'renditions': [
+            {'bitrate_kbps': 64, 'url': 'https://storage.test/hls/s1/64k/index.m3u8'},
+            {'bitrate_kbps': 160, 'url': 'https://storage.test/hls/s1/160k/index.m3u8'}
+        ]
+    }
+    assert result == {'hls_url': 'https://storage.test/hls/s1/master.m3u8', 'files': 6}
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from services.waveform import WAVEFORM_RESOLUTIONS, compute_peaks, to_int8
+
+
+def naive_peaks(samples, bins):
+    edges = (np.arange(bins + 1) * len(samples)) // bins
+    return np.array([[samples[a:b].min(), samples[a:b].max()] for a, b in zip(edges, edges[1:])])
+
+
+@pytest.mark.parametrize('length', [2048, 10007, 22050 * 3])
+def test_every_level_matches_peaks_taken_from_the_samples(length):
+    samples = np.random.default_rng(length).integers(-32768, 32767, length, dtype=np.int16)
+    levels = compute_peaks(samples)
+    assert sorted(levels) == sorted(WAVEFORM_RESOLUTIONS)
+    for bins, peaks in levels.items():
+        # Coarse levels are reduced from the finest one, which must not change them
+        assert peaks.dtype == np.int16
+        assert np.array_equal(peaks, naive_peaks(samples, bins))
+
+
+def test_silence_gives_flat_peaks():
+    assert not compute_peaks(np.array([], dtype=np.int16))[128].any()
+    assert to_int8(bytes(8)) == bytes(4)
+
+
+def test_int8_peaks_are_scaled_to_the_loudest_sample():
+    peaks = np.array([-1000, 500, -250, 1000], dtype='<i2').tobytes()
+    assert np.frombuffer(to_int8(peaks), dtype=np.int8).tolist() == [-127, 64, -32, 127]
+
+
+def test_the_endpoint_serves_stored_peaks_with_validators(client):
+    samples = np.arange(-4096, 4096, dtype=np.int16)
+    waveform = {
+        'duration_ms': 1000,
+        'levels': {str(bins): peaks.astype('<i2').tobytes() for bins, peaks in compute_peaks(samples).items()}
+    }
+    client.portal.call(client.app.state.waveform_store.save, 'song-1', waveform)
+
+    response = client.get('/api/songs/song-1/waveform', params={'bins': 128, 'bits': 16})
+    assert response.status_code == 200
+    assert response.content == waveform['levels']['128']
+    assert len(client.get('/api/songs/song-1/waveform', params={'bins': 128}).content) == 128 * 2
+
+    etag = response.headers['etag']
+    assert client.get('/api/songs/song-1/waveform', params={'bins': 128, 'bits': 16}, headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/songs/song-1/waveform', params={'bins': 100}).status_code == 400
+    assert client.get('/api/songs/other/waveform').status_code == 404
+
+    assert client.portal.call(client.app.state.waveform_store.copy, 'song-1', 'song-2')
+    assert client.get('/api/songs/song-2/waveform', params={'bins': 128, 'bits': 16}).content == waveform['levels']['128']
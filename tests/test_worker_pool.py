@@ -0,0 +1,42 @@
+import asyncio
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from services.worker_pool import WorkerPool, WorkerPoolOverloaded
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def pool():
+    pool = WorkerPool(max_workers=1, max_queue=1)
+    pool.start()
+    yield pool
+    await pool.shutdown()
+
+
+async def test_tasks_run_in_another_process(pool):
+    assert await pool.submit(os.getpid) != os.getpid()
+    assert pool.metrics()['completed'] == 1
+
+
+async def test_submissions_beyond_workers_and_queue_are_rejected(pool):
+    results = await asyncio.gather(*(pool.submit(time.sleep, 0.2) for _ in range(3)), return_exceptions=True)
+    assert results[:2] == [None, None]
+    assert isinstance(results[2], WorkerPoolOverloaded)
+    assert pool.metrics()['rejected'] == 1 and pool.metrics()['in_flight'] == 0
+
+
+async def test_the_pool_is_replaced_after_a_worker_dies(pool):
+    with pytest.raises(BrokenProcessPool):
+        await pool.submit(os._exit, 1)
+    assert await pool.submit(pow, 2, 10) == 1024
+    assert pool.metrics()['failed'] == 1
+
+
+async def test_submitting_before_start_fails():
+    with pytest.raises(RuntimeError):
+        await WorkerPool(max_workers=1).submit(pow, 2, 2)